@@ -0,0 +1,70 @@
+"""
+File: env.py
+Description: Alembic migration environment for the Inventory API.
+Author: Jairo Céspedes
+Date: 2025-09-05
+
+Responsibilities:
+- Point Alembic at the application metadata (for autogenerate).
+- Run migrations against DATABASE_URL, or against a connection handed in
+  through config.attributes["connection"] (used by init_db and tests).
+
+Notes:
+- transaction_per_migration lets migrations leave the transaction with
+  autocommit_block() for PostgreSQL CREATE INDEX CONCURRENTLY.
+"""
+
+from logging.config import fileConfig
+
+from alembic import context
+from sqlalchemy import create_engine
+
+from app.core.config import settings
+from app.db.base import Base
+from app.models import user, product  # noqa: F401  (register tables)
+
+config = context.config
+if config.config_file_name is not None:
+    fileConfig(config.config_file_name, disable_existing_loggers=False)
+
+target_metadata = Base.metadata
+
+
+def run_migrations_offline() -> None:
+    """Emit SQL to stdout instead of executing it."""
+    context.configure(
+        url=settings.DATABASE_URL,
+        target_metadata=target_metadata,
+        literal_binds=True,
+        transaction_per_migration=True,
+    )
+    with context.begin_transaction():
+        context.run_migrations()
+
+
+def _run(connection) -> None:
+    context.configure(
+        connection=connection,
+        target_metadata=target_metadata,
+        transaction_per_migration=True,
+    )
+    with context.begin_transaction():
+        context.run_migrations()
+
+
+def run_migrations_online() -> None:
+    """Run migrations on a live connection."""
+    connection = config.attributes.get("connection")
+    if connection is not None:
+        _run(connection)
+        return
+    engine = create_engine(settings.DATABASE_URL)
+    with engine.connect() as connection:
+        _run(connection)
+    engine.dispose()
+
+
+if context.is_offline_mode():
+    run_migrations_offline()
+else:
+    run_migrations_online()
@@ -0,0 +1,84 @@
+"""Normalized name_search column with a trigram search index
+
+Revision ID: 0002
+Revises: 0001
+Create Date: 2025-09-05
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+from app.core.search import normalize_search
+from app.models.product import SQLITE_SEARCH_DDL
+
+revision: str = "0002"
+down_revision: Union[str, None] = "0001"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+# Rows per UPDATE batch when backfilling name_search
+_BACKFILL_BATCH = 5000
+
+_products = sa.table(
+    "products",
+    sa.column("id", sa.Integer()),
+    sa.column("name", sa.String()),
+    sa.column("name_search", sa.String()),
+)
+
+
+def upgrade() -> None:
+    op.add_column(
+        "products",
+        sa.Column("name_search", sa.String(255), nullable=False, server_default=""),
+    )
+
+    # Normalization is done in Python (accent stripping is not portable SQL).
+    # The live table is backfilled outside the migration transaction (like
+    # the index builds in 0003), in id-keyset batches: only one batch is in memory, and
+    # row locks are released as each UPDATE autocommits.
+    conn = op.get_bind()
+    stmt = (
+        _products.update()
+        .where(_products.c.id == sa.bindparam("pid"))
+        .values(name_search=sa.bindparam("ns"))
+    )
+    with op.get_context().autocommit_block():
+        last_id = 0
+        while True:
+            batch = conn.execute(
+                sa.select(_products.c.id, _products.c.name)
+                .where(_products.c.id > last_id)
+                .order_by(_products.c.id)
+                .limit(_BACKFILL_BATCH)
+            ).all()
+            if not batch:
+                break
+            conn.execute(stmt, [{"pid": r.id, "ns": normalize_search(r.name)} for r in batch])
+            last_id = batch[-1].id
+
+    dialect = conn.dialect.name
+    if dialect == "postgresql":
+        op.execute("CREATE EXTENSION IF NOT EXISTS pg_trgm")
+        with op.get_context().autocommit_block():
+            op.execute(
+                "CREATE INDEX CONCURRENTLY IF NOT EXISTS ix_products_name_search_trgm "
+                "ON products USING gin (name_search gin_trgm_ops)"
+            )
+    elif dialect == "sqlite":
+        for ddl in SQLITE_SEARCH_DDL:
+            op.execute(ddl)
+        op.execute("INSERT INTO products_search(products_search) VALUES ('rebuild')")
+
+
+def downgrade() -> None:
+    dialect = op.get_bind().dialect.name
+    if dialect == "postgresql":
+        with op.get_context().autocommit_block():
+            op.execute("DROP INDEX CONCURRENTLY IF EXISTS ix_products_name_search_trgm")
+    elif dialect == "sqlite":
+        for trigger in ("products_search_ai", "products_search_ad", "products_search_au"):
+            op.execute(f"DROP TRIGGER IF EXISTS {trigger}")
+        op.execute("DROP TABLE IF EXISTS products_search")
+    op.drop_column("products", "name_search")
@@ -0,0 +1,52 @@
+"""Composite and partial indexes for product list filters and sorts
+
+Revision ID: 0003
+Revises: 0002
+Create Date: 2025-09-05
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+revision: str = "0003"
+down_revision: Union[str, None] = "0002"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+_HAS_IMAGE = sa.text("image_url IS NOT NULL AND image_url <> ''")
+
+# name -> (columns, extra Index kwargs); mirrors Product.__table_args__
+_INDEXES = {
+    "ix_products_name_id": (["name", "id"], {}),
+    "ix_products_price_id": (["price", "id"], {}),
+    "ix_products_quantity_id": (["quantity", "id"], {}),
+    "ix_products_updated_at_id": (["updated_at", "id"], {}),
+    "ix_products_with_image_name_id": (
+        ["name", "id"],
+        {"postgresql_where": _HAS_IMAGE, "sqlite_where": _HAS_IMAGE},
+    ),
+}
+
+
+def upgrade() -> None:
+    # On PostgreSQL build concurrently, outside a transaction, so writes are
+    # not blocked while a live table is indexed. Other dialects ignore the flag.
+    with op.get_context().autocommit_block():
+        for name, (columns, kwargs) in _INDEXES.items():
+            op.create_index(
+                name, "products", columns,
+                if_not_exists=True, postgresql_concurrently=True, **kwargs,
+            )
+        # (name, id) supersedes the single-column name index
+        op.drop_index("ix_products_name", "products", if_exists=True, postgresql_concurrently=True)
+
+
+def downgrade() -> None:
+    with op.get_context().autocommit_block():
+        op.create_index(
+            "ix_products_name", "products", ["name"],
+            if_not_exists=True, postgresql_concurrently=True,
+        )
+        for name in _INDEXES:
+            op.drop_index(name, "products", if_exists=True, postgresql_concurrently=True)
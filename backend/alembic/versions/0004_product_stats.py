@@ -0,0 +1,48 @@
+"""Single-row product_stats summary table
+
+Revision ID: 0004
+Revises: 0003
+Create Date: 2025-09-05
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+from app.core.config import settings
+
+revision: str = "0004"
+down_revision: Union[str, None] = "0003"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.create_table(
+        "product_stats",
+        sa.Column("id", sa.Integer(), nullable=False),
+        sa.Column("sku_count", sa.Integer(), nullable=False),
+        sa.Column("total_units", sa.BigInteger(), nullable=False),
+        sa.Column("stock_value", sa.Numeric(18, 2), nullable=False),
+        sa.Column("out_of_stock", sa.Integer(), nullable=False),
+        sa.Column("low_stock", sa.Integer(), nullable=False),
+        sa.Column("low_stock_threshold", sa.Integer(), nullable=False),
+        sa.Column("recomputed_at", sa.DateTime(), server_default=sa.func.now(), nullable=False),
+        sa.PrimaryKeyConstraint("id"),
+    )
+    # Seeded from the current catalog, so the first writes have a row to
+    # shift (their deltas would otherwise update nothing). One read-only scan.
+    op.execute(
+        sa.text(
+            "INSERT INTO product_stats (id, sku_count, total_units, stock_value, out_of_stock, low_stock, "
+            "low_stock_threshold) "
+            "SELECT 1, COUNT(id), COALESCE(SUM(quantity), 0), COALESCE(SUM(price * quantity), 0), "
+            "COALESCE(SUM(CASE WHEN quantity = 0 THEN 1 ELSE 0 END), 0), "
+            "COALESCE(SUM(CASE WHEN quantity > 0 AND quantity <= :threshold THEN 1 ELSE 0 END), 0), "
+            ":threshold FROM products"
+        ).bindparams(threshold=settings.LOW_STOCK_THRESHOLD)
+    )
+
+
+def downgrade() -> None:
+    op.drop_table("product_stats")
@@ -0,0 +1,27 @@
+"""Optimistic-concurrency version counter on products
+
+Revision ID: 0005
+Revises: 0004
+Create Date: 2025-09-05
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+revision: str = "0005"
+down_revision: Union[str, None] = "0004"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    # Constant default: no table rewrite on PostgreSQL 11+; existing rows start at 1
+    op.add_column(
+        "products",
+        sa.Column("version", sa.Integer(), nullable=False, server_default="1"),
+    )
+
+
+def downgrade() -> None:
+    op.drop_column("products", "version")
@@ -0,0 +1,63 @@
+"""Change sequence, tombstones and change counter for delta sync
+
+Revision ID: 0006
+Revises: 0005
+Create Date: 2025-09-05
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+revision: str = "0006"
+down_revision: Union[str, None] = "0005"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    # With a constant default, adding the column is a catalog-only change on PostgreSQL 11+
+    op.add_column(
+        "products",
+        sa.Column("change_seq", sa.BigInteger(), nullable=False, server_default="0"),
+    )
+    op.create_table(
+        "product_tombstones",
+        sa.Column("id", sa.Integer(), nullable=False),
+        sa.Column("product_id", sa.Integer(), nullable=False),
+        sa.Column("change_seq", sa.BigInteger(), nullable=False),
+        sa.Column("deleted_at", sa.DateTime(), server_default=sa.func.now(), nullable=False),
+        sa.PrimaryKeyConstraint("id"),
+    )
+    op.create_index(
+        "ix_product_tombstones_change_seq_product_id", "product_tombstones", ["change_seq", "product_id"]
+    )
+    op.create_index("ix_product_tombstones_deleted_at", "product_tombstones", ["deleted_at"])
+    op.create_table(
+        "product_change_counter",
+        sa.Column("id", sa.Integer(), nullable=False),
+        sa.Column("value", sa.BigInteger(), nullable=False),
+        sa.Column("purged_through", sa.BigInteger(), nullable=False, server_default="0"),
+        sa.PrimaryKeyConstraint("id"),
+    )
+    op.execute("INSERT INTO product_change_counter (id, value, purged_through) VALUES (1, 0, 0)")
+
+    # As in 0003, the index on the live products table is built outside the
+    # migration transaction. Existing rows keep change_seq 0: delta sync
+    # pages by (change_seq, id), so a first full sync reads them in id
+    # order and no backfill is needed.
+    with op.get_context().autocommit_block():
+        op.create_index(
+            "ix_products_change_seq_id", "products", ["change_seq", "id"],
+            if_not_exists=True, postgresql_concurrently=True,
+        )
+
+
+def downgrade() -> None:
+    op.drop_table("product_change_counter")
+    op.drop_index("ix_product_tombstones_deleted_at", table_name="product_tombstones")
+    op.drop_index("ix_product_tombstones_change_seq_product_id", table_name="product_tombstones")
+    op.drop_table("product_tombstones")
+    with op.get_context().autocommit_block():
+        op.drop_index("ix_products_change_seq_id", "products", if_exists=True, postgresql_concurrently=True)
+    op.drop_column("products", "change_seq")
@@ -13,12 +13,14 @@ Notes:
 - Passwords are hashed using bcrypt before storage.
 - JWT tokens embed `sub` (user id) and `role`.
 - Tokens are required for accessing protected routes.
+- Verified tokens are cached until expiry; counters at /auth/token-cache/stats.
 """ 
 
 from fastapi import APIRouter, Depends
-from sqlalchemy.orm import Session
 
-from app.deps import get_db
+from app.core.security import token_cache
+from app.db.runner import DbRunner
+from app.deps import get_runner, require_roles
 from app.schemas.auth import LoginRequest, Token
 from app.schemas.user import UserCreate, UserOut
 from app.services.user_service import UserService
@@ -26,12 +28,17 @@ from app.services.user_service import UserService
 router = APIRouter()
 
 @router.post("/register", response_model=UserOut, status_code=201)
-def register(data: UserCreate, db: Session = Depends(get_db)):
+async def register(data: UserCreate, db: DbRunner = Depends(get_runner)):
     """Register a new user."""
-    return UserService(db).register(data)
+    return await UserService(db).register(data)
 
 @router.post("/login", response_model=Token)
-def login(payload: LoginRequest, db: Session = Depends(get_db)):
+async def login(payload: LoginRequest, db: DbRunner = Depends(get_runner)):
     """Authenticate and return a JWT access token (contains 'role')."""
-    token = UserService(db).login(payload.email, payload.password)
-    return Token(access_token=token)
\ No newline at end of file
+    token = await UserService(db).login(payload.email, payload.password)
+    return Token(access_token=token)
+
+@router.get("/token-cache/stats", dependencies=[Depends(require_roles("admin"))])
+async def token_cache_stats():
+    """Hit/miss counters of the verified-token cache: admin only."""
+    return token_cache.stats()
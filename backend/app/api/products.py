@@ -5,24 +5,90 @@ Author: Jairo Céspedes
 Date: 2025-09-05
 
 Responsibilities:
-- List products with optional search, filtering, and sorting.
+- List products with optional search, filtering, sorting and cursor pagination.
+- Stream the filtered catalog as NDJSON or CSV.
+- Serve delta sync: products changed and deleted since a sync token, and
+  purge expired tombstones (admin only).
+- Push product changes as server-sent events (/products/events).
 - Retrieve product by id.
+- Return sparse fieldsets (fields=id,name,...) selected column by column.
+- Answer conditional reads (If-None-Match) with 304 Not Modified.
+- Honor If-Match on PUT/DELETE (optimistic concurrency, 412 on conflict).
+- Expose list cache, event stream and stock coalescing counters (admin only).
+- Serve inventory statistics and their full recompute (admin only).
+- Apply atomic stock deltas, optionally coalesced per SKU (admin only).
 - Create, update, and delete products (admin only).
+- Apply create/update/delete batches in one transaction (admin only).
+- Bulk import products from a raw CSV or NDJSON request body (admin only).
 - Integrate with ProductService and ProductRepository.
 
 Notes:
-- Endpoints are protected with JWT authentication.
+- Endpoints are protected with JWT authentication: a Bearer token, except
+  the event stream, which takes a short-lived stream token as ?token=
+  (events_router, included before router so /{product_id} does not match it).
+- The list route returns pre-serialized JSON (product_list_adapter) so
+  FastAPI does not validate and encode every row a second time;
+  response_model is kept for the OpenAPI schema only.
+- Routes are async and reach the DB through a DbRunner (sync or async
+  session, see DB_ASYNC). Export and import stream request/response bodies
+  over a blocking cursor/file, so they stay sync and use the threadpool.
+- Import reads the raw body (Content-Type text/csv or application/x-ndjson)
+  chunk by chunk from the ASGI stream; nothing is spooled to memory or a
+  temporary file, unlike a multipart UploadFile.
 - Role-based restrictions enforced: admin can write, user read-only.
+- List, get and export read from a replica when DATABASE_REPLICA_URLS is
+  set (get_read_runner / get_read_db); writers read their own writes from
+  the primary for REPLICA_STICKY_SECONDS. Stats stay on the primary: a
+  missing or stale summary row is recomputed (written) on read.
 """
 
+import io
 from typing import List, Optional
 
-from fastapi import APIRouter, Depends, Query, status
+import anyio
+
+from fastapi import APIRouter, Depends, Header, HTTPException, Query, Request, Response, status
+from fastapi.responses import StreamingResponse
 from sqlalchemy.orm import Session
 
-from app.deps import get_db, require_roles, get_current_identity
-from app.schemas.product import ProductCreate, ProductOut, ProductUpdate
-from app.services.product_service import ProductService
+from app.core.config import settings
+from app.core.etag import etag_matches
+from app.core.events import event_stream
+from app.core.security import create_stream_token
+from app.db.runner import DbRunner, open_runner
+from app.deps import (
+    get_current_identity,
+    get_db,
+    get_read_db,
+    get_read_runner,
+    get_runner,
+    get_sessionmaker,
+    get_stream_identity,
+    require_roles,
+)
+from app.schemas.product import (
+    ProductBatchRequest,
+    ProductBatchResponse,
+    ProductChanges,
+    ProductCreate,
+    ProductEventsToken,
+    ProductImportReport,
+    ProductOut,
+    ProductStatsOut,
+    ProductStatsRecompute,
+    ProductStockDelta,
+    ProductTombstonePurge,
+    ProductUpdate,
+    product_list_adapter,
+)
+from app.services.product_service import (
+    ProductService,
+    change_events,
+    list_cache,
+    parse_fields,
+    product_etag,
+    stock_coalescer,
+)
 
 router = APIRouter(
     tags=["products"],
@@ -30,22 +96,41 @@ router = APIRouter(
     dependencies=[Depends(get_current_identity)],
 )
 
+# The event stream: EventSource cannot send a Bearer header, so it
+# authenticates with a stream token; included before 'router' (see main.py)
+events_router = APIRouter(tags=["products"])
+
 @router.get("/", response_model=List[ProductOut])
-def list_products(
+async def list_products(
     # --- Search ---
-    q: Optional[str] = Query(default=None, description="Search by name substring"),
+    q: Optional[str] = Query(default=None, description="Search by name substring (accent/case-insensitive)"),
     # --- Filtering ---
     min_price: Optional[float] = Query(default=None, ge=0, description="Minimum price"),
     max_price: Optional[float] = Query(default=None, ge=0, description="Maximum price"),
     min_qty:   Optional[int]   = Query(default=None, ge=0, description="Minimum quantity"),
     has_image: Optional[bool]  = Query(default=None, description="Filter by having image_url"),
     # --- Sorting ---
-    sort_by:   str = Query(default="name", description="Sort field: name|price|quantity|updated_at"),
+    sort_by:   str = Query(default="name", description="Sort field: name|price|quantity|updated_at|relevance (needs q)"),
     sort_dir:  str = Query(default="asc", description="Sort direction: asc|desc"),
-    db: Session = Depends(get_db),
+    # --- Pagination ---
+    limit:     int = Query(default=100, ge=1, le=1000, description="Page size"),
+    cursor:    Optional[str] = Query(default=None, description="Opaque cursor from X-Next-Cursor"),
+    # --- Projection ---
+    fields:    Optional[str] = Query(default=None, description="Comma-separated fields to return, e.g. id,name,price"),
+    if_none_match: Optional[str] = Header(default=None),
+    db: DbRunner = Depends(get_read_runner),
 ):
-    """List products with search, filtering and sorting."""
-    return ProductService(db).list(
+    """
+    List products with search, filtering, sorting and keyset pagination.
+    The body stays a plain list of at most 'limit' rows (100 by default);
+    when more rows exist the next page token is returned in the
+    X-Next-Cursor header. The whole catalog in one response is only
+    available from /products/export. Answers 304 when If-None-Match
+    carries the current ETag, before any row is loaded. With fields, only
+    those columns are read and returned (id is always included).
+    """
+    projection = parse_fields(fields)
+    params = dict(
         q=q,
         min_price=min_price,
         max_price=max_price,
@@ -53,16 +138,195 @@ def list_products(
         has_image=has_image,
         sort_by=sort_by,
         sort_dir=sort_dir,
+        limit=limit,
+        cursor=cursor,
+        fields=projection,
+    )
+
+    def _load(s):
+        service = ProductService(s)
+        etag = service.list_etag(**params)
+        if etag_matches(if_none_match, etag):
+            return etag, None
+        return etag, service.list(**params)
+
+    etag, page = await db.run(_load)
+    if page is None:
+        return Response(status_code=status.HTTP_304_NOT_MODIFIED, headers={"ETag": etag})
+    headers = {"ETag": etag}
+    if page.next_cursor:
+        headers["X-Next-Cursor"] = page.next_cursor
+    # Items are already validated: dump them straight to JSON bytes
+    return Response(
+        content=product_list_adapter(projection).dump_json(page.items),
+        media_type="application/json",
+        headers=headers,
+    )
+
+
+@router.get(
+    "/cache/stats",
+    dependencies=[Depends(require_roles("admin"))],
+)
+async def product_cache_stats():
+    """Hit/miss/eviction counters of the list query cache: admin only."""
+    return list_cache.stats()
+
+
+@router.get(
+    "/stock/stats",
+    dependencies=[Depends(require_roles("admin"))],
+)
+async def stock_coalescer_stats():
+    """Batch counters of stock delta coalescing (STOCK_COALESCE_MS): admin only."""
+    return stock_coalescer.stats()
+
+
+@router.get("/stats", response_model=ProductStatsOut)
+async def product_stats(db: DbRunner = Depends(get_runner)):
+    """SKU count, stock value and out/low-stock counts from the summary row."""
+    return await db.run(lambda s: ProductService(s).stats())
+
+
+@router.post(
+    "/stats/recompute",
+    response_model=ProductStatsRecompute,
+    dependencies=[Depends(require_roles("admin"))],
+)
+async def recompute_product_stats(db: DbRunner = Depends(get_runner)):
+    """Rebuild the summary from a full table scan and report drift: admin only."""
+    return await db.run(lambda s: ProductService(s).recompute_stats())
+
+
+# Media types for each export format
+_EXPORT_MEDIA_TYPES = {"ndjson": "application/x-ndjson", "csv": "text/csv"}
+
+# Declared before "/{product_id}" so "export" is not parsed as an id
+@router.get("/export")
+def export_products(
+    format:    str = Query(default="ndjson", pattern="^(ndjson|csv)$", description="Export format: ndjson|csv"),
+    q: Optional[str] = Query(default=None, description="Search by name substring (accent/case-insensitive)"),
+    min_price: Optional[float] = Query(default=None, ge=0, description="Minimum price"),
+    max_price: Optional[float] = Query(default=None, ge=0, description="Maximum price"),
+    min_qty:   Optional[int]   = Query(default=None, ge=0, description="Minimum quantity"),
+    has_image: Optional[bool]  = Query(default=None, description="Filter by having image_url"),
+    sort_by:   str = Query(default="name", description="Sort field: name|price|quantity|updated_at|relevance (needs q)"),
+    sort_dir:  str = Query(default="asc", description="Sort direction: asc|desc"),
+    db: Session = Depends(get_read_db),
+):
+    """Stream the whole filtered catalog as NDJSON or CSV without buffering it."""
+    chunks = ProductService(db).export(
+        format,
+        q=q,
+        min_price=min_price,
+        max_price=max_price,
+        min_qty=min_qty,
+        has_image=has_image,
+        sort_by=sort_by,
+        sort_dir=sort_dir,
+    )
+    return StreamingResponse(
+        chunks,
+        media_type=_EXPORT_MEDIA_TYPES[format],
+        headers={"Content-Disposition": f'attachment; filename="products.{format}"'},
+    )
+
+
+# Declared before "/{product_id}" so "changes" is not parsed as an id
+@router.get("/changes", response_model=ProductChanges)
+async def product_changes(
+    since: Optional[str] = Query(default=None, description="Token from a previous response; omit for a full sync"),
+    limit: int = Query(default=500, ge=1, le=5000, description="Maximum changes per page"),
+    db: DbRunner = Depends(get_read_runner),
+):
+    """
+    Products created, updated or deleted after 'since', in change order,
+    with the token for the next call. Costs O(changes), not O(catalog).
+    Answers 410 when the token is too old to list every deletion.
+    """
+    return await db.run(lambda s: ProductService(s).changes(since, limit))
+
+
+@router.post(
+    "/changes/purge",
+    response_model=ProductTombstonePurge,
+    dependencies=[Depends(require_roles("admin"))],
+)
+async def purge_product_tombstones(db: DbRunner = Depends(get_runner)):
+    """
+    Drop tombstones older than TOMBSTONE_RETENTION_DAYS: admin only. Meant
+    for a periodic job (cron); deletes never purge on their own.
+    """
+    return await db.run(lambda s: ProductService(s).purge_tombstones())
+
+
+@events_router.get("/events")
+async def product_events(identity: tuple = Depends(get_stream_identity)):
+    """
+    Server-sent events for product writes: "created" and "updated" carry the
+    product, "deleted" its id, "bulk" the counts of a batch or import. Each
+    event id is a sync token for /products/changes. "resync" means events
+    were dropped: catch up through /products/changes. Idle streams get a
+    heartbeat comment every EVENTS_HEARTBEAT_SECONDS; 503 when
+    EVENTS_MAX_SUBSCRIBERS streams are already open. Authenticated by a
+    ?token= from POST /products/events/token, checked only at connect.
+    """
+    if change_events.full:
+        raise HTTPException(
+            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+            detail="Too many open event streams",
+            headers={"Retry-After": "5"},
+        )
+    return StreamingResponse(
+        event_stream(change_events, settings.EVENTS_HEARTBEAT_SECONDS),
+        media_type="text/event-stream",
+        # No caching, and no response buffering in nginx-style proxies
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
     )
 
 
+# Declared before "/{product_id}" so "events" is not parsed as an id
+@router.post("/events/token", response_model=ProductEventsToken)
+async def product_events_token(identity: tuple = Depends(get_current_identity)):
+    """Mint a short-lived stream token for GET /products/events?token=..."""
+    user_id, role = identity
+    expires = settings.EVENTS_TOKEN_SECONDS
+    return ProductEventsToken(token=create_stream_token(str(user_id), role, expires), expires_in=expires)
+
+
+@router.get(
+    "/events/stats",
+    dependencies=[Depends(require_roles("admin"))],
+)
+async def product_events_stats():
+    """Open streams, queued frames and resyncs of the event broadcaster: admin only."""
+    return change_events.stats()
+
+
 @router.get("/{product_id}", response_model=ProductOut)
-def get_product(
+async def get_product(
     product_id: int,
-    db: Session = Depends(get_db),
+    fields: Optional[str] = Query(default=None, description="Comma-separated fields to return, e.g. id,name,price"),
+    if_none_match: Optional[str] = Header(default=None),
+    db: DbRunner = Depends(get_read_runner),
 ):
-    """Retrieve a product by id: allowed for any authenticated role."""
-    return ProductService(db).get(product_id)
+    """
+    Retrieve a product by id: allowed for any authenticated role.
+    Answers 304 when If-None-Match carries the current ETag.
+    """
+    projection = parse_fields(fields)
+
+    def _load(s):
+        service = ProductService(s)
+        etag = service.get_etag(product_id, projection)
+        if etag_matches(if_none_match, etag):
+            return etag, None
+        return etag, service.get(product_id, projection)
+
+    etag, product = await db.run(_load)
+    if product is None:
+        return Response(status_code=status.HTTP_304_NOT_MODIFIED, headers={"ETag": etag})
+    return Response(content=product.model_dump_json(), media_type="application/json", headers={"ETag": etag})
 
 @router.post(
     "/",
@@ -70,35 +334,148 @@ def get_product(
     status_code=status.HTTP_201_CREATED,
     dependencies=[Depends(require_roles("admin"))],
 )
-def create_product(
+async def create_product(
     payload: ProductCreate,
-    db: Session = Depends(get_db),
+    db: DbRunner = Depends(get_runner),
 ):
     """Create a new product: admin only."""
-    return ProductService(db).create(payload)
+    return await db.run(lambda s: ProductService(s).create(payload))
+
+@router.post(
+    "/batch",
+    response_model=ProductBatchResponse,
+    dependencies=[Depends(require_roles("admin"))],
+)
+async def batch_products(
+    payload: ProductBatchRequest,
+    db: DbRunner = Depends(get_runner),
+):
+    """Apply many create/update/delete operations in one transaction: admin only."""
+    return await db.run(lambda s: ProductService(s).batch(payload))
+
+# Accepted import media types, used when format= is not given
+_IMPORT_CONTENT_TYPES = {
+    "text/csv": "csv",
+    "application/x-ndjson": "ndjson",
+    "application/ndjson": "ndjson",
+    "application/jsonl": "ndjson",
+}
+
+class _RequestBodyReader(io.RawIOBase):
+    """
+    Blocking file object over a request body, for sync routes running in
+    the threadpool: each read pulls the next ASGI chunk from the event loop.
+    """
+
+    def __init__(self, request: Request) -> None:
+        self._chunks = request.stream()
+        self._pending = memoryview(b"")
+
+    def readable(self) -> bool:
+        return True
+
+    async def _next_chunk(self) -> Optional[bytes]:
+        try:
+            return await self._chunks.__anext__()
+        except StopAsyncIteration:
+            return None
+
+    def readinto(self, buffer) -> int:
+        while not self._pending:
+            chunk = anyio.from_thread.run(self._next_chunk)
+            if chunk is None:
+                return 0
+            self._pending = memoryview(chunk)
+        size = min(len(buffer), len(self._pending))
+        buffer[:size] = self._pending[:size]
+        self._pending = self._pending[size:]
+        return size
+
+@router.post(
+    "/import",
+    response_model=ProductImportReport,
+    dependencies=[Depends(require_roles("admin"))],
+    openapi_extra={"requestBody": {"required": True, "content": {
+        "text/csv": {"schema": {"type": "string", "description": "CSV with a header row"}},
+        "application/x-ndjson": {"schema": {"type": "string", "description": "One JSON object per line"}},
+    }}},
+)
+def import_products(
+    request: Request,
+    format: Optional[str] = Query(default=None, pattern="^(ndjson|csv)$", description="Body format: ndjson|csv"),
+    db: Session = Depends(get_db),
+):
+    """Bulk import products from a raw CSV or NDJSON request body: admin only."""
+    fmt = format
+    if fmt is None:
+        content_type = request.headers.get("content-type", "").split(";", 1)[0].strip().lower()
+        fmt = _IMPORT_CONTENT_TYPES.get(content_type)
+    if fmt is None:
+        raise HTTPException(
+            status_code=status.HTTP_415_UNSUPPORTED_MEDIA_TYPE,
+            detail="Send the rows as the raw body with Content-Type text/csv or application/x-ndjson, or pass format=csv|ndjson",
+        )
+    return ProductService(db).import_rows(io.BufferedReader(_RequestBodyReader(request)), fmt)
+
+@router.post(
+    "/{product_id}/stock",
+    response_model=ProductOut,
+    dependencies=[Depends(require_roles("admin"))],
+)
+async def adjust_product_stock(
+    product_id: int,
+    payload: ProductStockDelta,
+    db: DbRunner = Depends(get_runner),
+    sessions=Depends(get_sessionmaker),
+):
+    """
+    Add a signed delta to the quantity atomically: admin only.
+    Answers 409 when the delta would make stock negative. With
+    STOCK_COALESCE_MS > 0, deltas for the same product arriving within the
+    window are applied together in one statement, on a session of the
+    flush's own (it outlives the request that opened the window).
+    """
+    if stock_coalescer.enabled:
+        async def apply(deltas: List[int]) -> list:
+            async with open_runner(sessions) as flush_db:
+                return await flush_db.run(lambda s: ProductService(s).adjust_stock_many(product_id, deltas))
+
+        return await stock_coalescer.submit(product_id, payload.delta, apply)
+    return await db.run(lambda s: ProductService(s).adjust_stock(product_id, payload.delta))
 
 @router.put(
     "/{product_id}",
     response_model=ProductOut,
     dependencies=[Depends(require_roles("admin"))],
 )
-def update_product(
+async def update_product(
     product_id: int,
     payload: ProductUpdate,
-    db: Session = Depends(get_db),
+    response: Response,
+    if_match: Optional[str] = Header(default=None),
+    db: DbRunner = Depends(get_runner),
 ):
-    """Update an existing product: admin only."""
-    return ProductService(db).update(product_id, payload)
+    """
+    Update an existing product: admin only.
+    With If-Match, answers 412 unless it carries the current ETag.
+    """
+    product = await db.run(lambda s: ProductService(s).update(product_id, payload, if_match))
+    response.headers["ETag"] = product_etag(product.version)
+    return product
 
 @router.delete(
     "/{product_id}",
     status_code=status.HTTP_204_NO_CONTENT,
     dependencies=[Depends(require_roles("admin"))],
 )
-def delete_product(
+async def delete_product(
     product_id: int,
-    db: Session = Depends(get_db),
+    if_match: Optional[str] = Header(default=None),
+    db: DbRunner = Depends(get_runner),
 ):
-    """Delete a product: admin only."""
-    ProductService(db).delete(product_id)
+    """
+    Delete a product: admin only.
+    With If-Match, answers 412 unless it carries the current ETag.
+    """
+    await db.run(lambda s: ProductService(s).delete(product_id, if_match))
     return None
\ No newline at end of file
@@ -0,0 +1,31 @@
+"""
+File: system.py
+Description: Operational endpoints about the running service.
+Author: Jairo Céspedes
+Date: 2025-09-05
+
+Responsibilities:
+- Expose connection pool state and metrics (admin only).
+
+Notes:
+- Values are per process; with several workers each reports its own pools.
+"""
+
+from fastapi import APIRouter, Depends
+
+from app.db.session import engines, pool_metrics
+from app.deps import require_roles
+
+router = APIRouter(dependencies=[Depends(require_roles("admin"))])
+
+
+@router.get("/db-pool/stats")
+async def db_pool_stats():
+    """
+    Pool status and checkout metrics for each engine (primary, async and
+    every replica pool): admin only.
+    """
+    return {
+        name: {"status": e.pool.status(), **pool_metrics[name].stats()}
+        for name, e in engines.items()
+    }
@@ -0,0 +1,107 @@
+"""
+File: cache.py
+Description: In-process LRU + TTL cache with generation-based invalidation.
+Author: Jairo Céspedes
+Date: 2025-09-05
+
+Responsibilities:
+- Cache query results keyed by a hashable tuple.
+- Evict by least-recent use, age (TTL), entry count and memory budget.
+- Invalidate every entry at once by bumping a generation counter.
+- Track hit/miss/eviction counters.
+
+Notes:
+- The cache is per process; with several workers, writes handled by one
+  worker only invalidate its own cache and the TTL bounds staleness elsewhere.
+- Thread-safe: sync routes run in Starlette's threadpool.
+"""
+
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Dict, Hashable, Optional, Tuple
+
+
+class QueryCache:
+    """Bounded LRU cache whose entries expire after ttl seconds or on invalidate()."""
+
+    def __init__(self, *, max_entries: int, max_bytes: int, ttl_seconds: float) -> None:
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.ttl_seconds = ttl_seconds
+        self._lock = threading.Lock()
+        # key -> (generation, expires_at, size, value)
+        self._entries: "OrderedDict[Hashable, Tuple[int, float, int, Any]]" = OrderedDict()
+        self._bytes = 0
+        self._generation = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.invalidations = 0
+
+    @property
+    def generation(self) -> int:
+        """Current generation; capture it before a read and pass it to put()."""
+        return self._generation
+
+    def get(self, key: Hashable) -> Optional[Any]:
+        """Return a fresh cached value or None."""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+            generation, expires_at, _, value = entry
+            if generation != self._generation or expires_at <= time.monotonic():
+                self._drop(key)
+                self.evictions += 1
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return value
+
+    def put(self, key: Hashable, value: Any, size: int, generation: int) -> None:
+        """
+        Store a value computed under 'generation'. Values computed before a
+        write (stale generation) or larger than the whole budget are ignored.
+        """
+        if size > self.max_bytes:
+            return
+        with self._lock:
+            if generation != self._generation:
+                return
+            if key in self._entries:
+                self._drop(key)
+            self._entries[key] = (generation, time.monotonic() + self.ttl_seconds, size, value)
+            self._bytes += size
+            while len(self._entries) > self.max_entries or self._bytes > self.max_bytes:
+                self._drop(next(iter(self._entries)))
+                self.evictions += 1
+
+    def invalidate(self) -> None:
+        """Bump the generation and drop every entry."""
+        with self._lock:
+            self._generation += 1
+            self._entries.clear()
+            self._bytes = 0
+            self.invalidations += 1
+
+    def stats(self) -> Dict[str, Any]:
+        """Return counters and current occupancy."""
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "entries": len(self._entries),
+                "bytes": self._bytes,
+                "generation": self._generation,
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "invalidations": self.invalidations,
+                "hit_rate": round(self.hits / lookups, 4) if lookups else 0.0,
+            }
+
+    def _drop(self, key: Hashable) -> None:
+        _, _, size, _ = self._entries.pop(key)
+        self._bytes -= size
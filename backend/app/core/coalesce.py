@@ -0,0 +1,93 @@
+"""
+File: coalesce.py
+Description: Per-key write coalescing for hot rows.
+Author: Jairo Céspedes
+Date: 2025-09-05
+
+Responsibilities:
+- Buffer items submitted for the same key during a short window.
+- Hand each buffered batch to one apply callback (one DB round trip).
+- Deliver each caller its own result or exception.
+
+Notes:
+- Batches are per process and per event loop; they trade a few ms of
+  latency for one statement (and one row lock) per key per window.
+- The flush runs as its own task, so a caller that disconnects does not
+  strand the others in its batch. Pending flush tasks are referenced
+  until they finish (the loop only keeps weak references), and an
+  unexpected error fails the batch's callers and is logged.
+- The apply callback of a batch outlives the request that opened it, so
+  it must not use that request's session; it should open its own.
+"""
+
+import asyncio
+import logging
+from typing import Any, Awaitable, Callable, Dict, Hashable, List, Set, Tuple
+
+logger = logging.getLogger(__name__)
+
+# apply(items) -> one result (or Exception instance) per item, in order
+ApplyBatch = Callable[[List[Any]], Awaitable[List[Any]]]
+
+
+class WriteCoalescer:
+    """Group items per key for window_seconds, then apply them in one call."""
+
+    def __init__(self, window_seconds: float) -> None:
+        self.window_seconds = window_seconds
+        self._pending: Dict[Hashable, List[Tuple[Any, asyncio.Future]]] = {}
+        self._flushes: Set[asyncio.Task] = set()
+        self.batches = 0
+        self.items = 0
+
+    @property
+    def enabled(self) -> bool:
+        return self.window_seconds > 0
+
+    async def submit(self, key: Hashable, item: Any, apply: ApplyBatch) -> Any:
+        """
+        Queue 'item' under 'key' and wait for its result. The first caller
+        of a window schedules the flush with its own apply callback.
+        """
+        future = asyncio.get_running_loop().create_future()
+        batch = self._pending.get(key)
+        if batch is None:
+            batch = self._pending[key] = []
+            task = asyncio.create_task(self._flush(key, apply))
+            self._flushes.add(task)
+            task.add_done_callback(self._flushes.discard)
+        batch.append((item, future))
+        return await future
+
+    async def _flush(self, key: Hashable, apply: ApplyBatch) -> None:
+        await asyncio.sleep(self.window_seconds)
+        batch = self._pending.pop(key)
+        self.batches += 1
+        self.items += len(batch)
+        try:
+            results = await apply([item for item, _ in batch])
+        except Exception as exc:
+            results = [exc] * len(batch)
+        try:
+            for (_, future), result in zip(batch, results, strict=True):
+                if future.done():
+                    continue
+                if isinstance(result, Exception):
+                    future.set_exception(result)
+                else:
+                    future.set_result(result)
+        except Exception:
+            logger.exception("coalesced flush for %r failed", key)
+            for _, future in batch:
+                if not future.done():
+                    future.set_exception(RuntimeError("Coalesced write failed"))
+
+    def stats(self) -> Dict[str, Any]:
+        """Return batch counters and the average batch size."""
+        return {
+            "window_seconds": self.window_seconds,
+            "batches": self.batches,
+            "items": self.items,
+            "avg_batch": round(self.items / self.batches, 2) if self.batches else 0.0,
+            "pending_keys": len(self._pending),
+        }
@@ -5,7 +5,7 @@ Author: Jairo Céspedes
 Date: 2025-09-05
 
 Responsibilities:
-- Provide strongly-typed settings (database URL, JWT secret, algorithm, app name).
+- Provide strongly-typed settings (database URL, sync/async mode, JWT secret, algorithm, app name, caching).
 - Load environment variables with Pydantic BaseSettings.
 - Make settings accessible across the application.
 
@@ -14,6 +14,8 @@ Notes:
 - Update JWT_SECRET and DATABASE_URL for production deployments.
 """
 
+from typing import Optional
+
 from pydantic_settings import BaseSettings, SettingsConfigDict
 
 class Settings(BaseSettings):
@@ -22,10 +24,71 @@ class Settings(BaseSettings):
     APP_ENV: str = "dev"
 
     DATABASE_URL: str
+    # Async request path (AsyncSession); ASYNC_DATABASE_URL defaults to
+    # DATABASE_URL with the driver swapped (asyncpg / aiosqlite)
+    DB_ASYNC: bool = False
+    ASYNC_DATABASE_URL: Optional[str] = None
+
+    # Connection pool (per process, per engine); see app/db/pool.py
+    DB_POOL_SIZE: int = 5
+    DB_MAX_OVERFLOW: int = 10
+    DB_POOL_TIMEOUT: float = 30.0  # seconds to wait for a free connection
+    DB_POOL_RECYCLE: int = 1800  # seconds; -1 keeps connections forever
+    DB_PRE_PING: str = "idle"  # always | idle | never
+    DB_PRE_PING_IDLE_SECONDS: float = 30.0  # idle: ping only connections idle this long
+    DB_STATEMENT_TIMEOUT_MS: int = 0  # PostgreSQL statement_timeout; 0 disables
 
     JWT_SECRET: str
     JWT_ALG: str = "HS256"
     JWT_EXPIRES_HOURS: int = 8
+    # Password hashing: bcrypt cost and the process pool that runs it
+    BCRYPT_ROUNDS: int = 12
+    BCRYPT_WORKERS: int = 0  # 0 -> one per CPU core
+    BCRYPT_MAX_PENDING: int = 64  # queued + running jobs before answering 503
+    BCRYPT_RETRY_AFTER_SECONDS: int = 1
+
+    # Request/statement/pool metrics served at /metrics
+    METRICS_ENABLED: bool = True
+    # Per-request statement count/time headers; None -> on outside production
+    QUERY_STATS_HEADERS: Optional[bool] = None
+    # Log statements slower than this (ms) with params and plan; 0 disables
+    SLOW_QUERY_MS: float = 200.0
+    SLOW_QUERY_EXPLAIN: bool = True
+    # Append every request to this JSON-lines file for benchmarks/replay.py; empty disables
+    TRAFFIC_LOG_PATH: str = ""
+    TRAFFIC_LOG_MAX_BODY: int = 64 * 1024
+
+    # Read replicas (comma-separated sync URLs) for read-only routes; empty -> primary only
+    DATABASE_REPLICA_URLS: str = ""
+    # After a write, keep that user's reads on the primary this long
+    REPLICA_STICKY_SECONDS: float = 5.0
+    REPLICA_STICKY_MAX_USERS: int = 100000
+
+    # Verified-token LRU size; 0 disables the cache
+    TOKEN_CACHE_MAX_ENTRIES: int = 10000
+
+    # Product list query cache (per process)
+    PRODUCT_CACHE_ENABLED: bool = True
+    PRODUCT_CACHE_TTL_SECONDS: float = 30.0
+    PRODUCT_CACHE_MAX_ENTRIES: int = 256
+    PRODUCT_CACHE_MAX_BYTES: int = 64 * 1024 * 1024
+
+    # Products with 0 < quantity <= this count as low stock in /products/stats
+    LOW_STOCK_THRESHOLD: int = 5
+
+    # Keep tombstones of deleted products this long (POST /products/changes/purge);
+    # older sync tokens get 410
+    TOMBSTONE_RETENTION_DAYS: int = 30
+
+    # Buffer POST /products/{id}/stock deltas per SKU for this long; 0 disables
+    STOCK_COALESCE_MS: float = 0.0
+
+    # Server-sent product change events (/products/events, per process)
+    EVENTS_QUEUE_SIZE: int = 100  # frames buffered per subscriber before it must resync
+    EVENTS_MAX_SUBSCRIBERS: int = 10000  # open streams before answering 503
+    EVENTS_HEARTBEAT_SECONDS: float = 15.0
+    # Lifetime of the ?token= that EventSource clients connect with (checked at connect)
+    EVENTS_TOKEN_SECONDS: int = 60
 
     model_config = SettingsConfigDict(env_file=".env", case_sensitive=False)
 
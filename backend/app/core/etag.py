@@ -0,0 +1,66 @@
+"""
+File: etag.py
+Description: Helpers for HTTP entity tags and conditional requests.
+Author: Jairo Céspedes
+Date: 2025-09-05
+
+Responsibilities:
+- Build strong ETags from the values that identify a representation.
+- Evaluate If-None-Match / If-Match header values against an ETag.
+- Build version ETags for rows with a version counter and read the
+  versions back out of If-Match.
+
+Notes:
+- ETags are opaque to clients; they must not parse or build them.
+"""
+
+import hashlib
+import re
+from typing import Any, List, Optional
+
+# "v<version>" with an optional "-<variant>" for alternative representations
+_VERSION_ETAG = re.compile(r'^"v(\d+)(?:-[0-9a-f]+)?"$')
+
+
+def make_etag(*parts: Any) -> str:
+    """Return a strong, quoted ETag derived from the given parts."""
+    digest = hashlib.sha1(repr(parts).encode()).hexdigest()[:32]
+    return f'"{digest}"'
+
+
+def etag_matches(header: Optional[str], etag: str) -> bool:
+    """
+    Return True if a conditional header lists this ETag (or '*').
+    Uses weak comparison (a W/ prefix is ignored), as RFC 9110 requires
+    for If-None-Match.
+    """
+    if not header:
+        return False
+    candidates = [c.strip() for c in header.split(",")]
+    if "*" in candidates:
+        return True
+    return any(c.removeprefix("W/") == etag for c in candidates)
+
+
+def make_version_etag(version: int, *variant: Any) -> str:
+    """Strong ETag for a row version; 'variant' distinguishes representations."""
+    if not variant:
+        return f'"v{version}"'
+    return f'"v{version}-{hashlib.sha1(repr(variant).encode()).hexdigest()[:12]}"'
+
+
+def if_match_versions(header: str) -> Optional[List[int]]:
+    """
+    Versions listed in an If-Match header; None for '*' (any version).
+    Weak and foreign tags are skipped (If-Match uses strong comparison),
+    so an empty list means no current representation can match.
+    """
+    candidates = [c.strip() for c in header.split(",")]
+    if "*" in candidates:
+        return None
+    versions = []
+    for candidate in candidates:
+        match = _VERSION_ETAG.match(candidate)
+        if match:
+            versions.append(int(match.group(1)))
+    return versions
@@ -0,0 +1,163 @@
+"""
+File: events.py
+Description: In-process fan-out of change events to server-sent event streams.
+Author: Jairo Céspedes
+Date: 2025-09-05
+
+Responsibilities:
+- Keep one bounded queue per subscriber (an open SSE connection).
+- Encode each published event once and put the same frame in every queue.
+- Replace a full queue's backlog with a single "resync" event, so a slow
+  consumer costs a bounded amount of memory and knows it missed events.
+- Produce the SSE byte stream, with comment heartbeats while idle.
+
+Notes:
+- Subscribers are per process and bound to the event loop that serves
+  them; with several workers each one only sees its own writes, as with
+  the list cache.
+- publish() may be called from threadpool workers (sync DB path): the
+  fan-out is handed to the loop with one call_soon_threadsafe. Without
+  subscribers it returns at once.
+- Change events carry a sync token as their id: the change watermark
+  read after the write committed, so resuming from it never skips a
+  transaction that commits later with a lower number. After a resync
+  (or a reconnect) clients catch up through /products/changes from the
+  highest id they have seen; some changes may be sent twice.
+- An idle subscriber is a suspended coroutine, an empty deque and one
+  timer per heartbeat interval; nothing runs for it between heartbeats.
+"""
+
+import asyncio
+import json
+import threading
+from typing import Any, AsyncIterator, Dict, Optional, Set
+
+# Milliseconds EventSource clients wait before reconnecting
+_RETRY_MS = 3000
+
+
+class TooManySubscribers(Exception):
+    """Raised by subscribe() when max_subscribers streams are already open."""
+
+
+class Subscription:
+    """Bounded queue of encoded SSE frames for one subscriber."""
+
+    def __init__(self, maxsize: int) -> None:
+        self.queue: "asyncio.Queue[str]" = asyncio.Queue(maxsize)
+        self.resyncs = 0
+
+    def offer(self, frame: str, resync: str) -> None:
+        """Queue a frame; when full, drop the backlog and queue 'resync' instead."""
+        try:
+            self.queue.put_nowait(frame)
+        except asyncio.QueueFull:
+            while not self.queue.empty():
+                self.queue.get_nowait()
+            self.queue.put_nowait(resync)
+            self.resyncs += 1
+
+
+def encode_event(event: str, data: Dict[str, Any], event_id: Optional[str] = None) -> str:
+    """Render one SSE frame."""
+    head = f"id: {event_id}\n" if event_id else ""
+    return f"{head}event: {event}\ndata: {json.dumps(data, separators=(',', ':'), default=str)}\n\n"
+
+
+class ChangeBroadcaster:
+    """Publish/subscribe hub for one event loop."""
+
+    def __init__(self, *, queue_size: int, max_subscribers: int) -> None:
+        self.queue_size = queue_size
+        self.max_subscribers = max_subscribers
+        self._subscribers: Set[Subscription] = set()
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._lock = threading.Lock()
+        self.published = 0
+        self.resync_frame = encode_event("resync", {"reason": "slow consumer"})
+
+    def subscribe(self) -> Subscription:
+        """Register a subscriber on the running loop; raises TooManySubscribers."""
+        with self._lock:
+            if len(self._subscribers) >= self.max_subscribers:
+                raise TooManySubscribers()
+            if self._loop is None or self._loop.is_closed() or not self._subscribers:
+                # Streams of a closed loop can never be read again
+                self._subscribers.clear()
+                self._loop = asyncio.get_running_loop()
+            subscription = Subscription(self.queue_size)
+            self._subscribers.add(subscription)
+            return subscription
+
+    def unsubscribe(self, subscription: Subscription) -> None:
+        with self._lock:
+            self._subscribers.discard(subscription)
+
+    @property
+    def full(self) -> bool:
+        """True when subscribe() would raise TooManySubscribers."""
+        return len(self._subscribers) >= self.max_subscribers
+
+    @property
+    def active(self) -> bool:
+        """True while at least one stream is open (publishers skip building events otherwise)."""
+        return bool(self._subscribers)
+
+    def publish(self, event: str, data: Dict[str, Any], event_id: Optional[str] = None) -> None:
+        """Send an event to every subscriber; safe to call from any thread."""
+        loop = self._loop
+        if not self._subscribers or loop is None or loop.is_closed():
+            return
+        frame = encode_event(event, data, event_id)
+        self.published += 1
+        try:
+            running = asyncio.get_running_loop()
+        except RuntimeError:
+            running = None
+        if running is loop:
+            self._fan_out(frame)
+        else:
+            loop.call_soon_threadsafe(self._fan_out, frame)
+
+    def _fan_out(self, frame: str) -> None:
+        for subscription in list(self._subscribers):
+            subscription.offer(frame, self.resync_frame)
+
+    def stats(self) -> Dict[str, Any]:
+        """Return subscriber and delivery counters."""
+        subscribers = list(self._subscribers)
+        return {
+            "subscribers": len(subscribers),
+            "queued": sum(s.queue.qsize() for s in subscribers),
+            "published": self.published,
+            "resyncs": sum(s.resyncs for s in subscribers),
+        }
+
+
+async def event_stream(broadcaster: ChangeBroadcaster, heartbeat_seconds: float) -> AsyncIterator[str]:
+    """
+    Subscribe and yield SSE frames until the client goes away (the response
+    task is cancelled), with a comment line every heartbeat_seconds of
+    silence so proxies keep the connection open.
+    """
+    # Subscribing on the first iteration ties the slot to this generator's
+    # finally: a response that never starts streaming never holds one
+    try:
+        subscription = broadcaster.subscribe()
+    except TooManySubscribers:
+        # Lost the last slot after the route checked: end; the client retries
+        yield f"retry: {_RETRY_MS}\n\n"
+        return
+    try:
+        # Reconnect delay for EventSource clients; also opens the stream at once
+        yield f"retry: {_RETRY_MS}\n\n"
+        while True:
+            try:
+                async with asyncio.timeout(heartbeat_seconds):
+                    frame = await subscription.queue.get()
+            except TimeoutError:
+                yield ": heartbeat\n\n"
+                continue
+            yield frame
+    finally:
+        broadcaster.unsubscribe(subscription)
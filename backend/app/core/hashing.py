@@ -0,0 +1,88 @@
+"""
+File: hashing.py
+Description: Bounded process pool for bcrypt hashing and verification.
+Author: Jairo Céspedes
+Date: 2025-09-05
+
+Responsibilities:
+- Run bcrypt work in worker processes so it uses every core and never holds
+  the event loop or a request thread for ~250 ms.
+- Bound queued + running jobs; beyond the limit fail fast with PoolBusy so
+  callers can answer 503 + Retry-After instead of queueing forever.
+- Report whether a verified hash should be replaced (cost change).
+
+Notes:
+- Workers are started lazily with the "spawn" method (no forking of a
+  threaded server) and read BCRYPT_ROUNDS from the same settings.
+"""
+
+import asyncio
+import multiprocessing
+import os
+import threading
+from concurrent.futures import ProcessPoolExecutor
+from typing import Any, Callable, Optional, Tuple
+
+from app.core.config import settings
+from app.core.security import hash_password, verify_and_update_password
+
+
+class PoolBusy(Exception):
+    """Raised when the hashing queue is full."""
+
+
+class PasswordHasher:
+    """Async facade over a ProcessPoolExecutor with a pending-job limit."""
+
+    def __init__(self, workers: int, max_pending: int) -> None:
+        self.workers = workers or os.cpu_count() or 1
+        self.max_pending = max_pending
+        self._pool: Optional[ProcessPoolExecutor] = None
+        self._lock = threading.Lock()
+        self._pending = 0
+        self.rejected = 0
+
+    def _executor(self) -> ProcessPoolExecutor:
+        with self._lock:
+            if self._pool is None:
+                self._pool = ProcessPoolExecutor(
+                    max_workers=self.workers,
+                    mp_context=multiprocessing.get_context("spawn"),
+                )
+            return self._pool
+
+    async def _submit(self, fn: Callable[..., Any], *args: Any) -> Any:
+        with self._lock:
+            if self._pending >= self.max_pending:
+                self.rejected += 1
+                raise PoolBusy()
+            self._pending += 1
+        try:
+            loop = asyncio.get_running_loop()
+            return await loop.run_in_executor(self._executor(), fn, *args)
+        finally:
+            with self._lock:
+                self._pending -= 1
+
+    async def hash(self, plain: str) -> str:
+        """Hash a password in a worker process."""
+        return await self._submit(hash_password, plain)
+
+    async def verify(self, plain: str, hashed: str) -> Tuple[bool, Optional[str]]:
+        """Verify a password; also return a replacement hash if the cost changed."""
+        return await self._submit(verify_and_update_password, plain, hashed)
+
+    def stats(self) -> dict:
+        """Return pool size, in-flight jobs and rejections."""
+        with self._lock:
+            return {"workers": self.workers, "pending": self._pending, "rejected": self.rejected}
+
+    def shutdown(self) -> None:
+        """Stop worker processes (they are restarted on next use)."""
+        with self._lock:
+            pool, self._pool = self._pool, None
+        if pool is not None:
+            pool.shutdown(wait=True)
+
+
+password_hasher = PasswordHasher(settings.BCRYPT_WORKERS, settings.BCRYPT_MAX_PENDING)
@@ -0,0 +1,226 @@
+"""
+File: metrics.py
+Description: Minimal Prometheus-style metrics: counters, gauges, histograms.
+Author: Jairo Céspedes
+Date: 2025-09-05
+
+Responsibilities:
+- Hold labelled counters, gauges and histograms in a process-wide registry.
+- Record HTTP requests (ASGI middleware): count, in-flight and latency by
+  method, route template and status.
+- Hold the DB statement histogram fed by app/db/statements.py.
+- Render everything (plus connection pool metrics) in the Prometheus text
+  exposition format for GET /metrics.
+
+Notes:
+- No client library dependency; only what /metrics needs is implemented.
+- Labels use route templates ("/products/{product_id}"), never raw paths,
+  and statement verbs, never SQL text, so cardinality stays bounded.
+- Values are per process; scrape every worker (or aggregate upstream).
+"""
+
+import threading
+import time
+from bisect import bisect_left
+from typing import Any, Callable, Dict, Iterable, List, Sequence, Tuple
+
+# Latency buckets (seconds) shared by request and statement histograms
+DEFAULT_BUCKETS: Tuple[float, ...] = (
+    0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0,
+)
+
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _format_labels(names: Sequence[str], values: Sequence[str], extra: str = "") -> str:
+    parts = [f'{n}="{_escape(str(v))}"' for n, v in zip(names, values)]
+    if extra:
+        parts.append(extra)
+    return "{" + ",".join(parts) + "}" if parts else ""
+
+
+def _format_value(value: float) -> str:
+    if value == float("inf"):
+        return "+Inf"
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class _Metric:
+    kind = ""
+
+    def __init__(self, name: str, help: str, labelnames: Sequence[str] = ()) -> None:
+        self.name = name
+        self.help = help
+        self.labelnames = tuple(labelnames)
+        self._lock = threading.Lock()
+
+    def header(self) -> List[str]:
+        return [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} {self.kind}"]
+
+
+class Counter(_Metric):
+    """Monotonic counter per label set."""
+    kind = "counter"
+
+    def __init__(self, *args: Any, **kwargs: Any) -> None:
+        super().__init__(*args, **kwargs)
+        self._values: Dict[Tuple[str, ...], float] = {}
+
+    def inc(self, labels: Tuple[str, ...] = (), amount: float = 1) -> None:
+        with self._lock:
+            self._values[labels] = self._values.get(labels, 0) + amount
+
+    def value(self, labels: Tuple[str, ...] = ()) -> float:
+        return self._values.get(labels, 0)
+
+    def render(self) -> List[str]:
+        with self._lock:
+            items = list(self._values.items())
+        return self.header() + [
+            f"{self.name}{_format_labels(self.labelnames, k)} {_format_value(v)}" for k, v in items
+        ]
+
+
+class Gauge(Counter):
+    """Value that goes up and down per label set."""
+    kind = "gauge"
+
+    def dec(self, labels: Tuple[str, ...] = (), amount: float = 1) -> None:
+        self.inc(labels, -amount)
+
+
+class Histogram(_Metric):
+    """Bucketed observations per label set (cumulative on render)."""
+    kind = "histogram"
+
+    def __init__(self, *args: Any, buckets: Sequence[float] = DEFAULT_BUCKETS, **kwargs: Any) -> None:
+        super().__init__(*args, **kwargs)
+        self.buckets = tuple(buckets)
+        # labels -> [per-bucket counts (last is +Inf), sum]
+        self._values: Dict[Tuple[str, ...], List[Any]] = {}
+
+    def observe(self, labels: Tuple[str, ...], value: float) -> None:
+        index = bisect_left(self.buckets, value)
+        with self._lock:
+            entry = self._values.get(labels)
+            if entry is None:
+                entry = self._values[labels] = [[0] * (len(self.buckets) + 1), 0.0]
+            entry[0][index] += 1
+            entry[1] += value
+
+    def count(self, labels: Tuple[str, ...]) -> int:
+        entry = self._values.get(labels)
+        return sum(entry[0]) if entry else 0
+
+    def render(self) -> List[str]:
+        with self._lock:
+            items = [(k, list(counts), total) for k, (counts, total) in self._values.items()]
+        lines = self.header()
+        for labels, counts, total in items:
+            render_histogram(lines, self.name, self.labelnames, labels, self.buckets, counts, total)
+        return lines
+
+
+def render_histogram(
+    lines: List[str],
+    name: str,
+    labelnames: Sequence[str],
+    labels: Sequence[str],
+    buckets: Sequence[float],
+    counts: Sequence[int],
+    total: float,
+) -> None:
+    """Append _bucket/_sum/_count lines for one label set (counts are per bucket)."""
+    running = 0
+    for bound, count in zip(tuple(buckets) + (float("inf"),), counts):
+        running += count
+        le = f'le="{_format_value(bound)}"'
+        lines.append(f"{name}_bucket{_format_labels(labelnames, labels, le)} {running}")
+    lines.append(f"{name}_sum{_format_labels(labelnames, labels)} {_format_value(total)}")
+    lines.append(f"{name}_count{_format_labels(labelnames, labels)} {running}")
+
+
+class Registry:
+    """Ordered set of metrics plus callbacks for externally held values."""
+
+    def __init__(self) -> None:
+        self.metrics: List[_Metric] = []
+        self.collectors: List[Callable[[], Iterable[str]]] = []
+
+    def register(self, metric: _Metric) -> Any:
+        self.metrics.append(metric)
+        return metric
+
+    def render(self) -> str:
+        lines: List[str] = []
+        for metric in self.metrics:
+            lines.extend(metric.render())
+        for collect in self.collectors:
+            lines.extend(collect())
+        return "\n".join(lines) + "\n"
+
+
+registry = Registry()
+
+HTTP_REQUESTS = registry.register(Counter(
+    "http_requests_total", "HTTP requests handled.", ("method", "route", "status")))
+HTTP_IN_FLIGHT = registry.register(Gauge(
+    "http_requests_in_flight", "HTTP requests currently being handled."))
+HTTP_LATENCY = registry.register(Histogram(
+    "http_request_duration_seconds", "HTTP request latency, until the response body is sent.",
+    ("method", "route", "status")))
+DB_STATEMENTS = registry.register(Histogram(
+    "db_statement_duration_seconds", "Database statement execution time.", ("engine", "verb")))
+
+
+def route_template(scope: Dict[str, Any]) -> str:
+    """
+    Path template of the matched route, e.g. "/products/{product_id}".
+    Routes of included routers may only know their own part of the path,
+    so the static prefix in front of it is taken from the request path.
+    """
+    route = scope.get("route")
+    template = getattr(route, "path", None)
+    if template is None:
+        return "unmatched"
+    path = scope.get("path", "")
+    regex = getattr(route, "path_regex", None)
+    if regex is not None and not regex.match(path):
+        for index, char in enumerate(path):
+            if char == "/" and index and regex.match(path[index:]):
+                return path[:index] + template
+    return template
+
+
+class MetricsMiddleware:
+    """Pure ASGI middleware recording request count, in-flight and latency."""
+
+    def __init__(self, app: Any) -> None:
+        self.app = app
+
+    async def __call__(self, scope: Dict[str, Any], receive: Callable, send: Callable) -> None:
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        status = "500"
+
+        async def send_with_status(message: Dict[str, Any]) -> None:
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = str(message["status"])
+            await send(message)
+
+        HTTP_IN_FLIGHT.inc()
+        started = time.perf_counter()
+        try:
+            await self.app(scope, receive, send_with_status)
+        finally:
+            elapsed = time.perf_counter() - started
+            HTTP_IN_FLIGHT.dec()
+            labels = (scope["method"], route_template(scope), status)
+            HTTP_REQUESTS.inc(labels)
+            HTTP_LATENCY.observe(labels, elapsed)
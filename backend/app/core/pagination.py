@@ -0,0 +1,84 @@
+"""
+File: pagination.py
+Description: Opaque cursor tokens for keyset (seek) pagination.
+Author: Jairo Céspedes
+Date: 2025-09-05
+
+Responsibilities:
+- Encode the last (sort value, id) seen on a page into a URL-safe token.
+- Decode and validate tokens back into typed keyset values.
+- Encode/decode delta sync tokens (a (change number, id) sync position).
+
+Notes:
+- Tokens are bound to the sort field and direction they were issued for.
+- Tokens are opaque to clients but not signed; they only carry sort keys.
+"""
+
+import base64
+import json
+from datetime import datetime
+from decimal import Decimal
+from typing import Any, Tuple
+
+# Convert JSON-safe cursor values back into the type of each sort column
+_DECODERS = {
+    "name": str,
+    "price": Decimal,
+    "quantity": int,
+    "updated_at": datetime.fromisoformat,
+    "relevance": int,
+}
+
+
+def _to_json(value: Any) -> Any:
+    """Make a sort value JSON-serializable without losing precision."""
+    if isinstance(value, Decimal):
+        return str(value)
+    if isinstance(value, datetime):
+        return value.isoformat()
+    return value
+
+
+def encode_cursor(sort_by: str, sort_dir: str, value: Any, last_id: int) -> str:
+    """Build an opaque token for the row (value, last_id) under the given sort."""
+    raw = json.dumps(
+        {"s": sort_by, "d": sort_dir, "v": _to_json(value), "id": last_id},
+        separators=(",", ":"),
+    )
+    return base64.urlsafe_b64encode(raw.encode()).decode().rstrip("=")
+
+
+def decode_cursor(token: str, sort_by: str, sort_dir: str) -> Tuple[Any, int]:
+    """
+    Decode a token into (sort value, id).
+    Raises ValueError if the token is malformed or was issued for another sort.
+    """
+    try:
+        padded = token + "=" * (-len(token) % 4)
+        data = json.loads(base64.urlsafe_b64decode(padded.encode()))
+        if data["s"] != sort_by or data["d"] != sort_dir:
+            raise ValueError("Cursor does not match sort parameters")
+        return _DECODERS[sort_by](data["v"]), int(data["id"])
+    except (KeyError, TypeError, ArithmeticError, json.JSONDecodeError, UnicodeDecodeError) as exc:
+        raise ValueError("Malformed cursor") from exc
+
+
+def encode_sync_token(seq: int, last_id: int = 0) -> str:
+    """Build an opaque delta sync token for changes up to position (seq, last_id)."""
+    raw = json.dumps({"k": "sync", "seq": seq, "id": last_id}, separators=(",", ":"))
+    return base64.urlsafe_b64encode(raw.encode()).decode().rstrip("=")
+
+
+def decode_sync_token(token: str) -> Tuple[int, int]:
+    """Decode a delta sync token into (seq, id); raises ValueError if it is malformed."""
+    try:
+        padded = token + "=" * (-len(token) % 4)
+        data = json.loads(base64.urlsafe_b64decode(padded.encode()))
+        if data["k"] != "sync":
+            raise ValueError("Not a sync token")
+        seq, last_id = int(data["seq"]), int(data["id"])
+    except (KeyError, TypeError, ArithmeticError, json.JSONDecodeError, UnicodeDecodeError) as exc:
+        raise ValueError("Malformed sync token") from exc
+    if seq < 0 or last_id < 0:
+        raise ValueError("Malformed sync token")
+    return seq, last_id
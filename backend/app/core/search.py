@@ -0,0 +1,63 @@
+"""
+File: search.py
+Description: Text normalization and match-quality helpers for product search.
+Author: Jairo Céspedes
+Date: 2025-09-05
+
+Responsibilities:
+- Normalize text for accent- and case-insensitive matching.
+- Escape user input for LIKE patterns and FTS5 phrase queries.
+- Score match quality (exact, prefix, word prefix, substring).
+
+Notes:
+- normalize_search is applied both to stored names (Product.name_search)
+  and to the query, so matching never needs per-row functions in SQL.
+- relevance_score mirrors the SQL expression built by the repository and
+  is used to encode pagination cursors for sort_by=relevance.
+"""
+
+import unicodedata
+
+# Match buckets, best first; the name length breaks ties inside a bucket
+RELEVANCE_EXACT = 0
+RELEVANCE_PREFIX = 1
+RELEVANCE_WORD_PREFIX = 2
+RELEVANCE_SUBSTRING = 3
+RELEVANCE_BUCKET_SIZE = 1000
+
+# Shortest query that the trigram indexes can serve
+MIN_TRIGRAM_LENGTH = 3
+
+
+def normalize_search(text: str) -> str:
+    """Casefold and strip accents: 'Café Crème' -> 'cafe creme'."""
+    decomposed = unicodedata.normalize("NFKD", text or "")
+    stripped = "".join(c for c in decomposed if not unicodedata.combining(c))
+    return " ".join(stripped.casefold().split())
+
+
+def escape_like(text: str, escape: str = "\\") -> str:
+    """Escape LIKE wildcards so user input matches literally."""
+    return (
+        text.replace(escape, escape * 2)
+        .replace("%", escape + "%")
+        .replace("_", escape + "_")
+    )
+
+
+def fts_phrase(text: str) -> str:
+    """Quote text as a single FTS5 phrase."""
+    return '"' + text.replace('"', '""') + '"'
+
+
+def relevance_score(name_search: str, query: str) -> int:
+    """Score a normalized name against a normalized query; lower is better."""
+    if name_search == query:
+        bucket = RELEVANCE_EXACT
+    elif name_search.startswith(query):
+        bucket = RELEVANCE_PREFIX
+    elif f" {query}" in name_search:
+        bucket = RELEVANCE_WORD_PREFIX
+    else:
+        bucket = RELEVANCE_SUBSTRING
+    return bucket * RELEVANCE_BUCKET_SIZE + len(name_search)
@@ -6,23 +6,35 @@ Date: 2025-09-05
 
 Responsibilities:
 - Hash and verify passwords with bcrypt.
-- Generate JWT tokens with user id and role claims.
+- Generate JWT tokens with user id and role claims, and short-lived
+  stream tokens scoped to the event stream.
 - Decode and validate JWT tokens.
+- Cache verified tokens so repeat requests skip signature checks.
 
 Notes:
 - Tokens use HS256 algorithm by default.
+- Stream tokens travel in URLs (EventSource cannot send headers), so they
+  carry scope="events", expire in EVENTS_TOKEN_SECONDS and are refused as
+  Bearer tokens.
 - Secret key loaded from environment configuration.
+- The token cache stores only (user_id, role, exp) keyed by a SHA-256 digest
+  of the token, never the token itself; entries die at the token's exp.
 """
 
+import hashlib
+import threading
+import time
+from collections import OrderedDict
 from datetime import datetime, timedelta
-from typing import Optional
+from typing import Dict, Optional, Tuple
 
 from jose import jwt
 from passlib.context import CryptContext
 
 from app.core.config import settings
 
-pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
+# Hashes with a different cost than BCRYPT_ROUNDS are flagged for rehash
+pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto", bcrypt__rounds=settings.BCRYPT_ROUNDS)
 
 def hash_password(plain: str) -> str:
     """Hash a plain password using bcrypt."""
@@ -32,6 +44,10 @@ def verify_password(plain: str, hashed: str) -> bool:
     """Verify a plain password against a bcrypt hash."""
     return pwd_context.verify(plain, hashed)
 
+def verify_and_update_password(plain: str, hashed: str) -> Tuple[bool, Optional[str]]:
+    """Verify a password; on success also return a new hash if the cost changed."""
+    return pwd_context.verify_and_update(plain, hashed)
+
 def create_access_token(subject: str, role: str, expires_hours: Optional[int] = None) -> str:
     """Create a signed JWT token encoding the subject (user id) and role."""
     exp_hours = expires_hours or settings.JWT_EXPIRES_HOURS
@@ -42,4 +58,88 @@ def create_access_token(subject: str, role: str, expires_hours: Optional[int] =
         "iat": now,
         "exp": now + timedelta(hours=exp_hours),
     }
-    return jwt.encode(payload, settings.JWT_SECRET, algorithm=settings.JWT_ALG)
\ No newline at end of file
+    return jwt.encode(payload, settings.JWT_SECRET, algorithm=settings.JWT_ALG)
+
+# Scope claim of tokens that only open the event stream
+STREAM_TOKEN_SCOPE = "events"
+
+def create_stream_token(subject: str, role: str, expires_seconds: int) -> str:
+    """Create a short-lived JWT that only authorizes GET /products/events."""
+    now = datetime.utcnow()
+    payload = {
+        "sub": subject,
+        "role": role,
+        "scope": STREAM_TOKEN_SCOPE,
+        "iat": now,
+        "exp": now + timedelta(seconds=expires_seconds),
+    }
+    return jwt.encode(payload, settings.JWT_SECRET, algorithm=settings.JWT_ALG)
+
+
+class VerifiedTokenCache:
+    """Bounded LRU of tokens whose signature and claims were already verified."""
+
+    def __init__(self, max_entries: int) -> None:
+        self.max_entries = max_entries
+        self._lock = threading.Lock()
+        # digest -> (user_id, role, exp as epoch seconds)
+        self._entries: "OrderedDict[bytes, Tuple[int, str, float]]" = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+        self.expired = 0
+        self.evictions = 0
+
+    @staticmethod
+    def _digest(token: str) -> bytes:
+        return hashlib.sha256(token.encode()).digest()
+
+    def get(self, token: str) -> Optional[Tuple[int, str]]:
+        """Return (user_id, role) for a cached, unexpired token, else None."""
+        key = self._digest(token)
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+            user_id, role, exp = entry
+            if exp <= time.time():
+                del self._entries[key]
+                self.expired += 1
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return user_id, role
+
+    def put(self, token: str, user_id: int, role: str, exp: float) -> None:
+        """Remember a verified token until its expiry."""
+        if self.max_entries <= 0:
+            return
+        key = self._digest(token)
+        with self._lock:
+            self._entries[key] = (user_id, role, float(exp))
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+
+    def clear(self) -> None:
+        """Forget every cached token (e.g. after rotating JWT_SECRET)."""
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self) -> Dict[str, float]:
+        """Return counters and current size."""
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "entries": len(self._entries),
+                "hits": self.hits,
+                "misses": self.misses,
+                "expired": self.expired,
+                "evictions": self.evictions,
+                "hit_rate": round(self.hits / lookups, 4) if lookups else 0.0,
+            }
+
+
+token_cache = VerifiedTokenCache(settings.TOKEN_CACHE_MAX_ENTRIES)
@@ -0,0 +1,140 @@
+"""
+File: traffic.py
+Description: Request log recording for offline traffic replay.
+Author: Jairo Céspedes
+Date: 2025-09-05
+
+Responsibilities:
+- Record every HTTP request (ASGI middleware) as one JSON line: arrival
+  time, method, path, query, route template, caller role, JSON body,
+  status and duration.
+- Read a recorded log back for benchmarks/replay.py.
+
+Notes:
+- Enabled by TRAFFIC_LOG_PATH; lines are appended, so several runs (or
+  workers) can share a file and are ordered by "ts" when read back.
+- The role is read from the bearer token without verifying it: it only
+  tells the replay which identity to use, it grants nothing.
+- Tokens and passwords are never written: bodies of /auth requests are
+  dropped, and only application/json bodies up to TRAFFIC_LOG_MAX_BODY
+  bytes are kept (others are replayed without a body).
+"""
+
+import json
+import threading
+import time
+from typing import Any, Callable, Dict, Iterator, List, Optional
+
+from jose import jwt
+
+from app.core.metrics import route_template
+
+# Request paths whose bodies carry credentials
+_SENSITIVE_PREFIXES = ("/auth/",)
+
+
+def _role(headers: List[tuple]) -> str:
+    for name, value in headers:
+        if name == b"authorization":
+            scheme, _, token = value.decode("latin-1").partition(" ")
+            if scheme.lower() != "bearer" or not token:
+                return "invalid"
+            try:
+                return str(jwt.get_unverified_claims(token).get("role") or "invalid")
+            except Exception:
+                return "invalid"
+    return "anonymous"
+
+
+def _content_type(headers: List[tuple]) -> str:
+    for name, value in headers:
+        if name == b"content-type":
+            return value.decode("latin-1").split(";", 1)[0].strip().lower()
+    return ""
+
+
+class TrafficRecorder:
+    """Pure ASGI middleware appending one JSON line per HTTP request to a log file."""
+
+    def __init__(self, app: Any, *, path: str, max_body: int) -> None:
+        self.app = app
+        self.max_body = max_body
+        self._lock = threading.Lock()
+        self._file = open(path, "a", encoding="utf-8", buffering=1)
+
+    async def __call__(self, scope: Dict[str, Any], receive: Callable, send: Callable) -> None:
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        headers = scope.get("headers", [])
+        keep_body = (
+            self.max_body > 0
+            and _content_type(headers) == "application/json"
+            and not scope["path"].startswith(_SENSITIVE_PREFIXES)
+        )
+        chunks: List[bytes] = []
+        size = 0
+        status = 500
+
+        async def receive_and_keep() -> Dict[str, Any]:
+            nonlocal size, keep_body
+            message = await receive()
+            if keep_body and message["type"] == "http.request":
+                size += len(message.get("body", b""))
+                if size > self.max_body:
+                    keep_body = False
+                    chunks.clear()
+                else:
+                    chunks.append(message.get("body", b""))
+            return message
+
+        async def send_with_status(message: Dict[str, Any]) -> None:
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+            await send(message)
+
+        arrived = time.time()
+        started = time.perf_counter()
+        try:
+            await self.app(scope, receive_and_keep if keep_body else receive, send_with_status)
+        finally:
+            self._write({
+                "ts": round(arrived, 6),
+                "method": scope["method"],
+                "path": scope["path"],
+                "query": scope.get("query_string", b"").decode("latin-1"),
+                "route": route_template(scope),
+                "role": _role(headers),
+                "body": _decode(b"".join(chunks)) if keep_body else None,
+                "status": status,
+                "duration_ms": round((time.perf_counter() - started) * 1000, 3),
+            })
+
+    def _write(self, entry: Dict[str, Any]) -> None:
+        line = json.dumps(entry, separators=(",", ":"), default=str) + "\n"
+        with self._lock:
+            self._file.write(line)
+
+
+def _decode(body: bytes) -> Optional[Any]:
+    try:
+        return json.loads(body) if body else None
+    except ValueError:
+        return None
+
+
+def read_log(path: str) -> List[Dict[str, Any]]:
+    """Entries of a recorded log, oldest first; unreadable lines are skipped."""
+    return sorted(_entries(path), key=lambda e: e["ts"])
+
+
+def _entries(path: str) -> Iterator[Dict[str, Any]]:
+    with open(path, encoding="utf-8") as f:
+        for line in f:
+            try:
+                entry = json.loads(line)
+            except ValueError:
+                continue
+            if isinstance(entry, dict) and "ts" in entry and "method" in entry and "path" in entry:
+                yield entry
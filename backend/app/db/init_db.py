@@ -1,21 +1,63 @@
 """
 File: init_db.py
-Description: Helper for initializing database schema at application startup.
+Description: Helper for bringing the database schema up to date at startup.
 Author: Jairo Céspedes
 Date: 2025-09-05
 
 Responsibilities:
-- Create all tables from Base metadata if they do not exist.
-- Called during FastAPI startup event.
+- Run Alembic migrations (backend/alembic/versions) up to head.
+- Adopt databases created earlier by Base.metadata.create_all by stamping
+  the revision that matches their schema before upgrading.
+- Called by the container entrypoint, once, before the app workers start.
 
 Notes:
-- This is a simple alternative to migrations.
+- Migrations can also be run from backend/ with `alembic upgrade head`.
 """
 
+from pathlib import Path
+from typing import Optional
+
+from alembic import command
+from alembic.config import Config
+from sqlalchemy import inspect
+from sqlalchemy.engine import Connection, Engine
+
 from app.db.session import engine
-from app.db.base import Base
-from app.models import user, product
+
+# backend/ holds alembic.ini and the alembic/ script directory
+_BACKEND_DIR = Path(__file__).resolve().parents[2]
+
+
+def _legacy_revision(conn: Connection) -> Optional[str]:
+    """Revision matching a schema created without migrations, or None."""
+    insp = inspect(conn)
+    tables = set(insp.get_table_names())
+    if "alembic_version" in tables or "products" not in tables:
+        return None
+    columns = {c["name"] for c in insp.get_columns("products")}
+    return "0002" if "name_search" in columns else "0001"
+
+
+def alembic_config(conn: Connection) -> Config:
+    """Alembic config that runs migrations on the given connection."""
+    config = Config(str(_BACKEND_DIR / "alembic.ini"))
+    config.set_main_option("script_location", str(_BACKEND_DIR / "alembic"))
+    config.attributes["connection"] = conn
+    return config
+
+
+def run_migrations(bind: Engine, revision: str = "head") -> None:
+    """Upgrade the database behind 'bind' to the given revision."""
+    with bind.connect() as conn:
+        config = alembic_config(conn)
+        legacy = _legacy_revision(conn)
+        conn.commit()  # end the inspection transaction; Alembic manages its own
+        if legacy:
+            command.stamp(config, legacy)
+        command.upgrade(config, revision)
+        conn.commit()
+
 
 def init_db() -> None:
-    """Create tables if they do not exist (dev/local only)."""
-    Base.metadata.create_all(bind=engine)
\ No newline at end of file
+    """Apply pending migrations."""
+    run_migrations(engine)
@@ -0,0 +1,194 @@
+"""
+File: pool.py
+Description: Connection pool configuration and instrumentation.
+Author: Jairo Céspedes
+Date: 2025-09-05
+
+Responsibilities:
+- Translate DB_POOL_* / DB_PRE_PING / DB_STATEMENT_TIMEOUT_MS settings
+  into create_engine / create_async_engine keyword arguments.
+- Ping connections on checkout only when they sat idle (DB_PRE_PING=idle),
+  instead of one extra round trip on every checkout.
+- Record pool metrics: connections checked out, checkout wait histogram,
+  checkout timeouts, new connections and invalidations.
+- Render those metrics for the /metrics exposition.
+
+Notes:
+- Counts come from SQLAlchemy pool events (connect/checkout/checkin/
+  invalidate). Pool events fire only after a connection is handed out, so
+  checkout wait and timeouts are measured by a thin Pool.connect wrapper.
+- In-memory SQLite keeps SQLAlchemy's default single-connection pool;
+  size/overflow/timeout only apply to queue pools.
+"""
+
+import threading
+import time
+from bisect import bisect_left
+from typing import Any, Dict, Iterable, List, Tuple, Type
+
+from sqlalchemy import event, exc
+from sqlalchemy.engine import Engine, make_url
+from sqlalchemy.pool import AsyncAdaptedQueuePool, Pool, QueuePool
+
+from app.core.config import settings
+from app.core.metrics import render_histogram
+
+# Upper bounds (seconds) of the checkout wait histogram buckets
+WAIT_BUCKETS: Tuple[float, ...] = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+_PRE_PING_STRATEGIES = {"always", "idle", "never"}
+
+
+class PoolMetrics:
+    """Thread-safe pool counters and checkout wait histogram."""
+
+    def __init__(self, name: str) -> None:
+        self.name = name
+        self._lock = threading.Lock()
+        self.checked_out = 0
+        self.checkouts = 0
+        self.connects = 0
+        self.invalidations = 0
+        self.timeouts = 0
+        self.idle_pings = 0
+        # Non-cumulative counts per bucket; the last slot is +Inf
+        self.wait_counts: List[int] = [0] * (len(WAIT_BUCKETS) + 1)
+        self.wait_sum = 0.0
+
+    def observe_wait(self, seconds: float) -> None:
+        with self._lock:
+            self.wait_counts[bisect_left(WAIT_BUCKETS, seconds)] += 1
+            self.wait_sum += seconds
+
+    def add(self, counter: str, amount: int = 1) -> None:
+        with self._lock:
+            setattr(self, counter, getattr(self, counter) + amount)
+
+    def stats(self) -> Dict[str, Any]:
+        """Return counters plus a cumulative wait histogram ({le: count})."""
+        with self._lock:
+            cumulative, running = {}, 0
+            for bound, count in zip(WAIT_BUCKETS + (float("inf"),), self.wait_counts):
+                running += count
+                cumulative["+Inf" if bound == float("inf") else str(bound)] = running
+            return {
+                "checked_out": self.checked_out,
+                "checkouts": self.checkouts,
+                "connects": self.connects,
+                "invalidations": self.invalidations,
+                "timeouts": self.timeouts,
+                "idle_pings": self.idle_pings,
+                "wait_seconds": {"buckets": cumulative, "sum": round(self.wait_sum, 6), "count": running},
+            }
+
+
+class _MeteredPool:
+    """Mixin timing Pool.connect() (queue wait + connect) and counting timeouts."""
+    metrics: PoolMetrics
+
+    def connect(self):
+        started = time.perf_counter()
+        try:
+            conn = super().connect()
+        except exc.TimeoutError:
+            self.metrics.add("timeouts")
+            raise
+        self.metrics.observe_wait(time.perf_counter() - started)
+        return conn
+
+
+def _metered(base: Type[Pool], metrics: PoolMetrics) -> Type[Pool]:
+    # A subclass (not an instance patch) survives Pool.recreate() on dispose()
+    return type(f"Metered{base.__name__}", (_MeteredPool, base), {"metrics": metrics})
+
+
+def _uses_queue_pool(url: str) -> bool:
+    parsed = make_url(url)
+    return not (parsed.get_backend_name() == "sqlite" and parsed.database in (None, "", ":memory:"))
+
+
+def engine_options(url: str, metrics: PoolMetrics, *, is_async: bool = False) -> Dict[str, Any]:
+    """create_engine kwargs for 'url' built from the pool settings."""
+    strategy = settings.DB_PRE_PING
+    if strategy not in _PRE_PING_STRATEGIES:
+        raise ValueError(f"DB_PRE_PING must be one of {sorted(_PRE_PING_STRATEGIES)}")
+    options: Dict[str, Any] = {"pool_pre_ping": strategy == "always"}
+    if _uses_queue_pool(url):
+        options.update(
+            poolclass=_metered(AsyncAdaptedQueuePool if is_async else QueuePool, metrics),
+            pool_size=settings.DB_POOL_SIZE,
+            max_overflow=settings.DB_MAX_OVERFLOW,
+            pool_timeout=settings.DB_POOL_TIMEOUT,
+            pool_recycle=settings.DB_POOL_RECYCLE,
+            pool_use_lifo=True,  # idle connections age out instead of all being kept warm
+        )
+    timeout_ms = settings.DB_STATEMENT_TIMEOUT_MS
+    if timeout_ms and make_url(url).get_backend_name() == "postgresql":
+        if is_async:
+            options["connect_args"] = {"server_settings": {"statement_timeout": str(timeout_ms)}}
+        else:
+            options["connect_args"] = {"options": f"-c statement_timeout={timeout_ms}"}
+    return options
+
+
+def instrument(engine: Engine, metrics: PoolMetrics) -> None:
+    """Attach pool event listeners (counters and idle pre-ping) to an engine."""
+    idle_after = settings.DB_PRE_PING_IDLE_SECONDS
+    ping_idle = settings.DB_PRE_PING == "idle"
+
+    @event.listens_for(engine, "connect")
+    def _connect(dbapi_connection, record) -> None:
+        metrics.add("connects")
+
+    @event.listens_for(engine, "checkout")
+    def _checkout(dbapi_connection, record, proxy) -> None:
+        checked_in_at = record.info.get("checked_in_at")
+        if ping_idle and checked_in_at is not None and time.monotonic() - checked_in_at > idle_after:
+            metrics.add("idle_pings")
+            cursor = dbapi_connection.cursor()
+            try:
+                cursor.execute("SELECT 1")
+            except Exception as err:
+                # The pool discards this connection and retries with a new one
+                raise exc.DisconnectionError() from err
+            finally:
+                cursor.close()
+        metrics.add("checkouts")
+        metrics.add("checked_out")
+
+    @event.listens_for(engine, "checkin")
+    def _checkin(dbapi_connection, record) -> None:
+        record.info["checked_in_at"] = time.monotonic()
+        metrics.add("checked_out", -1)
+
+    @event.listens_for(engine, "invalidate")
+    def _invalidate(dbapi_connection, record, exception) -> None:
+        metrics.add("invalidations")
+
+
+# (metric suffix, PoolMetrics attribute, type, help) for the exposition format
+_EXPOSED = (
+    ("checked_out", "checked_out", "gauge", "Connections currently checked out."),
+    ("checkouts_total", "checkouts", "counter", "Connections handed out by the pool."),
+    ("connects_total", "connects", "counter", "New DBAPI connections opened."),
+    ("invalidations_total", "invalidations", "counter", "Connections invalidated."),
+    ("timeouts_total", "timeouts", "counter", "Checkouts that timed out waiting for a connection."),
+    ("idle_pings_total", "idle_pings", "counter", "Pings of idle connections on checkout."),
+)
+
+
+def render_pool_metrics(metrics: Iterable[PoolMetrics]) -> List[str]:
+    """Prometheus text lines for every engine's pool metrics."""
+    metrics = list(metrics)
+    lines: List[str] = []
+    for suffix, attr, kind, help in _EXPOSED:
+        name = f"db_pool_{suffix}"
+        lines += [f"# HELP {name} {help}", f"# TYPE {name} {kind}"]
+        lines += [f'{name}{{engine="{m.name}"}} {getattr(m, attr)}' for m in metrics]
+    name = "db_pool_wait_seconds"
+    lines += [f"# HELP {name} Time to obtain a connection from the pool.", f"# TYPE {name} histogram"]
+    for m in metrics:
+        with m._lock:
+            counts, total = list(m.wait_counts), m.wait_sum
+        render_histogram(lines, name, ("engine",), (m.name,), WAIT_BUCKETS, counts, total)
+    return lines
@@ -0,0 +1,51 @@
+"""
+File: routing.py
+Description: Read-your-writes bookkeeping for read-replica routing.
+Author: Jairo Céspedes
+Date: 2025-09-05
+
+Responsibilities:
+- Remember which users wrote recently, so their reads stay on the primary
+  for REPLICA_STICKY_SECONDS instead of hitting a replica that may lag.
+
+Notes:
+- Marks are per process; with several workers a user's next read may land
+  on a worker that did not see the write. Keep the window above the
+  expected replica lag and route sticky clients to one worker if needed.
+- Thread-safe: sync dependencies run in Starlette's threadpool.
+"""
+
+import threading
+import time
+from typing import Dict, Hashable
+
+
+class RecentWriters:
+    """Bounded map of writer -> time until which their reads go to the primary."""
+
+    def __init__(self, *, window_seconds: float, max_entries: int) -> None:
+        self.window_seconds = window_seconds
+        self.max_entries = max_entries
+        self._lock = threading.Lock()
+        self._until: Dict[Hashable, float] = {}
+
+    def mark(self, writer: Hashable) -> None:
+        """Pin the writer's reads to the primary for the next window."""
+        now = time.monotonic()
+        with self._lock:
+            self._until.pop(writer, None)
+            self._until[writer] = now + self.window_seconds
+            if len(self._until) > self.max_entries:
+                self._prune(now)
+
+    def is_recent(self, writer: Hashable) -> bool:
+        """True while the writer is inside its read-your-writes window."""
+        until = self._until.get(writer)
+        return until is not None and until > time.monotonic()
+
+    def _prune(self, now: float) -> None:
+        # Insertion order is mark order: drop expired marks, then the oldest
+        for writer in [w for w, until in self._until.items() if until <= now]:
+            del self._until[writer]
+        while len(self._until) > self.max_entries:
+            del self._until[next(iter(self._until))]
@@ -0,0 +1,79 @@
+"""
+File: runner.py
+Description: Run repository/service code on a sync or async session.
+Author: Jairo Céspedes
+Date: 2025-09-05
+
+Responsibilities:
+- Give async routes one way to execute session-bound code.
+- Sync mode: run it on a blocking Session in Starlette's threadpool.
+- Async mode: run it on an AsyncSession via run_sync, so DB I/O awaits on
+  the event loop (asyncpg / aiosqlite) instead of holding a thread.
+- Open a runner on a session of its own (open_runner) for work that
+  outlives the request that started it.
+
+Notes:
+- Repositories and services stay written against Session; under
+  AsyncSession.run_sync SQLAlchemy drives them through greenlets.
+- Code passed to run() must not do CPU-heavy work (e.g. bcrypt): in async
+  mode it executes on the event loop thread.
+- ORM objects must be converted (e.g. to Pydantic models) inside run().
+- Async mode shows no measured throughput gain: benchmarks/async_concurrency.py
+  gave 0.94x of sync on SQLite (100 concurrent clients) and it has not been
+  measured against PostgreSQL. Sync stays the default (DB_ASYNC=false).
+"""
+
+from abc import ABC, abstractmethod
+from contextlib import asynccontextmanager
+from typing import Any, AsyncIterator, Callable, TypeVar
+
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker
+from sqlalchemy.orm import Session
+from starlette.concurrency import run_in_threadpool
+
+T = TypeVar("T")
+
+
+class DbRunner(ABC):
+    """Executes a callable that takes a Session and returns its result."""
+
+    @abstractmethod
+    async def run(self, fn: Callable[[Session], T]) -> T:
+        ...
+
+
+class SyncRunner(DbRunner):
+    """Runs callables on a blocking Session in the threadpool."""
+
+    def __init__(self, session: Session) -> None:
+        self.session = session
+
+    async def run(self, fn: Callable[[Session], T]) -> T:
+        return await run_in_threadpool(fn, self.session)
+
+
+class AsyncRunner(DbRunner):
+    """Runs callables on an AsyncSession without leaving the event loop."""
+
+    def __init__(self, session: AsyncSession) -> None:
+        self.session = session
+
+    async def run(self, fn: Callable[[Session], T]) -> T:
+        return await self.session.run_sync(fn)
+
+
+@asynccontextmanager
+async def open_runner(sessions: Any) -> AsyncIterator[DbRunner]:
+    """
+    DbRunner on a new session from 'sessions' (a sessionmaker or an
+    async_sessionmaker), closed on exit.
+    """
+    if isinstance(sessions, async_sessionmaker):
+        async with sessions() as session:
+            yield AsyncRunner(session)
+        return
+    session = sessions()
+    try:
+        yield SyncRunner(session)
+    finally:
+        session.close()
@@ -8,17 +8,99 @@ Responsibilities:
 - Create a SQLAlchemy engine using DATABASE_URL from settings.
 - Provide a session factory (SessionLocal) for dependency injection.
 - Manage database sessions with scoped transactions.
+- Optionally create an AsyncEngine/AsyncSession factory (DB_ASYNC).
+- Size and instrument connection pools from settings (see app/db/pool.py).
+- Time statements (app/db/statements.py) and expose pool metrics on /metrics.
+- Optionally build one engine per read replica (DATABASE_REPLICA_URLS) and
+  hand out replica sessions round-robin.
 
 Notes:
 - PostgreSQL is the default database for production.
 - SQLite in-memory can be used for testing with session overrides.
+- The async path uses asyncpg on PostgreSQL and aiosqlite on SQLite.
+- Replicas are read-only by convention: only read routes use them (see
+  get_read_db in app/deps.py); writes always go to 'engine'.
 """
 
+import itertools
+from typing import Dict, List, Optional, Union
+
 from sqlalchemy import create_engine
+from sqlalchemy.engine import Engine, make_url
+from sqlalchemy.ext.asyncio import async_sessionmaker, create_async_engine
 from sqlalchemy.orm import sessionmaker
 
 from app.core.config import settings
+from app.core.metrics import registry
+from app.db.pool import PoolMetrics, engine_options, instrument, render_pool_metrics
+from app.db.statements import instrument_statements
+
+# Async drivers used when DB_ASYNC is enabled, by backend name
+_ASYNC_DRIVERS = {"postgresql": "asyncpg", "sqlite": "aiosqlite"}
+
+
+def async_database_url(url: str) -> str:
+    """Swap the driver of a sync URL for its asyncio counterpart."""
+    parsed = make_url(url)
+    driver = _ASYNC_DRIVERS.get(parsed.get_backend_name())
+    if driver is None:
+        raise ValueError(f"No async driver configured for '{parsed.get_backend_name()}'")
+    return parsed.set(drivername=f"{parsed.get_backend_name()}+{driver}").render_as_string(hide_password=False)
+
+
+# Every engine and its pool counters by name, exposed at /system/db-pool/stats
+engines: Dict[str, Engine] = {}
+pool_metrics = {"sync": PoolMetrics("sync")}
+
+# Create a single engine; pool size and pre-ping strategy come from settings
+engine = create_engine(settings.DATABASE_URL, **engine_options(settings.DATABASE_URL, pool_metrics["sync"]))
+instrument(engine, pool_metrics["sync"])
+instrument_statements(engine, "sync")
+engines["sync"] = engine
+SessionLocal = sessionmaker(bind=engine, autoflush=False, autocommit=False)
+
+# Async engine, only built when the async request path is selected
+async_engine = None
+AsyncSessionLocal = None
+if settings.DB_ASYNC:
+    _async_url = settings.ASYNC_DATABASE_URL or async_database_url(settings.DATABASE_URL)
+    pool_metrics["async"] = PoolMetrics("async")
+    async_engine = create_async_engine(_async_url, **engine_options(_async_url, pool_metrics["async"], is_async=True))
+    instrument(async_engine.sync_engine, pool_metrics["async"])
+    instrument_statements(async_engine.sync_engine, "async")
+    engines["async"] = async_engine.sync_engine
+    AsyncSessionLocal = async_sessionmaker(bind=async_engine, autoflush=False)
+
+# Read replicas, each with its own pool (and async pool when DB_ASYNC)
+replica_urls = [u.strip() for u in settings.DATABASE_REPLICA_URLS.split(",") if u.strip()]
+ReplicaSessions: List[sessionmaker] = []
+AsyncReplicaSessions: List[async_sessionmaker] = []
+for _index, _url in enumerate(replica_urls):
+    _name = f"replica{_index}"
+    pool_metrics[_name] = PoolMetrics(_name)
+    _replica = create_engine(_url, **engine_options(_url, pool_metrics[_name]))
+    instrument(_replica, pool_metrics[_name])
+    instrument_statements(_replica, _name)
+    engines[_name] = _replica
+    ReplicaSessions.append(sessionmaker(bind=_replica, autoflush=False, autocommit=False))
+    if settings.DB_ASYNC:
+        _name, _url = f"{_name}-async", async_database_url(_url)
+        pool_metrics[_name] = PoolMetrics(_name)
+        _replica_async = create_async_engine(_url, **engine_options(_url, pool_metrics[_name], is_async=True))
+        instrument(_replica_async.sync_engine, pool_metrics[_name])
+        instrument_statements(_replica_async.sync_engine, _name)
+        engines[_name] = _replica_async.sync_engine
+        AsyncReplicaSessions.append(async_sessionmaker(bind=_replica_async, autoflush=False))
+
+_replica_turn = itertools.count()
+
+
+def replica_sessionmaker(is_async: bool = False) -> Optional[Union[sessionmaker, async_sessionmaker]]:
+    """Next replica session factory (round-robin), or None without replicas."""
+    factories = AsyncReplicaSessions if is_async else ReplicaSessions
+    if not factories:
+        return None
+    return factories[next(_replica_turn) % len(factories)]
+
 
-# Create a single engine with pre-ping to avoid stale connections
-engine = create_engine(settings.DATABASE_URL, pool_pre_ping=True)
-SessionLocal = sessionmaker(bind=engine, autoflush=False, autocommit=False)
\ No newline at end of file
+registry.collectors.append(lambda: render_pool_metrics(pool_metrics.values()))
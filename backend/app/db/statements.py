@@ -0,0 +1,235 @@
+"""
+File: statements.py
+Description: Statement timing hooks, per-request query stats and slow-query log.
+Author: Jairo Céspedes
+Date: 2025-09-05
+
+Responsibilities:
+- Time every DBAPI execution on an engine (dialect do_execute* hooks).
+- Feed timings to the db_statement_duration_seconds histogram.
+- Count statements and DB time for the current request (QueryStats in a
+  context variable set by QueryStatsMiddleware or track_queries()).
+- Log statements slower than SLOW_QUERY_MS with parameter types and plan
+  (EXPLAIN on PostgreSQL, EXPLAIN QUERY PLAN on SQLite).
+
+Notes:
+- The context variable follows the request into Starlette's threadpool
+  (copied context) and into AsyncSession greenlets, so both DB paths count.
+- EXPLAIN without ANALYZE does not execute the statement, so it is safe for
+  writes; executemany batches are logged without a plan.
+- Only statements that succeeded are logged, and only SELECT, INSERT,
+  UPDATE and DELETE are explained (never DDL, SAVEPOINT, ...). The plan
+  runs on the caller's connection, inside its transaction: on PostgreSQL
+  it is wrapped in a savepoint, since a failing EXPLAIN would otherwise
+  abort the caller's transaction (migrations use these engines too).
+- Bound values are never logged, only their types: they include password
+  hashes and other user data.
+"""
+
+import logging
+import time
+from contextvars import ContextVar
+from typing import Any, Callable, Dict, Iterator, Optional
+from contextlib import contextmanager
+
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+from app.core.config import settings
+from app.core.metrics import DB_STATEMENTS
+
+logger = logging.getLogger("app.db.slow_query")
+
+# Plan prefix per dialect for the slow-query log
+_EXPLAIN = {"postgresql": "EXPLAIN ", "sqlite": "EXPLAIN QUERY PLAN "}
+
+# Statements worth a plan; everything else is logged without one
+_EXPLAINABLE = frozenset({"SELECT", "INSERT", "UPDATE", "DELETE"})
+
+# Dialects where a failed statement aborts the enclosing transaction
+_PLAN_IN_SAVEPOINT = frozenset({"postgresql"})
+
+# Longest statement / parameter text written to the slow-query log
+_LOG_MAX_CHARS = 2000
+
+
+class QueryStats:
+    """Statement count and cumulative DB time for one request."""
+
+    def __init__(self) -> None:
+        self.count = 0
+        self.seconds = 0.0
+        self.slow = 0
+
+    def headers(self) -> Dict[str, str]:
+        return {
+            "X-DB-Query-Count": str(self.count),
+            "X-DB-Query-Time-Ms": f"{self.seconds * 1000:.2f}",
+        }
+
+
+_current: ContextVar[Optional[QueryStats]] = ContextVar("query_stats", default=None)
+
+
+def current_query_stats() -> Optional[QueryStats]:
+    """QueryStats of the request being handled, or None outside a request."""
+    return _current.get()
+
+
+@contextmanager
+def track_queries() -> Iterator[QueryStats]:
+    """Collect statements executed in this context (and its threads/greenlets)."""
+    stats = QueryStats()
+    token = _current.set(stats)
+    try:
+        yield stats
+    finally:
+        _current.reset(token)
+
+
+def _verb(statement: str, context: Any) -> str:
+    if context is not None:
+        if context.isinsert:
+            return "INSERT"
+        if context.isupdate:
+            return "UPDATE"
+        if context.isdelete:
+            return "DELETE"
+    head = statement.lstrip()[:16].split(None, 1)
+    return head[0].upper() if head else "OTHER"
+
+
+def _plan(context: Any, statement: str, parameters: Any, dialect: str) -> str:
+    prefix = _EXPLAIN.get(dialect)
+    if prefix is None:
+        return "n/a"
+    savepoint = dialect in _PLAN_IN_SAVEPOINT
+    plan_cursor = None
+    try:
+        # The pooled connection hands out DBAPI cursors, adapted ones on async
+        # drivers (whose cursors have no .connection)
+        plan_cursor = context.root_connection.connection.cursor()
+        if savepoint:
+            plan_cursor.execute("SAVEPOINT slow_query_plan")
+        try:
+            if parameters:
+                plan_cursor.execute(prefix + statement, parameters)
+            else:
+                plan_cursor.execute(prefix + statement)
+            rows = plan_cursor.fetchall()
+        except Exception:
+            if savepoint:
+                plan_cursor.execute("ROLLBACK TO SAVEPOINT slow_query_plan")
+            raise
+        finally:
+            if savepoint:
+                plan_cursor.execute("RELEASE SAVEPOINT slow_query_plan")
+        return " / ".join(" ".join(str(c) for c in row) for row in rows)
+    except Exception as exc:  # the plan is best effort; never fail the request
+        return f"unavailable ({exc.__class__.__name__})"
+    finally:
+        if plan_cursor is not None:
+            plan_cursor.close()
+
+
+def _param_types(parameters: Any) -> str:
+    """Describe bound parameters by type only (values may be secrets)."""
+    if isinstance(parameters, dict):
+        return "{" + ", ".join(f"{k}: {type(v).__name__}" for k, v in parameters.items()) + "}"
+    if isinstance(parameters, (list, tuple)):
+        if parameters and isinstance(parameters[0], (dict, list, tuple)):
+            return f"{len(parameters)} x {_param_types(parameters[0])}"
+        return "(" + ", ".join(type(v).__name__ for v in parameters) + ")"
+    return "none" if parameters is None else type(parameters).__name__
+
+
+def _log_slow(
+    context: Any, statement: str, parameters: Any, elapsed: float, dialect: str, many: bool, verb: str
+) -> None:
+    if many:
+        plan = "n/a (executemany)"
+    elif not settings.SLOW_QUERY_EXPLAIN or verb not in _EXPLAINABLE:
+        plan = "n/a"
+    else:
+        plan = _plan(context, statement, parameters, dialect)
+    logger.warning(
+        "slow query %.1f ms: %s | params=%s | plan=%s",
+        elapsed * 1000,
+        statement[:_LOG_MAX_CHARS],
+        _param_types(parameters)[:_LOG_MAX_CHARS],
+        plan,
+    )
+
+
+def instrument_statements(engine: Engine, name: str) -> None:
+    """
+    Time every statement on 'engine'. Uses the dialect do_execute* hooks,
+    which wrap the DBAPI call in one listener and still delegate to the
+    dialect; a before/after_cursor_execute pair costs several times more.
+    """
+    dialect = engine.dialect
+    clock = time.perf_counter
+
+    def _timed(run: Callable, many: bool, cursor: Any, statement: str, parameters: Any, context: Any) -> bool:
+        started = clock()
+        failed = True
+        try:
+            if parameters is None:
+                run(cursor, statement, context)
+            else:
+                run(cursor, statement, parameters, context)
+            failed = False
+        finally:
+            elapsed = clock() - started
+            verb = _verb(statement, context)
+            if settings.METRICS_ENABLED:
+                DB_STATEMENTS.observe((name, verb), elapsed)
+            stats = _current.get()
+            if stats is not None:
+                stats.count += 1
+                stats.seconds += elapsed
+            threshold = settings.SLOW_QUERY_MS
+            # A failed statement is the caller's error to report; planning it
+            # would run more SQL on a connection that may be unusable
+            if threshold and not failed and elapsed * 1000 >= threshold:
+                if stats is not None:
+                    stats.slow += 1
+                _log_slow(context, statement, parameters, elapsed, dialect.name, many, verb)
+        return True  # handled: SQLAlchemy skips its own call
+
+    @event.listens_for(engine, "do_execute")
+    def _execute(cursor, statement, parameters, context) -> bool:
+        return _timed(dialect.do_execute, False, cursor, statement, parameters, context)
+
+    @event.listens_for(engine, "do_executemany")
+    def _executemany(cursor, statement, parameters, context) -> bool:
+        return _timed(dialect.do_executemany, True, cursor, statement, parameters, context)
+
+    @event.listens_for(engine, "do_execute_no_params")
+    def _execute_no_params(cursor, statement, context) -> bool:
+        return _timed(dialect.do_execute_no_params, False, cursor, statement, None, context)
+
+
+class QueryStatsMiddleware:
+    """
+    Pure ASGI middleware giving each request its own QueryStats and, when
+    enabled, returning the totals as X-DB-Query-Count / X-DB-Query-Time-Ms.
+    """
+
+    def __init__(self, app: Any, *, headers: bool) -> None:
+        self.app = app
+        self.emit_headers = headers
+
+    async def __call__(self, scope: Dict[str, Any], receive: Callable, send: Callable) -> None:
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        with track_queries() as stats:
+
+            async def send_with_stats(message: Dict[str, Any]) -> None:
+                if self.emit_headers and message["type"] == "http.response.start":
+                    extra = [(k.lower().encode(), v.encode()) for k, v in stats.headers().items()]
+                    message = {**message, "headers": list(message.get("headers", [])) + extra}
+                await send(message)
+
+            await self.app(scope, receive, send_with_stats)
@@ -5,57 +5,182 @@ Author: Jairo Céspedes
 Date: 2025-09-05
 
 Responsibilities:
-- Provide database session dependency (get_db).
-- Extract current user id and role from Bearer JWT (get_current_identity).
+- Provide database session dependencies (get_db, get_async_db); each
+  session carries the request's QueryStats in session.info["query_stats"].
+- Provide a DbRunner for async routes (get_runner), sync or async per DB_ASYNC.
+- Provide the session factory for work that outlives a request (get_sessionmaker).
+- Route read-only routes to a replica (get_read_db, get_read_runner),
+  except for users who wrote within REPLICA_STICKY_SECONDS.
+- Extract current user id and role from Bearer JWT (get_current_identity),
+  or from a ?token= stream token for the event stream (get_stream_identity).
 - Enforce role-based access using require_roles dependency.
 
 Notes:
 - Invalid or missing tokens raise HTTP 401.
 - Unauthorized roles raise HTTP 403.
+- Auth dependencies are async so they never occupy a threadpool slot.
+- require_roles marks the caller as a recent writer on unsafe methods
+  (POST/PUT/PATCH/DELETE), before and after the route runs.
 """
 
-from fastapi import HTTPException, Security, status, Request, Depends
+from fastapi import HTTPException, Query, Security, status, Request, Depends
 from fastapi.security import HTTPAuthorizationCredentials, HTTPBearer
 from jose import jwt, JWTError
+from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.orm import Session
 
 from app.core.config import settings
+from app.core.security import STREAM_TOKEN_SCOPE, token_cache
+from app.db import session as db_session
+from app.db.routing import RecentWriters
+from app.db.runner import AsyncRunner, DbRunner, SyncRunner
 from app.db.session import SessionLocal
+from app.db.statements import current_query_stats
 
 bearer_scheme = HTTPBearer(auto_error=True)
 
+# Users whose reads stay on the primary after a write (read-your-writes)
+recent_writers = RecentWriters(
+    window_seconds=settings.REPLICA_STICKY_SECONDS,
+    max_entries=settings.REPLICA_STICKY_MAX_USERS,
+)
+
+_SAFE_METHODS = frozenset({"GET", "HEAD", "OPTIONS"})
+
 def get_db():
     """Yield a DB session per request and close it afterwards."""
     db = SessionLocal()
+    db.info["query_stats"] = current_query_stats()
     try:
         yield db
     finally:
         db.close()
 
-def get_current_identity(
+async def get_async_db():
+    """Yield an AsyncSession per request (requires DB_ASYNC)."""
+    if db_session.AsyncSessionLocal is None:
+        raise RuntimeError("Async database path is disabled; set DB_ASYNC=true")
+    async with db_session.AsyncSessionLocal() as db:
+        db.info["query_stats"] = current_query_stats()
+        yield db
+
+async def sync_runner(db: Session = Depends(get_db)) -> DbRunner:
+    """Run session code on a blocking Session in the threadpool."""
+    return SyncRunner(db)
+
+async def async_runner(db: AsyncSession = Depends(get_async_db)) -> DbRunner:
+    """Run session code on an AsyncSession on the event loop."""
+    return AsyncRunner(db)
+
+# Selected once at import time from settings
+get_runner = async_runner if settings.DB_ASYNC else sync_runner
+
+
+def get_sessionmaker():
+    """Session factory matching get_runner, for work that outlives the request (see open_runner)."""
+    return db_session.AsyncSessionLocal if settings.DB_ASYNC else SessionLocal
+
+
+async def get_current_identity(
     credentials: HTTPAuthorizationCredentials = Security(bearer_scheme),
 ) -> tuple[int, str]:
     """
     Decode JWT from Bearer token and return (user_id, role).
+    Tokens verified before are served from token_cache until they expire.
     """
     token = credentials.credentials
+    cached = token_cache.get(token)
+    if cached is not None:
+        return cached
     try:
         payload = jwt.decode(token, settings.JWT_SECRET, algorithms=[settings.JWT_ALG])
         sub = payload.get("sub")
         role = payload.get("role")
-        if sub is None or role is None:
+        # Scoped tokens (event stream) are not API credentials
+        if sub is None or role is None or payload.get("scope") is not None:
             raise ValueError("Invalid token payload")
-        return int(sub), role
+        identity = int(sub), role
+        if payload.get("exp") is not None:
+            token_cache.put(token, identity[0], role, payload["exp"])
+        return identity
     except (JWTError, ValueError):
         raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="Invalid token")
 
+async def get_stream_identity(
+    token: str = Query(description="Stream token from POST /products/events/token"),
+) -> tuple[int, str]:
+    """
+    Decode the short-lived stream token an EventSource passes as ?token=
+    (browsers cannot set an Authorization header on it); return (user_id, role).
+    """
+    try:
+        payload = jwt.decode(token, settings.JWT_SECRET, algorithms=[settings.JWT_ALG])
+        if payload.get("scope") != STREAM_TOKEN_SCOPE or payload.get("role") is None:
+            raise ValueError("Not a stream token")
+        return int(payload["sub"]), payload["role"]
+    except (JWTError, KeyError, TypeError, ValueError):
+        raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="Invalid stream token")
+
 def require_roles(*allowed_roles: str):
     """
     Dependency factory that enforces role-based access.
     """
-    def _dep(identity: tuple[int, str] = Depends(get_current_identity)) -> tuple[int, str]:
+    async def _dep(request: Request, identity: tuple[int, str] = Depends(get_current_identity)):
         user_id, role = identity
         if allowed_roles and role not in allowed_roles:
             raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="Insufficient role")
-        return identity
-    return _dep
\ No newline at end of file
+        if request.method in _SAFE_METHODS:
+            yield identity
+            return
+        # Mark before (reads racing the write) and after (the window starts at commit)
+        recent_writers.mark(user_id)
+        try:
+            yield identity
+        finally:
+            recent_writers.mark(user_id)
+    return _dep
+
+def get_read_db(
+    identity: tuple[int, str] = Depends(get_current_identity),
+    primary: Session = Depends(get_db),
+):
+    """
+    Yield a replica session for read-only routes, or the primary session
+    when there are no replicas or the caller wrote recently. The unused
+    primary session never checks out a connection.
+    """
+    factory = db_session.replica_sessionmaker()
+    if factory is None or recent_writers.is_recent(identity[0]):
+        yield primary
+        return
+    db = factory()
+    db.info["replica"] = True
+    db.info["query_stats"] = current_query_stats()
+    try:
+        yield db
+    finally:
+        db.close()
+
+async def get_async_read_db(
+    identity: tuple[int, str] = Depends(get_current_identity),
+    primary: AsyncSession = Depends(get_async_db),
+):
+    """Async counterpart of get_read_db."""
+    factory = db_session.replica_sessionmaker(is_async=True)
+    if factory is None or recent_writers.is_recent(identity[0]):
+        yield primary
+        return
+    async with factory() as db:
+        db.info["replica"] = True
+        db.info["query_stats"] = current_query_stats()
+        yield db
+
+async def sync_read_runner(db: Session = Depends(get_read_db)) -> DbRunner:
+    """Like sync_runner, on a replica session when one may be used."""
+    return SyncRunner(db)
+
+async def async_read_runner(db: AsyncSession = Depends(get_async_read_db)) -> DbRunner:
+    """Like async_runner, on a replica session when one may be used."""
+    return AsyncRunner(db)
+
+get_read_runner = async_read_runner if settings.DB_ASYNC else sync_read_runner
@@ -7,23 +7,40 @@ Date: 2025-09-05
 Responsibilities:
 - Initialize FastAPI instance with title and configuration.
 - Configure CORS middleware for cross-origin requests.
-- Include routers for authentication and product APIs.
-- Run startup events such as database initialization.
+- Include routers for authentication, product and system (ops) APIs.
+- Stop the bcrypt worker pool on shutdown (lifespan).
 - Provide healthcheck endpoint for monitoring.
+- Record request metrics and serve them at /metrics (Prometheus format).
+- Count statements per request (X-DB-Query-Count / X-DB-Query-Time-Ms).
+- Optionally record a request log for traffic replay (TRAFFIC_LOG_PATH).
 
 Notes:
 - API documentation available at /docs and /redoc.
 - All routes are prefixed according to their domain (e.g., /auth, /products).
+- Migrations are not run here: every worker would run them, racing each
+  other. The container entrypoint (or `alembic upgrade head`) applies
+  them once before uvicorn starts.
 """
 from contextlib import asynccontextmanager
-from fastapi import FastAPI
+from fastapi import FastAPI, Response
 from fastapi.middleware.cors import CORSMiddleware
 
-from app.api import auth, products
+from app.api import auth, products, system
 from app.core.config import settings
-from app.db.init_db import init_db
+from app.core.hashing import password_hasher
+from app.core.metrics import CONTENT_TYPE, MetricsMiddleware, registry
+from app.core.traffic import TrafficRecorder
+from app.db.statements import QueryStatsMiddleware
 
-app = FastAPI(title=settings.APP_NAME)
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    """Stop the bcrypt worker processes on shutdown."""
+    yield
+    password_hasher.shutdown()
+
+
+app = FastAPI(title=settings.APP_NAME, lifespan=lifespan)
 
 # CORS: adjust origins
 app.add_middleware(
@@ -32,22 +49,35 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=["X-Next-Cursor", "ETag", "X-DB-Query-Count", "X-DB-Query-Time-Ms"],
 )
 
+# Request-scoped statement count/time; headers only outside production
+_query_headers = settings.QUERY_STATS_HEADERS
+if _query_headers is None:
+    _query_headers = settings.APP_ENV.lower() not in ("prod", "production")
+app.add_middleware(QueryStatsMiddleware, headers=_query_headers)
+
+# Request log for offline replay (benchmarks/replay.py)
+if settings.TRAFFIC_LOG_PATH:
+    app.add_middleware(TrafficRecorder, path=settings.TRAFFIC_LOG_PATH, max_body=settings.TRAFFIC_LOG_MAX_BODY)
+
+# Outermost middleware, so latency covers the whole stack
+if settings.METRICS_ENABLED:
+    app.add_middleware(MetricsMiddleware)
+
 # Routers
 app.include_router(auth.router, prefix="/auth", tags=["auth"])
+app.include_router(products.events_router, prefix="/products", tags=["products"])
 app.include_router(products.router, prefix="/products", tags=["products"])
+app.include_router(system.router, prefix="/system", tags=["system"])
 
-@asynccontextmanager
-async def lifespan(app: FastAPI):
-    # Code to execute during startup
-    """Create tables if they do not exist (local/dev only)."""
-    init_db()
-    yield
-    # Code to execute during shutdown
-    print("Application shutdown!")
-    
 @app.get("/")
 def healthcheck():
     """Simple health endpoint."""
-    return {"status": "ok", "app": settings.APP_NAME}
\ No newline at end of file
+    return {"status": "ok", "app": settings.APP_NAME}
+
+@app.get("/metrics", include_in_schema=False)
+def metrics():
+    """Request, DB statement and pool metrics in Prometheus text format."""
+    return Response(content=registry.render(), media_type=CONTENT_TYPE)
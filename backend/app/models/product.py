@@ -5,31 +5,187 @@ Author: Jairo Céspedes
 Date: 2025-09-05
 
 Responsibilities:
-- Define `products` table with fields id, name, description, price, quantity, image_url, updated_at.
+- Define `products` table with fields id, name, description, price, quantity, image_url, updated_at, version.
+- Keep a normalized `name_search` column backed by a trigram index.
+- Declare composite/partial indexes matching the list filters and sorts.
 - Represent products in the inventory system.
+- Define the single-row `product_stats` summary kept in step with products.
+- Stamp every product write with its transaction's change number (change_seq) and
+  keep tombstones of deleted products, for delta sync (/products/changes).
 
 Notes:
 - Price is stored as numeric (float).
-- updated_at auto-refreshes on modification.
+- updated_at auto-refreshes on modification. On SQLite it is stored as
+  text in CURRENT_TIMESTAMP's format (whole seconds), and values bound
+  from Python use that same format, so keyset bounds compare like the
+  stored strings.
+- version starts at 1 and is bumped in SQL by every UPDATE statement
+  (ORM, Core or bulk); it backs the product ETag and If-Match checks.
+- name_search follows name on ORM writes; bulk Core statements in
+  ProductRepository set it explicitly.
+- Schema changes ship as Alembic migrations (backend/alembic/versions);
+  indexes declared here must match them.
+- Search indexes are dialect-specific: pg_trgm GIN on PostgreSQL and an
+  FTS5 trigram table kept in sync by triggers on SQLite.
+- product_stats is maintained by ProductRepository inside each write
+  transaction; see app/repositories/product_stats_repo.py.
+- change_seq is the writing transaction's id on PostgreSQL and a number
+  from the single-row product_change_counter on SQLite; see
+  app/repositories/product_change_repo.py.
 """
 
-from sqlalchemy import String, Integer, Numeric, DateTime, func
-from sqlalchemy.orm import Mapped, mapped_column
+from sqlalchemy import DDL, BigInteger, Index, String, Integer, Numeric, DateTime, event, func, literal_column, text
+from sqlalchemy.dialects import sqlite
+from sqlalchemy.orm import Mapped, mapped_column, validates
 from decimal import Decimal
 from datetime import datetime
 
+from app.core.config import settings
+from app.core.search import normalize_search
 from app.db.base import Base
 
+# SQLite compares DATETIME as text: bind values like CURRENT_TIMESTAMP writes them
+# ('YYYY-MM-DD HH:MM:SS'), not with the default '.ffffff' suffix
+_Timestamp = DateTime().with_variant(
+    sqlite.DATETIME(storage_format="%(year)04d-%(month)02d-%(day)02d %(hour)02d:%(minute)02d:%(second)02d"),
+    "sqlite",
+)
+
 class Product(Base):
     """Product entity for inventory management."""
     __tablename__ = "products"
+    __table_args__ = (
+        # (sort column, id) pairs serve every sort_by with keyset pagination
+        Index("ix_products_name_id", "name", "id"),
+        Index("ix_products_price_id", "price", "id"),
+        Index("ix_products_quantity_id", "quantity", "id"),
+        Index("ix_products_updated_at_id", "updated_at", "id"),
+        # Delta sync pages rows by (change number, id)
+        Index("ix_products_change_seq_id", "change_seq", "id"),
+        # Partial index for has_image=true under the default name sort
+        Index(
+            "ix_products_with_image_name_id",
+            "name",
+            "id",
+            postgresql_where=text("image_url IS NOT NULL AND image_url <> ''"),
+            sqlite_where=text("image_url IS NOT NULL AND image_url <> ''"),
+        ),
+    )
 
     id: Mapped[int] = mapped_column(Integer, primary_key=True, index=True)
-    name: Mapped[str] = mapped_column(String(255), nullable=False, index=True)
+    name: Mapped[str] = mapped_column(String(255), nullable=False)
+    # Accent/case-folded copy of name used by search; see app.core.search
+    name_search: Mapped[str] = mapped_column(String(255), nullable=False, default="", server_default="")
     description: Mapped[str] = mapped_column(String(1000), nullable=True)
     price: Mapped["Decimal"] = mapped_column(Numeric(12, 2), nullable=False)
     quantity: Mapped[int] = mapped_column(Integer, nullable=False, default=0)
     image_url: Mapped[str] = mapped_column(String(512), nullable=True)
     updated_at: Mapped["datetime"] = mapped_column(
-        DateTime, server_default=func.now(), onupdate=func.now(), nullable=False
-    )
\ No newline at end of file
+        _Timestamp, server_default=func.now(), onupdate=func.now(), nullable=False
+    )
+    # Optimistic-concurrency counter: SET version = version + 1 on every UPDATE
+    version: Mapped[int] = mapped_column(
+        Integer, nullable=False, default=1, server_default="1", onupdate=literal_column("version") + 1
+    )
+    # Sequence number of the last write; set explicitly by ProductRepository
+    change_seq: Mapped[int] = mapped_column(BigInteger, nullable=False, default=0, server_default="0")
+
+    @validates("name")
+    def _sync_name_search(self, key: str, value: str) -> str:
+        """Keep name_search in step with name for ORM writes."""
+        self.name_search = normalize_search(value)
+        return value
+
+
+
+class ProductStats(Base):
+    """Inventory totals over all products (a single row, id=1)."""
+    __tablename__ = "product_stats"
+
+    id: Mapped[int] = mapped_column(Integer, primary_key=True)
+    sku_count: Mapped[int] = mapped_column(Integer, nullable=False, default=0)
+    total_units: Mapped[int] = mapped_column(BigInteger, nullable=False, default=0)
+    stock_value: Mapped["Decimal"] = mapped_column(Numeric(18, 2), nullable=False, default=0)
+    out_of_stock: Mapped[int] = mapped_column(Integer, nullable=False, default=0)
+    low_stock: Mapped[int] = mapped_column(Integer, nullable=False, default=0)
+    # Threshold low_stock was counted with; a different setting forces a recompute
+    low_stock_threshold: Mapped[int] = mapped_column(Integer, nullable=False)
+    recomputed_at: Mapped["datetime"] = mapped_column(DateTime, server_default=func.now(), nullable=False)
+
+class ProductTombstone(Base):
+    """Marker left by a deleted product, so delta sync can report the deletion."""
+    __tablename__ = "product_tombstones"
+    __table_args__ = (
+        Index("ix_product_tombstones_change_seq_product_id", "change_seq", "product_id"),
+    )
+
+    id: Mapped[int] = mapped_column(Integer, primary_key=True)
+    product_id: Mapped[int] = mapped_column(Integer, nullable=False)
+    change_seq: Mapped[int] = mapped_column(BigInteger, nullable=False)
+    deleted_at: Mapped["datetime"] = mapped_column(DateTime, server_default=func.now(), nullable=False, index=True)
+
+
+class ProductChangeCounter(Base):
+    """Last change number handed out on SQLite, and the purge mark (a single row, id=1)."""
+    __tablename__ = "product_change_counter"
+
+    id: Mapped[int] = mapped_column(Integer, primary_key=True)
+    value: Mapped[int] = mapped_column(BigInteger, nullable=False, default=0)
+    # Highest change_seq of a purged tombstone; older sync tokens are expired
+    purged_through: Mapped[int] = mapped_column(BigInteger, nullable=False, default=0, server_default="0")
+
+# --- Search indexes (created together with the table) ---
+_products = Product.__table__
+
+event.listen(
+    _products,
+    "before_create",
+    DDL("CREATE EXTENSION IF NOT EXISTS pg_trgm").execute_if(dialect="postgresql"),
+)
+event.listen(
+    _products,
+    "after_create",
+    DDL(
+        "CREATE INDEX IF NOT EXISTS ix_products_name_search_trgm "
+        "ON products USING gin (name_search gin_trgm_ops)"
+    ).execute_if(dialect="postgresql"),
+)
+
+# SQLite: external-content FTS5 table with the trigram tokenizer
+SQLITE_SEARCH_DDL = [
+    "CREATE VIRTUAL TABLE IF NOT EXISTS products_search USING fts5("
+    "name_search, content='products', content_rowid='id', tokenize='trigram')",
+    "CREATE TRIGGER IF NOT EXISTS products_search_ai AFTER INSERT ON products BEGIN "
+    "INSERT INTO products_search(rowid, name_search) VALUES (new.id, new.name_search); END",
+    "CREATE TRIGGER IF NOT EXISTS products_search_ad AFTER DELETE ON products BEGIN "
+    "INSERT INTO products_search(products_search, rowid, name_search) "
+    "VALUES ('delete', old.id, old.name_search); END",
+    "CREATE TRIGGER IF NOT EXISTS products_search_au AFTER UPDATE OF name_search ON products BEGIN "
+    "INSERT INTO products_search(products_search, rowid, name_search) "
+    "VALUES ('delete', old.id, old.name_search); "
+    "INSERT INTO products_search(rowid, name_search) VALUES (new.id, new.name_search); END",
+]
+for _stmt in SQLITE_SEARCH_DDL:
+    event.listen(_products, "after_create", DDL(_stmt).execute_if(dialect="sqlite"))
+event.listen(
+    _products,
+    "after_drop",
+    DDL("DROP TABLE IF EXISTS products_search").execute_if(dialect="sqlite"),
+)
+
+# The summary row exists from the start, as in migration 0004
+event.listen(
+    ProductStats.__table__,
+    "after_create",
+    DDL(
+        "INSERT INTO product_stats (id, sku_count, total_units, stock_value, out_of_stock, low_stock, "
+        f"low_stock_threshold) VALUES (1, 0, 0, 0, 0, 0, {int(settings.LOW_STOCK_THRESHOLD)})"
+    ),
+)
+
+# The change counter row exists from the start, as in migration 0006
+event.listen(
+    ProductChangeCounter.__table__,
+    "after_create",
+    DDL("INSERT INTO product_change_counter (id, value, purged_through) VALUES (1, 0, 0)"),
+)
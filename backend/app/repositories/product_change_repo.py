@@ -0,0 +1,169 @@
+"""
+File: product_change_repo.py
+Description: Repository for change sequence numbers and tombstones (delta sync).
+Author: Jairo Céspedes
+Date: 2025-09-05
+
+Responsibilities:
+- Number each write transaction (change_seq) without a lock shared by writers.
+- Report the commit-visibility watermark: every change numbered below it
+  is committed and visible.
+- Record tombstones for deleted products and purge expired ones.
+- Read products and tombstones changed between a sync position and the
+  watermark, in (change_seq, id) order.
+
+Notes:
+- On PostgreSQL (13+) a write is numbered with its transaction id
+  (pg_current_xact_id), so writers share no row, counter or sequence
+  lock. Transaction ids do not commit in order; the watermark is
+  pg_snapshot_xmin of the current snapshot, the oldest transaction still
+  in flight. Every transaction below it has finished, so no row can
+  appear below the watermark after it was read: a sync position there is
+  final. Works on replicas too (their snapshot lists the primary's
+  running transactions).
+- On SQLite, which runs one writer at a time, numbers come from the
+  single-row product_change_counter (one UPDATE per write transaction)
+  and the watermark is its value + 1.
+- All rows of a transaction share its number, so readers page by
+  (change_seq, id). Rows written before delta sync existed carry 0.
+- allocate() runs in the caller's transaction, never commits and is
+  cached per transaction: take it before any savepoint, so a rolled
+  back savepoint cannot undo the counter update on SQLite.
+- Purged tombstones raise purged_through; sync positions at or below it
+  can no longer report every deletion and must restart from scratch.
+"""
+
+from datetime import datetime
+from typing import Any, List, Optional, Sequence, Tuple
+
+from sqlalchemy import BigInteger, Text, case, cast, delete, func, insert, literal, select, tuple_, update
+from sqlalchemy.orm import Session
+
+from app.models.product import Product, ProductChangeCounter, ProductTombstone
+
+# The counter is a single row
+_COUNTER_ID = 1
+
+
+class ProductChangeRepository:
+    """Data access layer for change numbers, the watermark and tombstones."""
+    def __init__(self, db: Session) -> None:
+        self.db = db
+        # Number handed out by allocate() for the current (or last) transaction
+        self.last_seq = 0
+        self._allocated_in: Optional[Any] = None
+
+    @property
+    def _postgres(self) -> bool:
+        return self.db.get_bind().dialect.name == "postgresql"
+
+    def allocate(self) -> int:
+        """Return the change number of the current transaction; does not commit."""
+        transaction = self.db.get_transaction()
+        if transaction is not None and transaction is self._allocated_in:
+            return self.last_seq
+        if self._postgres:
+            seq = self.db.execute(select(cast(cast(func.pg_current_xact_id(), Text), BigInteger))).scalar_one()
+        else:
+            seq = self.db.execute(
+                update(ProductChangeCounter)
+                .where(ProductChangeCounter.id == _COUNTER_ID)
+                .values(value=ProductChangeCounter.value + 1)
+                .returning(ProductChangeCounter.value)
+            ).scalar_one_or_none()
+            if seq is None:
+                # Row removed by hand: start over (migrations and create_all insert it)
+                self.db.execute(insert(ProductChangeCounter).values(id=_COUNTER_ID, value=1, purged_through=0))
+                seq = 1
+        self.last_seq = seq
+        self._allocated_in = self.db.get_transaction()
+        return seq
+
+    def _watermark(self) -> Any:
+        """SQL expression for the watermark (see Notes)."""
+        if self._postgres:
+            return cast(cast(func.pg_snapshot_xmin(func.pg_current_snapshot()), Text), BigInteger)
+        return func.coalesce(
+            select(ProductChangeCounter.value + 1)
+            .where(ProductChangeCounter.id == _COUNTER_ID)
+            .scalar_subquery(),
+            1,
+        )
+
+    def tombstone(self, product_ids: Sequence[int], seq: int) -> None:
+        """Record deletions made by the transaction numbered 'seq'; does not commit."""
+        if product_ids:
+            self.db.execute(
+                insert(ProductTombstone),
+                [{"product_id": pid, "change_seq": seq} for pid in product_ids],
+            )
+
+    def purge(self, deleted_before: datetime) -> int:
+        """Drop tombstones older than 'deleted_before' and expire tokens that needed them."""
+        purged = list(self.db.execute(
+            delete(ProductTombstone)
+            .where(ProductTombstone.deleted_at < deleted_before)
+            .returning(ProductTombstone.change_seq)
+        ).scalars())
+        if purged:
+            newest = max(purged)
+            current = ProductChangeCounter.purged_through
+            self.db.execute(
+                update(ProductChangeCounter)
+                .where(ProductChangeCounter.id == _COUNTER_ID)
+                .values(purged_through=case((current < newest, newest), else_=current))
+            )
+        return len(purged)
+
+    def watermark(self) -> Tuple[int, int]:
+        """Return (watermark, purged_through) in one statement."""
+        purged_through = (
+            select(ProductChangeCounter.purged_through)
+            .where(ProductChangeCounter.id == _COUNTER_ID)
+            .scalar_subquery()
+        )
+        watermark, purged = self.db.execute(select(self._watermark(), func.coalesce(purged_through, 0))).one()
+        return watermark, purged
+
+    def marker(self) -> Tuple[int, ...]:
+        """
+        Value that changes whenever a product write commits, for ETags: the
+        watermark plus the count and number sum of products and tombstones
+        at or above it. Transactions committing above the watermark land in
+        that window (their rows move into it or a tombstone appears); one
+        statement over the change_seq indexes.
+        """
+        watermark = self._watermark()
+        window = Product.change_seq >= watermark
+        row = self.db.execute(select(
+            watermark,
+            select(func.count()).where(window).scalar_subquery(),
+            select(func.coalesce(func.sum(Product.change_seq), 0)).where(window).scalar_subquery(),
+            select(func.count()).where(ProductTombstone.change_seq >= watermark).scalar_subquery(),
+        )).one()
+        return tuple(row)
+
+    def products_since(self, after: Tuple[int, int], below: int, limit: int) -> List[Product]:
+        """Products written after position 'after' by transactions below 'below', oldest first."""
+        stmt = (
+            select(Product)
+            .where(tuple_(Product.change_seq, Product.id) > tuple_(literal(after[0]), literal(after[1])))
+            .where(Product.change_seq < below)
+            .order_by(Product.change_seq, Product.id)
+            .limit(limit)
+        )
+        return list(self.db.execute(stmt).scalars())
+
+    def tombstones_since(self, after: Tuple[int, int], below: int, limit: int) -> List[Tuple[int, int]]:
+        """(product_id, change_seq) of deletions after 'after' and below 'below', oldest first."""
+        stmt = (
+            select(ProductTombstone.product_id, ProductTombstone.change_seq)
+            .where(
+                tuple_(ProductTombstone.change_seq, ProductTombstone.product_id)
+                > tuple_(literal(after[0]), literal(after[1]))
+            )
+            .where(ProductTombstone.change_seq < below)
+            .order_by(ProductTombstone.change_seq, ProductTombstone.product_id)
+            .limit(limit)
+        )
+        return [tuple(r) for r in self.db.execute(stmt)]
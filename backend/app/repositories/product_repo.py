@@ -6,19 +6,51 @@ Date: 2025-09-05
 
 Responsibilities:
 - Query products with optional filters (name, price, quantity, has_image).
+- Search names through the normalized name_search column and its trigram index.
 - Support sorting by name, price, quantity, or updated_at.
+- Support keyset pagination on (sort column, id).
+- Select only requested columns for sparse reads.
+- Stream large result sets in batches through a server-side cursor.
+- Provide a cheap change probe (row version) for conditional requests.
+- Make updates and deletes conditional on the row version (optimistic locking).
 - Provide CRUD operations (create, get, update, delete).
+- Apply atomic relative stock changes (quantity = quantity + delta).
+- Apply bulk create/update/delete batches in a single transaction.
+- Keep the product_stats summary in step within each write transaction.
+- Stamp every written row with its transaction's change number and leave
+  tombstones for deleted rows (delta sync, see product_change_repo.py);
+  purge expired tombstones on demand.
 
 Notes:
 - Uses SQLAlchemy select statements for efficiency.
-- Return values are SQLAlchemy ORM Product instances.
+- Return values are SQLAlchemy ORM Product instances, or Rows when a
+  column projection is requested.
 """
 
-from typing import List, Optional
+from datetime import datetime, timedelta, timezone
+from typing import Any, Callable, Dict, Iterable, Iterator, List, Optional, Sequence, Set, Tuple
 from sqlalchemy.orm import Session
-from sqlalchemy import select, and_, or_, asc, desc
+from sqlalchemy import (
+    Select, select, insert, update, delete, and_, or_, asc, desc, case, func,
+    literal, literal_column, table, text, tuple_,
+)
+from sqlalchemy.exc import SQLAlchemyError
 
+from app.core.config import settings
+from app.core.search import (
+    MIN_TRIGRAM_LENGTH,
+    RELEVANCE_BUCKET_SIZE,
+    RELEVANCE_EXACT,
+    RELEVANCE_PREFIX,
+    RELEVANCE_SUBSTRING,
+    RELEVANCE_WORD_PREFIX,
+    escape_like,
+    fts_phrase,
+    normalize_search,
+)
 from app.models.product import Product
+from app.repositories.product_change_repo import ProductChangeRepository
+from app.repositories.product_stats_repo import ProductStatsRepository
 from app.schemas.product import ProductCreate, ProductUpdate
 
 # Map logical sort field names to model columns
@@ -30,10 +62,105 @@ _SORT_COLUMNS = {
 }
 
 
+def _filter_conditions(
+    q: Optional[str],
+    min_price: Optional[float],
+    max_price: Optional[float],
+    min_qty: Optional[int],
+    has_image: Optional[bool],
+    dialect: str,
+) -> List[Any]:
+    """Translate search and filter parameters into WHERE conditions."""
+    conds = []
+
+    # --- Search (normalized substring; served by the trigram indexes) ---
+    qn = normalize_search(q) if q else ""
+    if qn:
+        conds.append(Product.name_search.like(f"%{escape_like(qn)}%", escape="\\"))
+        if dialect == "sqlite" and len(qn) >= MIN_TRIGRAM_LENGTH:
+            # Narrow candidates through the FTS5 trigram table first
+            matches = (
+                select(literal_column("rowid"))
+                .select_from(table("products_search"))
+                .where(text("products_search MATCH :fts").bindparams(fts=fts_phrase(qn)))
+            )
+            conds.append(Product.id.in_(matches))
+
+    # --- Filters ---
+    if min_price is not None:
+        conds.append(Product.price >= min_price)
+    if max_price is not None:
+        conds.append(Product.price <= max_price)
+    if min_qty is not None:
+        conds.append(Product.quantity >= min_qty)
+    if has_image is True:
+        conds.append(and_(Product.image_url.is_not(None), Product.image_url != ""))
+    elif has_image is False:
+        conds.append(or_(Product.image_url.is_(None), Product.image_url == ""))
+    return conds
+
+
+def _sort_expression(sort_by: str, q: Optional[str]) -> Any:
+    """Column (or relevance score for sort_by=relevance) used to order rows."""
+    if sort_by == "relevance" and q:
+        qn = escape_like(normalize_search(q))
+        bucket = case(
+            (Product.name_search == normalize_search(q), RELEVANCE_EXACT),
+            (Product.name_search.like(f"{qn}%", escape="\\"), RELEVANCE_PREFIX),
+            (Product.name_search.like(f"% {qn}%", escape="\\"), RELEVANCE_WORD_PREFIX),
+            else_=RELEVANCE_SUBSTRING,
+        )
+        return bucket * RELEVANCE_BUCKET_SIZE + func.length(Product.name_search)
+    return _SORT_COLUMNS.get(sort_by, Product.name)
+
+
+def _with_search_name(values: Dict[str, Any]) -> Dict[str, Any]:
+    """Add name_search to bulk rows (Core statements skip ORM validators)."""
+    if "name" in values:
+        return {**values, "name_search": normalize_search(values["name"])}
+    return values
+
+
+def _with_change_seq(rows: List[Dict[str, Any]], seq: int) -> List[Dict[str, Any]]:
+    """Bulk rows with name_search and the transaction's change_seq."""
+    return [{**_with_search_name(r), "change_seq": seq} for r in rows]
+
+
+def _update_returning_old(conds: List[Any], values: Dict[str, Any]) -> Any:
+    """
+    UPDATE ... FROM a locked pre-image, returning (Product, old price, old
+    quantity) in one statement:
+        WITH old AS (SELECT id, price, quantity FROM products WHERE ... FOR UPDATE)
+        UPDATE products SET ... FROM old WHERE products.id = old.id
+        RETURNING products.*, old.price, old.quantity
+    The CTE locks the row and reads its latest committed values, so no
+    concurrent write can slip between the pre-image and the update.
+    """
+    old = (
+        select(Product.id, Product.price.label("old_price"), Product.quantity.label("old_quantity"))
+        .where(*conds)
+        .with_for_update()
+        .cte("old")
+    )
+    return (
+        update(Product)
+        .where(Product.id == old.c.id)
+        .values(**values)
+        .returning(Product, old.c.old_price, old.c.old_quantity)
+        .add_cte(old)
+    )
+
+
 class ProductRepository:
     """Data access layer for Product entity."""
     def __init__(self, db: Session) -> None:
         self.db = db
+        self.stats = ProductStatsRepository(db)
+        self.changes = ProductChangeRepository(db)
+
+    @property
+    def _dialect(self) -> str:
+        return self.db.get_bind().dialect.name
 
     def list(
         self,
@@ -45,73 +172,316 @@ class ProductRepository:
         has_image: Optional[bool] = None,
         sort_by: str = "name",
         sort_dir: str = "asc",
-    ) -> List[Product]:
+        limit: Optional[int] = None,
+        after: Optional[Tuple[Any, int]] = None,
+        columns: Optional[Sequence[str]] = None,
+    ) -> List[Any]:
         """
         Return products that match optional search, filtering and sorting.
-        - Search: 'q' performs an ILIKE on name.
+        - Search: 'q' is an accent/case-insensitive substring match on name.
         - Filtering:
             * min_price/max_price on Product.price
             * min_qty on Product.quantity
             * has_image: True -> image_url IS NOT NULL AND <> ''; False -> image_url IS NULL OR ''
-        - Sorting: by one of _SORT_COLUMNS and asc/desc.
+        - Sorting: by one of _SORT_COLUMNS and asc/desc, with id as tiebreaker;
+          sort_by='relevance' ranks exact, prefix, word-prefix, then substring matches.
+        - Keyset pagination: 'after' is the (sort value, id) of the last row
+          already seen; only rows strictly after it are returned, up to 'limit'.
+        - Projection: with 'columns', only those columns are selected and
+          rows are returned instead of Product entities.
         """
-        stmt = select(Product)
-        conds = []
-
-        # --- Search ---
-        if q:
-            conds.append(Product.name.ilike(f"%{q}%"))
-
-        # --- Filters ---
-        if min_price is not None:
-            conds.append(Product.price >= min_price)
-        if max_price is not None:
-            conds.append(Product.price <= max_price)
-        if min_qty is not None:
-            conds.append(Product.quantity >= min_qty)
-        if has_image is True:
-            conds.append(and_(Product.image_url.is_not(None), Product.image_url != ""))
-        elif has_image is False:
-            conds.append(or_(Product.image_url.is_(None), Product.image_url == ""))
+        stmt = self.filtered_select(
+            q,
+            min_price=min_price,
+            max_price=max_price,
+            min_qty=min_qty,
+            has_image=has_image,
+            sort_by=sort_by,
+            sort_dir=sort_dir,
+            columns=columns,
+        )
+
+        # --- Keyset pagination ---
+        if after is not None:
+            sort_col = _sort_expression(sort_by, q)
+            key = tuple_(sort_col, Product.id)
+            bound = tuple_(literal(after[0], sort_col.type), literal(after[1], Product.id.type))
+            stmt = stmt.where(key > bound if sort_dir == "asc" else key < bound)
+        if limit is not None:
+            stmt = stmt.limit(limit)
+
+        result = self.db.execute(stmt)
+        return list(result.all() if columns else result.scalars().all())
 
+    def stream(
+        self,
+        q: Optional[str] = None,
+        *,
+        batch_size: int = 1000,
+        **filters: Any,
+    ) -> Iterator[List[Product]]:
+        """
+        Yield batches of products for the same filtered statement as list.
+        Uses a server-side cursor (yield_per implies stream_results), so only
+        one batch is held in memory at a time.
+        """
+        stmt = self.filtered_select(q, **filters).execution_options(yield_per=batch_size)
+        for batch in self.db.execute(stmt).scalars().partitions():
+            yield list(batch)
+
+    def filtered_select(
+        self,
+        q: Optional[str] = None,
+        *,
+        min_price: Optional[float] = None,
+        max_price: Optional[float] = None,
+        min_qty: Optional[int] = None,
+        has_image: Optional[bool] = None,
+        sort_by: str = "name",
+        sort_dir: str = "asc",
+        columns: Optional[Sequence[str]] = None,
+    ) -> Select:
+        """Build the filtered and ordered SELECT used by list (see list for semantics)."""
+        stmt = select(*[getattr(Product, c) for c in columns]) if columns else select(Product)
+        conds = _filter_conditions(q, min_price, max_price, min_qty, has_image, self._dialect)
         if conds:
             stmt = stmt.where(and_(*conds))
 
-        # --- Sorting ---
-        sort_col = _SORT_COLUMNS.get(sort_by, Product.name)
-        stmt = stmt.order_by(asc(sort_col) if sort_dir == "asc" else desc(sort_col))
+        # --- Sorting (id breaks ties so the order is total and seekable) ---
+        sort_col = _sort_expression(sort_by, q)
+        direction = asc if sort_dir == "asc" else desc
+        return stmt.order_by(direction(sort_col), direction(Product.id))
 
-        return list(self.db.execute(stmt).scalars().all())
+    def get_version(self, product_id: int) -> Optional[int]:
+        """Return a product's version without loading the entity, or None."""
+        stmt = select(Product.version).where(Product.id == product_id)
+        return self.db.execute(stmt).scalar_one_or_none()
 
-    def get(self, product_id: int) -> Optional[Product]:
-        """Return a product by id or None."""
+    def get(self, product_id: int, columns: Optional[Sequence[str]] = None) -> Optional[Any]:
+        """Return a product by id or None; with 'columns', a row of just those."""
+        if columns:
+            stmt = select(*[getattr(Product, c) for c in columns]).where(Product.id == product_id)
+            return self.db.execute(stmt).one_or_none()
         return self.db.get(Product, product_id)
 
     def create(self, data: ProductCreate) -> Product:
-        """Create and persist a product."""
-        obj = Product(**data.model_dump())
-        self.db.add(obj)
+        """Create and persist a product with a single INSERT ... RETURNING."""
+        seq = self.changes.allocate()
+        stmt = insert(Product).values(**_with_search_name(data.model_dump()), change_seq=seq).returning(Product)
+        obj = self.db.scalars(stmt).one()
+        self.stats.apply(added=[(obj.price, obj.quantity)])
+        return self._detach_and_commit(obj)
+
+    def update(
+        self,
+        product_id: int,
+        data: ProductUpdate,
+        versions: Optional[Sequence[int]] = None,
+    ) -> Optional[Product]:
+        """
+        Update a product with a single UPDATE ... RETURNING; None if missing,
+        or if 'versions' is given and the current version is not in it
+        (UPDATE ... WHERE version IN (...), no lock held across requests).
+        Changes to price or quantity also need the old values for the stats
+        delta: PostgreSQL returns them from the same statement (see
+        _update_returning_old); SQLite, which cannot return them, reads them
+        first. SQLite runs one writer at a time, so that read adds no lock.
+        """
+        values = _with_search_name(data.model_dump(exclude_unset=True))
+        conds = [Product.id == product_id]
+        if versions is not None:
+            conds.append(Product.version.in_(versions))
+        if not values:
+            return self.db.scalars(select(Product).where(*conds)).one_or_none()
+        values["change_seq"] = self.changes.allocate()
+        stmt = update(Product).where(*conds).values(**values).returning(Product)
+        old = obj = None
+        if "price" not in values and "quantity" not in values:
+            obj = self.db.scalars(stmt).one_or_none()
+        elif self._dialect == "postgresql":
+            row = self.db.execute(_update_returning_old(conds, values)).one_or_none()
+            if row is not None:
+                obj, old = row[0], tuple(row[1:])
+        else:
+            old = self.db.execute(select(Product.price, Product.quantity).where(*conds)).one_or_none()
+            if old is not None:
+                obj = self.db.scalars(stmt).one_or_none()
+        if obj is None:
+            self.db.rollback()
+            return None
+        if old is not None:
+            self.stats.apply(removed=[tuple(old)], added=[(obj.price, obj.quantity)])
+        return self._detach_and_commit(obj)
+
+    def delete(self, product_id: int, versions: Optional[Sequence[int]] = None) -> bool:
+        """
+        Delete a product with a single DELETE ... RETURNING. True if deleted;
+        with 'versions', only when the current version is one of them.
+        """
+        seq = self.changes.allocate()
+        stmt = delete(Product).where(Product.id == product_id)
+        if versions is not None:
+            stmt = stmt.where(Product.version.in_(versions))
+        deleted = self.db.execute(stmt.returning(Product.price, Product.quantity)).one_or_none()
+        if deleted is None:
+            self.db.rollback()
+            return False
+        self.stats.apply(removed=[tuple(deleted)])
+        self.changes.tombstone([product_id], seq)
         self.db.commit()
-        self.db.refresh(obj)
-        return obj
+        return True
 
-    def update(self, product_id: int, data: ProductUpdate) -> Optional[Product]:
-        """Update a product if exists; return updated or None."""
-        obj = self.get(product_id)
-        if not obj:
+    def adjust_quantity(self, product_id: int, delta: int) -> Optional[Product]:
+        """
+        Atomically add 'delta' to quantity unless it would go negative, with
+        UPDATE ... SET quantity = quantity + :d WHERE quantity + :d >= 0
+        RETURNING. Returns None if the product is missing or stock is short.
+        """
+        seq = self.changes.allocate()
+        stmt = (
+            update(Product)
+            .where(Product.id == product_id, Product.quantity + delta >= 0)
+            .values(quantity=Product.quantity + delta, change_seq=seq)
+            .returning(Product)
+        )
+        obj = self.db.scalars(stmt).one_or_none()
+        if obj is None:
+            self.db.rollback()
             return None
-        for k, v in data.model_dump(exclude_unset=True).items():
-            setattr(obj, k, v)
-        self.db.add(obj)
+        self.stats.apply(removed=[(obj.price, obj.quantity - delta)], added=[(obj.price, obj.quantity)])
+        return self._detach_and_commit(obj)
+
+    def _detach_and_commit(self, obj: Product) -> Product:
+        """Commit, keeping the RETURNING values loaded (no refresh SELECT)."""
+        self.db.expunge(obj)
         self.db.commit()
-        self.db.refresh(obj)
         return obj
 
-    def delete(self, product_id: int) -> bool:
-        """Delete a product by id. Return True if deleted."""
-        obj = self.get(product_id)
-        if not obj:
-            return False
-        self.db.delete(obj)
+    def purge_tombstones(self) -> int:
+        """
+        Drop tombstones past TOMBSTONE_RETENTION_DAYS and commit; return how
+        many. Run as a periodic admin task, not on the delete path.
+        """
+        cutoff = datetime.now(timezone.utc).replace(tzinfo=None) - timedelta(days=settings.TOMBSTONE_RETENTION_DAYS)
+        purged = self.changes.purge(cutoff)
         self.db.commit()
-        return True
\ No newline at end of file
+        return purged
+
+    def existing_ids(self, ids: Iterable[int]) -> Set[int]:
+        """Return the subset of ids that exist, in a single query."""
+        ids = set(ids)
+        if not ids:
+            return set()
+        stmt = select(Product.id).where(Product.id.in_(ids))
+        return set(self.db.execute(stmt).scalars())
+
+    def bulk_write(
+        self,
+        creates: List[Dict[str, Any]],
+        updates: List[Dict[str, Any]],
+        deletes: List[int],
+        *,
+        atomic: bool = True,
+    ) -> Tuple[List[Optional[int]], Dict[Tuple[str, int], str]]:
+        """
+        Apply bulk INSERT, UPDATE and DELETE statements in one transaction.
+        - creates: column dicts, inserted with one executemany INSERT ... RETURNING id.
+        - updates: column dicts including 'id', applied as a bulk UPDATE by primary key.
+        - deletes: ids removed with a single DELETE ... WHERE id IN (...).
+        Returns (created ids in input order, {(group, position): error}).
+        When atomic is True any failure rolls back and raises. When False
+        each group runs in a savepoint; a group that fails is retried row
+        by row, each in its own savepoint, so only the failing rows are
+        reported (their created id is None) and the others still commit.
+        """
+        steps = [
+            ("create", creates, self._bulk_insert),
+            ("update", updates, self._bulk_update),
+            ("delete", deletes, self._bulk_delete),
+        ]
+        created_ids: List[Optional[int]] = []
+        errors: Dict[Tuple[str, int], str] = {}
+        try:
+            # Numbered outside the savepoints below (see product_change_repo)
+            self.changes.allocate()
+            for group, rows, apply in steps:
+                if not rows:
+                    continue
+                result = apply(rows) if atomic else self._apply_partial(group, rows, apply, errors)
+                if group == "create":
+                    created_ids = result
+            self.db.commit()
+        except SQLAlchemyError:
+            self.db.rollback()
+            raise
+        return created_ids, errors
+
+    def _apply_partial(
+        self,
+        group: str,
+        rows: List[Any],
+        apply: Callable[[List[Any]], Any],
+        errors: Dict[Tuple[str, int], str],
+    ) -> Any:
+        """Apply a group in a savepoint; if it fails, apply its rows one savepoint each."""
+        try:
+            with self.db.begin_nested():
+                return apply(rows)
+        except SQLAlchemyError:
+            pass
+        results: List[Optional[int]] = []
+        for pos, row in enumerate(rows):
+            try:
+                with self.db.begin_nested():
+                    result = apply([row])
+                results.append(result[0] if result else None)
+            except SQLAlchemyError as exc:
+                errors[(group, pos)] = str(getattr(exc, "orig", None) or exc)
+                results.append(None)
+        return results
+
+    def bulk_create(self, rows: List[Dict[str, Any]]) -> int:
+        """Insert many rows with one executemany INSERT and commit; return the count."""
+        if not rows:
+            return 0
+        try:
+            self.db.execute(insert(Product), _with_change_seq(rows, self.changes.allocate()))
+            self.stats.apply(added=[(r["price"], r["quantity"]) for r in rows])
+            self.db.commit()
+        except SQLAlchemyError:
+            self.db.rollback()
+            raise
+        return len(rows)
+
+    def _bulk_insert(self, rows: List[Dict[str, Any]]) -> List[int]:
+        stmt = insert(Product).returning(Product.id, sort_by_parameter_order=True)
+        ids = list(self.db.execute(stmt, _with_change_seq(rows, self.changes.allocate())).scalars())
+        self.stats.apply(added=[(r["price"], r["quantity"]) for r in rows])
+        return ids
+
+    def _bulk_update(self, rows: List[Dict[str, Any]]) -> None:
+        seq = self.changes.allocate()
+        # Lock and read old (price, quantity) of rows whose stock figures change
+        stock_ids = [r["id"] for r in rows if "price" in r or "quantity" in r]
+        old = {}
+        if stock_ids:
+            stmt = (
+                select(Product.id, Product.price, Product.quantity)
+                .where(Product.id.in_(stock_ids))
+                .with_for_update()
+            )
+            old = {pid: (price, qty) for pid, price, qty in self.db.execute(stmt)}
+        self.db.execute(update(Product), _with_change_seq(rows, seq))
+        if old:
+            new = [
+                (r.get("price", old[r["id"]][0]), r.get("quantity", old[r["id"]][1]))
+                for r in rows if r["id"] in old
+            ]
+            self.stats.apply(removed=old.values(), added=new)
+
+    def _bulk_delete(self, ids: List[int]) -> None:
+        seq = self.changes.allocate()
+        stmt = delete(Product).where(Product.id.in_(ids)).returning(Product.id, Product.price, Product.quantity)
+        deleted = self.db.execute(stmt).all()
+        self.stats.apply(removed=[(price, qty) for _, price, qty in deleted])
+        self.changes.tombstone([pid for pid, _, _ in deleted], seq)
@@ -0,0 +1,119 @@
+"""
+File: product_stats_repo.py
+Description: Repository for the incrementally maintained product_stats row.
+Author: Jairo Céspedes
+Date: 2025-09-05
+
+Responsibilities:
+- Turn removed/added (price, quantity) pairs into counter deltas.
+- Apply deltas to the summary row with relative UPDATEs (col = col + :d).
+- Read the summary in O(1) and recompute it from products on demand.
+
+Notes:
+- Deltas run in the caller's transaction and never commit, so the summary
+  commits or rolls back together with the product write.
+- Deltas only apply while the stored low_stock_threshold matches settings;
+  after a threshold change the next read recomputes the row.
+- The row exists from the start: migration 0004 seeds it with the totals
+  of the products already there (create_all inserts an empty one), so
+  the first writes have a row to apply their deltas to.
+- recompute() locks the row before aggregating, so concurrent writers wait
+  and their deltas land on top of the recomputed values. It writes with an
+  upsert (INSERT ... ON CONFLICT (id) DO UPDATE): if the row was deleted
+  by hand, concurrent recomputes cannot collide on inserting it.
+"""
+
+from decimal import Decimal
+from typing import Any, Dict, Iterable, Optional, Tuple
+
+from sqlalchemy import case, func, select, update
+from sqlalchemy.dialects import postgresql, sqlite
+from sqlalchemy.orm import Session
+
+from app.core.config import settings
+from app.models.product import Product, ProductStats
+
+# The summary is a single row
+_STATS_ID = 1
+
+_COUNTERS = ("sku_count", "total_units", "stock_value", "out_of_stock", "low_stock")
+
+
+def stock_delta(
+    removed: Iterable[Tuple[Any, int]],
+    added: Iterable[Tuple[Any, int]],
+    threshold: int,
+) -> Dict[str, Any]:
+    """Counter deltas for rows leaving (removed) and entering (added) the catalog."""
+    delta: Dict[str, Any] = {c: 0 for c in _COUNTERS}
+    delta["stock_value"] = Decimal(0)
+    for sign, rows in ((-1, removed), (1, added)):
+        for price, quantity in rows:
+            delta["sku_count"] += sign
+            delta["total_units"] += sign * quantity
+            delta["stock_value"] += sign * Decimal(str(price)) * quantity
+            delta["out_of_stock"] += sign * (quantity == 0)
+            delta["low_stock"] += sign * (0 < quantity <= threshold)
+    return delta
+
+
+class ProductStatsRepository:
+    """Data access layer for the product_stats summary row."""
+    def __init__(self, db: Session) -> None:
+        self.db = db
+
+    def apply(
+        self,
+        removed: Iterable[Tuple[Any, int]] = (),
+        added: Iterable[Tuple[Any, int]] = (),
+    ) -> None:
+        """Shift the counters by the rows removed/added; does not commit."""
+        delta = stock_delta(removed, added, settings.LOW_STOCK_THRESHOLD)
+        changes = {c: getattr(ProductStats, c) + v for c, v in delta.items() if v}
+        if not changes:
+            return
+        self.db.execute(
+            update(ProductStats)
+            .where(
+                ProductStats.id == _STATS_ID,
+                ProductStats.low_stock_threshold == settings.LOW_STOCK_THRESHOLD,
+            )
+            .values(changes)
+        )
+
+    def get(self) -> Optional[ProductStats]:
+        """Return the summary row if it is current, else None (needs recompute)."""
+        stats = self.db.get(ProductStats, _STATS_ID, populate_existing=True)
+        if stats is None or stats.low_stock_threshold != settings.LOW_STOCK_THRESHOLD:
+            return None
+        return stats
+
+    def recompute(self) -> Tuple[Optional[Dict[str, Any]], ProductStats]:
+        """
+        Rebuild the summary from a full scan of products and commit.
+        Returns (previous counters or None, refreshed row).
+        """
+        threshold = settings.LOW_STOCK_THRESHOLD
+        current = self.db.execute(
+            select(ProductStats).where(ProductStats.id == _STATS_ID).with_for_update()
+        ).scalar_one_or_none()
+        previous = None
+        if current is not None and current.low_stock_threshold == threshold:
+            previous = {c: getattr(current, c) for c in _COUNTERS}
+
+        quantity = Product.quantity
+        totals = self.db.execute(
+            select(
+                func.count(Product.id),
+                func.coalesce(func.sum(quantity), 0),
+                func.coalesce(func.sum(Product.price * quantity), 0),
+                func.coalesce(func.sum(case((quantity == 0, 1), else_=0)), 0),
+                func.coalesce(func.sum(case(((quantity > 0) & (quantity <= threshold), 1), else_=0)), 0),
+            )
+        ).one()
+        values = dict(zip(_COUNTERS, totals), low_stock_threshold=threshold, recomputed_at=func.now())
+        dialect = postgresql if self.db.get_bind().dialect.name == "postgresql" else sqlite
+        stmt = dialect.insert(ProductStats).values(id=_STATS_ID, **values)
+        self.db.execute(stmt.on_conflict_do_update(index_elements=[ProductStats.id], set_=values))
+        self.db.commit()
+        return previous, self.db.get(ProductStats, _STATS_ID, populate_existing=True)
@@ -7,8 +7,15 @@ Date: 2025-09-05
 Responsibilities:
 - Provide database operations for the User entity.
 - Encapsulate logic to fetch, create, and search users by email or id.
+
+Notes:
+- create() relies on the unique email index instead of a prior lookup:
+  one INSERT ... ON CONFLICT DO NOTHING RETURNING per registration.
 """
 from typing import Optional
+from sqlalchemy import update
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
 from sqlalchemy.orm import Session
 
 from app.models.user import User
@@ -22,10 +29,22 @@ class UserRepository:
         """Return user by email or None."""
         return self.db.query(User).filter(User.email == email).first()
 
-    def create(self, email: str, password_hash: str, role: str = "user") -> User:
-        """Create and persist a user with the given role."""
-        user = User(email=email, password_hash=password_hash, role=role)
-        self.db.add(user)
+    def create(self, email: str, password_hash: str, role: str = "user") -> Optional[User]:
+        """Create and persist a user with the given role; None if the email is taken."""
+        insert_ = pg_insert if self.db.get_bind().dialect.name == "postgresql" else sqlite_insert
+        stmt = (
+            insert_(User)
+            .values(email=email, password_hash=password_hash, role=role)
+            .on_conflict_do_nothing(index_elements=[User.email])
+            .returning(User)
+        )
+        user = self.db.scalars(stmt).one_or_none()
+        if user is not None:
+            self.db.expunge(user)  # keep RETURNING values across commit
+        self.db.commit()
+        return user
+
+    def update_password_hash(self, user_id: int, password_hash: str) -> None:
+        """Replace a user's password hash (used for transparent rehashing)."""
+        self.db.execute(update(User).where(User.id == user_id).values(password_hash=password_hash))
         self.db.commit()
-        self.db.refresh(user)
-        return user
\ No newline at end of file
@@ -7,6 +7,16 @@ Date: 2025-09-05
 Responsibilities:
 - Define ProductCreate, ProductUpdate for input validation.
 - Define ProductOut for response serialization.
+- Define ProductPage for keyset-paginated listings.
+- Provide ProductOutList, a TypeAdapter that validates and dumps whole lists.
+- Build sparse projections of ProductOut for the `fields=` parameter.
+- Define batch mutation request/response schemas.
+- Define the bulk import report.
+- Define the inventory statistics responses.
+- Define the stock adjustment payload.
+- Define the event stream token response.
+- Define the delta sync response (changed products, tombstones, token) and
+  the tombstone purge result.
 - Ensure consistent typing for product fields.
 
 Notes:
@@ -16,9 +26,10 @@ Notes:
 
 from datetime import datetime
 from decimal import Decimal
-from typing import Optional
+from functools import lru_cache
+from typing import Annotated, List, Literal, Optional, Tuple, Type, Union
 
-from pydantic import BaseModel, ConfigDict, Field
+from pydantic import BaseModel, ConfigDict, Field, TypeAdapter, create_model, field_validator
 
 class ProductBase(BaseModel):
     """Base fields shared by product schemas."""
@@ -44,4 +55,147 @@ class ProductOut(ProductBase):
     """Public representation of a product."""
     id: int
     updated_at: datetime
-    model_config = ConfigDict(from_attributes=True)
\ No newline at end of file
+    # Bumped on every write; the product ETag is derived from it
+    version: int
+    model_config = ConfigDict(from_attributes=True)
+
+# Validate ORM rows and dump JSON for a whole list in one call each
+ProductOutList = TypeAdapter(List[ProductOut])
+
+# Field names clients may request, in output order
+PRODUCT_FIELDS: Tuple[str, ...] = tuple(ProductOut.model_fields)
+
+@lru_cache(maxsize=None)
+def product_projection(fields: Tuple[str, ...]) -> Type[BaseModel]:
+    """ProductOut restricted to 'fields' (canonical order), with the same encoding."""
+    return create_model(
+        "ProductFields",
+        __config__=ConfigDict(from_attributes=True),
+        **{f: (ProductOut.model_fields[f].annotation, ...) for f in fields},
+    )
+
+@lru_cache(maxsize=None)
+def product_list_adapter(fields: Optional[Tuple[str, ...]] = None) -> TypeAdapter:
+    """List adapter for full products (fields=None) or a sparse projection."""
+    if fields is None:
+        return ProductOutList
+    return TypeAdapter(List[product_projection(fields)])
+
+class ProductPage(BaseModel):
+    """One page of a product listing plus the cursor for the next page."""
+    items: List[BaseModel]  # ProductOut, or a sparse projection of it
+    next_cursor: Optional[str] = None
+
+
+class ProductBatchCreate(BaseModel):
+    """Batch operation that creates a product."""
+    op: Literal["create"]
+    data: ProductCreate
+
+class ProductBatchUpdate(BaseModel):
+    """Batch operation that partially updates a product."""
+    op: Literal["update"]
+    id: int
+    data: ProductUpdate
+
+class ProductBatchDelete(BaseModel):
+    """Batch operation that deletes a product."""
+    op: Literal["delete"]
+    id: int
+
+ProductBatchOp = Annotated[
+    Union[ProductBatchCreate, ProductBatchUpdate, ProductBatchDelete],
+    Field(discriminator="op"),
+]
+
+class ProductBatchRequest(BaseModel):
+    """Mixed list of create/update/delete operations applied in one transaction."""
+    operations: List[ProductBatchOp] = Field(..., min_length=1, max_length=10000)
+    # True: all-or-nothing; False: apply what succeeds and report the rest
+    atomic: bool = True
+
+class ProductBatchItemResult(BaseModel):
+    """Outcome of a single batch operation, in request order."""
+    index: int
+    op: Literal["create", "update", "delete"]
+    ok: bool
+    id: Optional[int] = None
+    error: Optional[str] = None
+
+class ProductBatchResponse(BaseModel):
+    """Per-item results and whether any changes were committed."""
+    committed: bool
+    succeeded: int
+    failed: int
+    results: List[ProductBatchItemResult]
+
+
+class ProductImportError(BaseModel):
+    """A rejected import row and why (line 1 is the first data row)."""
+    line: int
+    error: str
+
+class ProductImportReport(BaseModel):
+    """Summary of a bulk import: counts, throughput and per-row errors."""
+    received: int
+    inserted: int
+    failed: int
+    elapsed_seconds: float
+    rows_per_second: float
+    errors: List[ProductImportError]
+    # True when more rows failed than are listed in 'errors'
+    errors_truncated: bool = False
+
+
+class ProductStatsOut(BaseModel):
+    """Inventory totals maintained incrementally on every product write."""
+    sku_count: int
+    total_units: int
+    stock_value: Decimal
+    out_of_stock: int
+    low_stock: int
+    low_stock_threshold: int
+    recomputed_at: datetime
+    model_config = ConfigDict(from_attributes=True)
+
+class ProductStatsRecompute(BaseModel):
+    """Result of a full recompute: fresh totals and whether they had drifted."""
+    stats: ProductStatsOut
+    # False when there was no current summary to compare against
+    drifted: bool
+
+
+class ProductStockDelta(BaseModel):
+    """Signed change to a product's quantity (sale < 0, restock > 0)."""
+    delta: int
+
+    @field_validator("delta")
+    @classmethod
+    def _non_zero(cls, value: int) -> int:
+        if value == 0:
+            raise ValueError("delta must not be 0")
+        return value
+
+
+class ProductChanges(BaseModel):
+    """
+    Products changed after a sync token. Clients drop the 'deleted' ids,
+    then upsert 'items', and pass 'token' as 'since' next time; while
+    has_more is true the next page is available right away.
+    """
+    items: List[ProductOut]
+    deleted: List[int]
+    token: str
+    has_more: bool
+
+
+class ProductTombstonePurge(BaseModel):
+    """Result of a tombstone purge; sync tokens at or below purged_through get 410."""
+    purged: int
+    purged_through: int
+
+
+class ProductEventsToken(BaseModel):
+    """Short-lived token for GET /products/events?token=..."""
+    token: str
+    expires_in: int
@@ -7,27 +7,206 @@ Date: 2025-09-05
 Responsibilities:
 - Interact with ProductRepository to perform CRUD operations.
 - Transform ORM objects into Pydantic models for API responses.
-- Handle optional filters and sorting for product listings.
+- Handle optional filters, sorting and keyset pagination for product listings.
+- Stream catalog exports as NDJSON or CSV.
+- Validate and apply transactional create/update/delete batches.
+- Import CSV/NDJSON uploads incrementally with chunked inserts.
+- Cache list results (LRU + TTL) and invalidate them on every write.
+- Compute ETags for conditional reads without loading rows.
+- Parse sparse fieldsets (fields=) and load only the requested columns.
+- Serve inventory statistics from the maintained summary row.
+- Apply signed stock deltas atomically, singly or as a coalesced batch.
+- Honor If-Match on updates/deletes with version-conditional statements.
+- Serve delta sync pages (changes and tombstones after a sync token).
+- Publish created/updated/deleted events to /products/events subscribers.
 
 Notes:
 - Keeps controllers (routers) clean by separating logic.
 - Returns Pydantic models to enforce schema consistency.
 """
-from typing import List, Optional
+import csv
+import io
+import json
+import time
+from collections import Counter
+from typing import Any, BinaryIO, Dict, Iterable, Iterator, List, Optional, Tuple
+
 from fastapi import HTTPException, status
+from pydantic import BaseModel, ValidationError
+from sqlalchemy.exc import SQLAlchemyError
 from sqlalchemy.orm import Session
 
+from app.core.cache import QueryCache
+from app.core.coalesce import WriteCoalescer
+from app.core.config import settings
+from app.core.events import ChangeBroadcaster
+from app.core.etag import if_match_versions, make_etag, make_version_etag
+from app.core.pagination import decode_cursor, decode_sync_token, encode_cursor, encode_sync_token
+from app.core.search import normalize_search, relevance_score
+from app.models.product import Product
 from app.repositories.product_repo import ProductRepository
-from app.schemas.product import ProductCreate, ProductOut, ProductUpdate
+from app.schemas.product import (
+    ProductBatchItemResult,
+    ProductBatchOp,
+    ProductBatchRequest,
+    ProductBatchResponse,
+    ProductChanges,
+    ProductCreate,
+    ProductImportError,
+    ProductImportReport,
+    ProductOut,
+    ProductOutList,
+    ProductPage,
+    ProductStatsOut,
+    ProductStatsRecompute,
+    ProductTombstonePurge,
+    ProductUpdate,
+    PRODUCT_FIELDS,
+    product_list_adapter,
+    product_projection,
+)
 
 # Allowed sort fields and directions
-_ALLOWED_SORT_FIELDS = {"name", "price", "quantity", "updated_at"}
+_ALLOWED_SORT_FIELDS = {"name", "price", "quantity", "updated_at", "relevance"}
 _ALLOWED_SORT_DIRS = {"asc", "desc"}
 
+# Column order for CSV exports
+_EXPORT_FIELDS = ("id", "name", "description", "price", "quantity", "image_url", "updated_at")
+
+
+def _normalize_sort(
+    sort_by: Optional[str], sort_dir: Optional[str], q: Optional[str] = None
+) -> Tuple[str, str]:
+    """Normalize and validate sorting parameters or raise 422."""
+    sort_by = (sort_by or "name").lower()
+    sort_dir = (sort_dir or "asc").lower()
+
+    if sort_by not in _ALLOWED_SORT_FIELDS:
+        raise HTTPException(
+            status_code=status.HTTP_422_UNPROCESSABLE_ENTITY,
+            detail=f"Invalid sort_by '{sort_by}'. Allowed: {sorted(_ALLOWED_SORT_FIELDS)}",
+        )
+    if sort_dir not in _ALLOWED_SORT_DIRS:
+        raise HTTPException(
+            status_code=status.HTTP_422_UNPROCESSABLE_ENTITY,
+            detail=f"Invalid sort_dir '{sort_dir}'. Allowed: {sorted(_ALLOWED_SORT_DIRS)}",
+        )
+    if sort_by == "relevance" and not normalize_search(q or ""):
+        raise HTTPException(
+            status_code=status.HTTP_422_UNPROCESSABLE_ENTITY,
+            detail="sort_by 'relevance' requires a search term 'q'",
+        )
+    return sort_by, sort_dir
+
+
+def _sort_value(product: Product, sort_by: str, q: Optional[str]) -> Any:
+    """Value of the sort key for a row, as encoded in pagination cursors."""
+    if sort_by == "relevance":
+        return relevance_score(product.name_search, normalize_search(q))
+    return getattr(product, sort_by)
+
+
+def parse_fields(fields: Optional[str]) -> Optional[Tuple[str, ...]]:
+    """
+    Parse a comma-separated sparse fieldset into ProductOut field names in
+    canonical order; id is always included. None means every field.
+    Raises 400 on unknown names.
+    """
+    if not fields or not fields.strip():
+        return None
+    requested = {f.strip() for f in fields.split(",") if f.strip()}
+    unknown = requested - set(PRODUCT_FIELDS)
+    if unknown:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=f"Unknown fields: {', '.join(sorted(unknown))}. Allowed: {', '.join(PRODUCT_FIELDS)}",
+        )
+    requested.add("id")
+    if len(requested) == len(PRODUCT_FIELDS):
+        return None
+    return tuple(f for f in PRODUCT_FIELDS if f in requested)
+
+
+def product_etag(version: int, fields: Optional[Tuple[str, ...]] = None) -> str:
+    """ETag of a product representation: its version, plus the fieldset if sparse."""
+    return make_version_etag(version, fields) if fields else make_version_etag(version)
+
+
+def _list_columns(fields: Tuple[str, ...], sort_by: str) -> Tuple[str, ...]:
+    """Columns to select for a sparse page: the fields plus the cursor's sort key."""
+    sort_key = "name_search" if sort_by == "relevance" else sort_by
+    return fields if sort_key in fields else fields + (sort_key,)
+
+
+# Fixed per-row cost (object headers, numbers, datetime) used to size cache entries
+_ITEM_OVERHEAD_BYTES = 400
+
+# Bulk import tuning: rows per INSERT batch and max errors echoed back
+_IMPORT_CHUNK_SIZE = 5000
+_IMPORT_MAX_ERRORS = 1000
+
+
+def _iter_import_rows(stream: BinaryIO, fmt: str) -> Iterator[Tuple[int, Any]]:
+    """
+    Yield (line, raw row) from a CSV or NDJSON upload without reading it whole.
+    Unparseable NDJSON lines are yielded as ValueError instances.
+    """
+    text = io.TextIOWrapper(stream, encoding="utf-8-sig", newline="")
+    if fmt == "csv":
+        for line, row in enumerate(csv.DictReader(text), start=1):
+            yield line, row
+        return
+    line = 0
+    for raw in text:
+        if not raw.strip():
+            continue
+        line += 1
+        try:
+            yield line, json.loads(raw)
+        except ValueError as exc:
+            yield line, ValueError(f"Invalid JSON: {exc}")
+
+
+def _format_validation_error(exc: ValidationError) -> str:
+    """Flatten a pydantic ValidationError into one readable line."""
+    return "; ".join(
+        f"{'.'.join(str(p) for p in err['loc']) or 'row'}: {err['msg']}" for err in exc.errors()
+    )
+
+
+# Shared list-query cache; every successful write invalidates it
+list_cache = QueryCache(
+    max_entries=settings.PRODUCT_CACHE_MAX_ENTRIES,
+    max_bytes=settings.PRODUCT_CACHE_MAX_BYTES,
+    ttl_seconds=settings.PRODUCT_CACHE_TTL_SECONDS,
+)
+
+# Fan-out of product change events to server-sent event streams
+change_events = ChangeBroadcaster(
+    queue_size=settings.EVENTS_QUEUE_SIZE,
+    max_subscribers=settings.EVENTS_MAX_SUBSCRIBERS,
+)
+
+# Per-SKU buffer for stock deltas (disabled unless STOCK_COALESCE_MS > 0)
+stock_coalescer = WriteCoalescer(settings.STOCK_COALESCE_MS / 1000)
+
+
+def _estimate_size(items: List[Any]) -> int:
+    """Rough memory footprint of a cached page (entities or sparse rows), in bytes."""
+    return sum(
+        _ITEM_OVERHEAD_BYTES
+        + sum(len(getattr(p, f, None) or "") for f in ("name", "description", "image_url"))
+        for p in items
+    )
+
+
 class ProductService:
     """Business logic for product operations."""
     def __init__(self, db: Session) -> None:
         self.repo = ProductRepository(db)
+        # Replica results are cached apart, so readers pinned to the primary
+        # after a write never get a lagging replica page from the cache
+        self._source = "replica" if db.info.get("replica") else "primary"
 
     def list(
         self,
@@ -39,28 +218,38 @@ class ProductService:
         has_image: Optional[bool] = None,
         sort_by: str = "name",
         sort_dir: str = "asc",
-    ) -> List[ProductOut]:
+        limit: Optional[int] = None,
+        cursor: Optional[str] = None,
+        fields: Optional[Tuple[str, ...]] = None,
+    ) -> ProductPage:
         """
         List products supporting:
-        - search: q (substring match on name, ILIKE)
+        - search: q (accent/case-insensitive substring match on name)
         - filtering: min_price, max_price, min_qty, has_image
-        - sorting: sort_by (name|price|quantity|updated_at), sort_dir (asc|desc)
+        - sorting: sort_by (name|price|quantity|updated_at|relevance), sort_dir (asc|desc)
+        - pagination: limit and an opaque cursor from a previous page
+        - projection: fields (from parse_fields) selects only those columns
         """
-        # Normalize and validate sorting
-        sort_by = (sort_by or "name").lower()
-        sort_dir = (sort_dir or "asc").lower()
+        sort_by, sort_dir = _normalize_sort(sort_by, sort_dir, q)
 
-        if sort_by not in _ALLOWED_SORT_FIELDS:
-            raise HTTPException(
-                status_code=status.HTTP_422_UNPROCESSABLE_ENTITY,
-                detail=f"Invalid sort_by '{sort_by}'. Allowed: {sorted(_ALLOWED_SORT_FIELDS)}",
-            )
-        if sort_dir not in _ALLOWED_SORT_DIRS:
-            raise HTTPException(
-                status_code=status.HTTP_422_UNPROCESSABLE_ENTITY,
-                detail=f"Invalid sort_dir '{sort_dir}'. Allowed: {sorted(_ALLOWED_SORT_DIRS)}",
-            )
+        cache_key = (self._source, q or None, min_price, max_price, min_qty, has_image, sort_by, sort_dir, limit, cursor, fields)
+        if settings.PRODUCT_CACHE_ENABLED:
+            cached = list_cache.get(cache_key)
+            if cached is not None:
+                return cached
+        generation = list_cache.generation
 
+        after = None
+        if cursor:
+            try:
+                after = decode_cursor(cursor, sort_by, sort_dir)
+            except ValueError:
+                raise HTTPException(
+                    status_code=status.HTTP_400_BAD_REQUEST,
+                    detail="Invalid cursor",
+                )
+
+        # Fetch one extra row to know whether another page exists
         items = self.repo.list(
             q=q,
             min_price=min_price,
@@ -69,30 +258,450 @@ class ProductService:
             has_image=has_image,
             sort_by=sort_by,
             sort_dir=sort_dir,
+            limit=limit + 1 if limit is not None else None,
+            after=after,
+            columns=_list_columns(fields, sort_by) if fields else None,
+        )
+
+        next_cursor = None
+        if limit is not None and len(items) > limit:
+            items = items[:limit]
+            last = items[-1]
+            next_cursor = encode_cursor(sort_by, sort_dir, _sort_value(last, sort_by, q), last.id)
+
+        page = ProductPage(
+            items=product_list_adapter(fields).validate_python(items, from_attributes=True),
+            next_cursor=next_cursor,
+        )
+        if settings.PRODUCT_CACHE_ENABLED:
+            list_cache.put(cache_key, page, _estimate_size(items), generation)
+        return page
+
+    def list_etag(
+        self,
+        q: Optional[str] = None,
+        *,
+        min_price: Optional[float] = None,
+        max_price: Optional[float] = None,
+        min_qty: Optional[int] = None,
+        has_image: Optional[bool] = None,
+        sort_by: str = "name",
+        sort_dir: str = "asc",
+        limit: Optional[int] = None,
+        cursor: Optional[str] = None,
+        fields: Optional[Tuple[str, ...]] = None,
+    ) -> str:
+        """
+        Return the ETag of a listing without loading any rows.
+        It hashes the query parameters with the change marker, which every
+        committed product write (deletes included) moves; reading it is one
+        statement over the change_seq indexes, and the value is cached until
+        the next write.
+        """
+        sort_by, sort_dir = _normalize_sort(sort_by, sort_dir, q)
+        params = (q or None, min_price, max_price, min_qty, has_image, sort_by, sort_dir, limit, cursor, fields)
+        cache_key = ("etag", self._source) + params
+        if settings.PRODUCT_CACHE_ENABLED:
+            cached = list_cache.get(cache_key)
+            if cached is not None:
+                return cached
+        generation = list_cache.generation
+
+        # Read before the rows: a write landing in between only makes the ETag older
+        marker = self.repo.changes.marker()
+        etag = make_etag("products", params, marker)
+        if settings.PRODUCT_CACHE_ENABLED:
+            list_cache.put(cache_key, etag, _ITEM_OVERHEAD_BYTES, generation)
+        return etag
+
+    def export(
+        self,
+        fmt: str = "ndjson",
+        q: Optional[str] = None,
+        *,
+        min_price: Optional[float] = None,
+        max_price: Optional[float] = None,
+        min_qty: Optional[int] = None,
+        has_image: Optional[bool] = None,
+        sort_by: str = "name",
+        sort_dir: str = "asc",
+    ) -> Iterator[str]:
+        """
+        Stream the filtered catalog as NDJSON or CSV text chunks.
+        - Rows come from a server-side cursor and are serialized one by one.
+        - One chunk is emitted per fetched batch, so memory stays bounded.
+        """
+        sort_by, sort_dir = _normalize_sort(sort_by, sort_dir, q)
+        batches = self.repo.stream(
+            q=q,
+            min_price=min_price,
+            max_price=max_price,
+            min_qty=min_qty,
+            has_image=has_image,
+            sort_by=sort_by,
+            sort_dir=sort_dir,
         )
-        return [ProductOut.model_validate(i) for i in items]
+        if fmt == "csv":
+            return self._export_csv(batches)
+        return self._export_ndjson(batches)
+
+    @staticmethod
+    def _export_ndjson(batches: Iterable[List[Product]]) -> Iterator[str]:
+        """Serialize each row as one JSON line."""
+        for batch in batches:
+            yield "".join(ProductOut.model_validate(p).model_dump_json() + "\n" for p in batch)
 
-    def get(self, product_id: int) -> ProductOut:
-        """Get a single product or raise 404."""
-        obj = self.repo.get(product_id)
+    @staticmethod
+    def _export_csv(batches: Iterable[List[Product]]) -> Iterator[str]:
+        """Serialize rows as CSV with a header line."""
+        buf = io.StringIO()
+        writer = csv.writer(buf)
+        writer.writerow(_EXPORT_FIELDS)
+        yield buf.getvalue()
+        for batch in batches:
+            buf.seek(0)
+            buf.truncate()
+            for p in batch:
+                row = ProductOut.model_validate(p).model_dump(mode="json")
+                writer.writerow([row[f] for f in _EXPORT_FIELDS])
+            yield buf.getvalue()
+
+    def get(self, product_id: int, fields: Optional[Tuple[str, ...]] = None) -> BaseModel:
+        """Get a single product (or a sparse projection of it) or raise 404."""
+        obj = self.repo.get(product_id, columns=fields)
         if not obj:
             raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Product not found")
-        return ProductOut.model_validate(obj)
+        model = product_projection(fields) if fields else ProductOut
+        return model.model_validate(obj)
+
+    def get_etag(self, product_id: int, fields: Optional[Tuple[str, ...]] = None) -> str:
+        """Return the ETag of a product from its version, or raise 404."""
+        version = self.repo.get_version(product_id)
+        if version is None:
+            raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Product not found")
+        return product_etag(version, fields)
 
     def create(self, data: ProductCreate) -> ProductOut:
         """Create a new product."""
         obj = self.repo.create(data)
-        return ProductOut.model_validate(obj)
+        list_cache.invalidate()
+        out = ProductOut.model_validate(obj)
+        self._publish("created", out.id, out)
+        return out
 
-    def update(self, product_id: int, data: ProductUpdate) -> ProductOut:
-        """Update an existing product or raise 404."""
-        obj = self.repo.update(product_id, data)
+    def update(self, product_id: int, data: ProductUpdate, if_match: Optional[str] = None) -> ProductOut:
+        """
+        Update an existing product or raise 404. With If-Match, the write only
+        applies to a listed version; otherwise raise 412.
+        """
+        versions = if_match_versions(if_match) if if_match else None
+        obj = self.repo.update(product_id, data, versions)
         if not obj:
-            raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Product not found")
-        return ProductOut.model_validate(obj)
+            raise self._write_error(product_id)
+        list_cache.invalidate()
+        out = ProductOut.model_validate(obj)
+        if self.repo.changes.last_seq:
+            self._publish("updated", product_id, out)
+        return out
 
-    def delete(self, product_id: int) -> None:
-        """Delete a product or raise 404."""
-        ok = self.repo.delete(product_id)
+    def delete(self, product_id: int, if_match: Optional[str] = None) -> None:
+        """Delete a product or raise 404; If-Match as in update (412 on mismatch)."""
+        versions = if_match_versions(if_match) if if_match else None
+        ok = self.repo.delete(product_id, versions)
         if not ok:
-            raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Product not found")
\ No newline at end of file
+            raise self._write_error(product_id)
+        list_cache.invalidate()
+        self._publish("deleted", product_id)
+
+    def _publish(self, event: str, product_id: int, product: Optional[ProductOut] = None) -> None:
+        """Push a single-product change, with a sync token as id, to open event streams."""
+        if not change_events.active:
+            return
+        data: Dict[str, Any] = {"id": product_id}
+        if product is not None:
+            data["product"] = product.model_dump(mode="json")
+        # The write is committed; resuming from the watermark cannot skip a
+        # slower transaction that still commits below this one
+        watermark, _ = self.repo.changes.watermark()
+        change_events.publish(event, data, encode_sync_token(watermark))
+
+    @staticmethod
+    def _publish_bulk(created: int = 0, updated: int = 0, deleted: int = 0) -> None:
+        """Announce a batch or import; subscribers fetch its rows from /products/changes."""
+        if change_events.active:
+            change_events.publish("bulk", {"created": created, "updated": updated, "deleted": deleted})
+
+    def _write_error(self, product_id: int) -> HTTPException:
+        if self.repo.get_version(product_id) is None:
+            return HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Product not found")
+        return HTTPException(
+            status_code=status.HTTP_412_PRECONDITION_FAILED,
+            detail="Product was modified by another request; reload it and retry",
+        )
+
+    def adjust_stock(self, product_id: int, delta: int) -> ProductOut:
+        """Add a signed delta to a product's quantity; 404 if missing, 409 if stock is short."""
+        obj = self.repo.adjust_quantity(product_id, delta)
+        if obj is None:
+            raise self._stock_error(product_id)
+        list_cache.invalidate()
+        out = ProductOut.model_validate(obj)
+        self._publish("updated", product_id, out)
+        return out
+
+    def adjust_stock_many(self, product_id: int, deltas: List[int]) -> List[Any]:
+        """
+        Apply coalesced deltas for one product. Their sum goes in a single
+        statement; if that would drive stock negative, each delta is applied
+        on its own in arrival order so only the ones that cannot fit fail.
+        Returns a ProductOut or HTTPException per delta.
+        """
+        obj = self.repo.adjust_quantity(product_id, sum(deltas))
+        if obj is not None:
+            list_cache.invalidate()
+            out = ProductOut.model_validate(obj)
+            self._publish("updated", product_id, out)
+            return [out] * len(deltas)
+        results: List[Any] = []
+        for delta in deltas:
+            try:
+                results.append(self.adjust_stock(product_id, delta))
+            except HTTPException as exc:
+                results.append(exc)
+        return results
+
+    def _stock_error(self, product_id: int) -> HTTPException:
+        if self.repo.get_version(product_id) is None:
+            return HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Product not found")
+        return HTTPException(status_code=status.HTTP_409_CONFLICT, detail="Insufficient stock")
+
+    def stats(self) -> ProductStatsOut:
+        """Return inventory totals in O(1); recompute if the summary is missing or stale."""
+        row = self.repo.stats.get()
+        if row is None:
+            _, row = self.repo.stats.recompute()
+        return ProductStatsOut.model_validate(row)
+
+    def recompute_stats(self) -> ProductStatsRecompute:
+        """Rebuild the summary from a full scan and report whether it had drifted."""
+        previous, row = self.repo.stats.recompute()
+        stats = ProductStatsOut.model_validate(row)
+        drifted = previous is not None and any(
+            previous[k] != getattr(stats, k) for k in previous
+        )
+        return ProductStatsRecompute(stats=stats, drifted=drifted)
+
+    def changes(self, since: Optional[str], limit: int) -> ProductChanges:
+        """
+        Products written and deleted after the 'since' token, oldest change
+        first, up to 'limit' entries. Without a token every product is
+        returned (paged the same way) and no tombstones. 400 for a malformed
+        token; 410 when its tombstones were purged, so the client must
+        restart without a token. A token ahead of this database (issued by
+        the primary, an event id, or a fresher replica) gets an empty page
+        with the same token: the changes arrive once this replica catches up.
+        """
+        position = (0, 0)
+        if since:
+            try:
+                position = decode_sync_token(since)
+            except ValueError:
+                raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Invalid sync token")
+        # Only changes below the watermark are final: no transaction can
+        # still commit there, so a position below it never skips a row
+        watermark, purged_through = self.repo.changes.watermark()
+        if since and position[0] <= purged_through:
+            raise HTTPException(
+                status_code=status.HTTP_410_GONE,
+                detail="Sync token expired; resync without 'since'",
+            )
+
+        products = self.repo.changes.products_since(position, watermark, limit + 1)
+        tombstones = self.repo.changes.tombstones_since(position, watermark, limit + 1) if since else []
+        entries = sorted(
+            [((p.change_seq, p.id), p) for p in products] + [((s, pid), pid) for pid, s in tombstones],
+            key=lambda entry: entry[0],
+        )
+        has_more = len(entries) > limit
+        entries = entries[:limit]
+        items = [obj for _, obj in entries if isinstance(obj, Product)]
+        current = {p.id for p in items}
+        deleted = [obj for _, obj in entries if not isinstance(obj, Product) and obj not in current]
+        # A complete answer covers everything below the watermark; a token
+        # already past it (a fresher primary or replica) is returned as is
+        next_position = entries[-1][0] if has_more else max(position, (watermark, 0))
+        return ProductChanges(
+            items=ProductOutList.validate_python(items, from_attributes=True),
+            deleted=deleted,
+            token=encode_sync_token(*next_position),
+            has_more=has_more,
+        )
+
+    def purge_tombstones(self) -> ProductTombstonePurge:
+        """Drop tombstones past TOMBSTONE_RETENTION_DAYS (expiring the tokens that needed them)."""
+        purged = self.repo.purge_tombstones()
+        _, purged_through = self.repo.changes.watermark()
+        return ProductTombstonePurge(purged=purged, purged_through=purged_through)
+
+    def batch(self, request: ProductBatchRequest) -> ProductBatchResponse:
+        """
+        Apply a mixed batch of create/update/delete operations.
+        - Missing ids and ids repeated across update/delete items fail per item.
+        - atomic=True: any failure leaves the database untouched.
+        - atomic=False: failed items are reported, the rest are committed.
+        """
+        ops = request.operations
+        errors: Dict[int, str] = {}
+
+        # Each id may be targeted once; then check existence in one query
+        targeted: Dict[int, int] = {}
+        for idx, op in enumerate(ops):
+            if op.op == "create":
+                continue
+            if op.id in targeted:
+                errors[idx] = f"Duplicate id {op.id} in batch"
+            else:
+                targeted[op.id] = idx
+        existing = self.repo.existing_ids(targeted)
+        for pid, idx in targeted.items():
+            if pid not in existing:
+                errors[idx] = "Product not found"
+
+        if request.atomic and errors:
+            return self._batch_response(ops, errors, created_ids=[], committed=False)
+
+        creates, updates, deletes = [], [], []
+        # Request index of each row, per group, to map row errors back to items
+        positions: Dict[str, List[int]] = {"create": [], "update": [], "delete": []}
+        for idx, op in enumerate(ops):
+            if idx in errors:
+                continue
+            positions[op.op].append(idx)
+            if op.op == "create":
+                creates.append(op.data.model_dump())
+            elif op.op == "update":
+                updates.append({"id": op.id, **op.data.model_dump(exclude_unset=True)})
+            else:
+                deletes.append(op.id)
+
+        try:
+            created_ids, row_errors = self.repo.bulk_write(
+                creates, updates, deletes, atomic=request.atomic
+            )
+        except SQLAlchemyError as exc:
+            message = str(getattr(exc, "orig", None) or exc)
+            errors.update({idx: message for idx in range(len(ops)) if idx not in errors})
+            return self._batch_response(ops, errors, created_ids=[], committed=False)
+        list_cache.invalidate()
+        for (group, pos), message in row_errors.items():
+            errors[positions[group][pos]] = message
+        failed = Counter(group for group, _ in row_errors)
+        self._publish_bulk(
+            created=len(creates) - failed["create"],
+            updated=len(updates) - failed["update"],
+            deleted=len(deletes) - failed["delete"],
+        )
+        created_ids = [pid for pid in created_ids if pid is not None]
+        return self._batch_response(ops, errors, created_ids=created_ids, committed=True)
+
+    @staticmethod
+    def _batch_response(
+        ops: List[ProductBatchOp],
+        errors: Dict[int, str],
+        *,
+        created_ids: List[int],
+        committed: bool,
+    ) -> ProductBatchResponse:
+        """Build per-item results in request order."""
+        new_ids = iter(created_ids)
+        results = []
+        for idx, op in enumerate(ops):
+            if idx in errors or not committed:
+                results.append(ProductBatchItemResult(
+                    index=idx, op=op.op, ok=False,
+                    id=getattr(op, "id", None),
+                    error=errors.get(idx, "Batch rolled back"),
+                ))
+            else:
+                pid = next(new_ids) if op.op == "create" else op.id
+                results.append(ProductBatchItemResult(index=idx, op=op.op, ok=True, id=pid))
+        failed = sum(1 for r in results if not r.ok)
+        return ProductBatchResponse(
+            committed=committed,
+            succeeded=len(results) - failed,
+            failed=failed,
+            results=results,
+        )
+
+    def import_rows(
+        self,
+        stream: BinaryIO,
+        fmt: str,
+        *,
+        chunk_size: int = _IMPORT_CHUNK_SIZE,
+    ) -> ProductImportReport:
+        """
+        Import products from a CSV or NDJSON byte stream.
+        - Rows are parsed incrementally and validated against ProductCreate.
+        - Valid rows are inserted and committed in chunks of chunk_size; the
+          list cache is invalidated after each committed chunk.
+        - Invalid rows are skipped and reported with their line number.
+        """
+        started = time.perf_counter()
+        received = inserted = failed = 0
+        errors: List[ProductImportError] = []
+        chunk: List[Dict[str, Any]] = []
+        chunk_lines: List[int] = []
+
+        def reject(line: int, message: str) -> None:
+            nonlocal failed
+            failed += 1
+            if len(errors) < _IMPORT_MAX_ERRORS:
+                errors.append(ProductImportError(line=line, error=message))
+
+        def flush() -> None:
+            nonlocal inserted
+            if not chunk:
+                return
+            try:
+                inserted += self.repo.bulk_create(chunk)
+                # Each chunk commits on its own: drop cached lists now rather
+                # than serve them stale until the import ends
+                list_cache.invalidate()
+            except SQLAlchemyError as exc:
+                message = str(getattr(exc, "orig", None) or exc)
+                for line in chunk_lines:
+                    reject(line, message)
+            chunk.clear()
+            chunk_lines.clear()
+
+        try:
+            for line, raw in _iter_import_rows(stream, fmt):
+                received += 1
+                if isinstance(raw, ValueError):
+                    reject(line, str(raw))
+                    continue
+                try:
+                    chunk.append(ProductCreate.model_validate(raw).model_dump())
+                    chunk_lines.append(line)
+                except ValidationError as exc:
+                    reject(line, _format_validation_error(exc))
+                if len(chunk) >= chunk_size:
+                    flush()
+        except (UnicodeDecodeError, csv.Error) as exc:
+            # The rest of the file cannot be read; keep what was parsed so far
+            reject(received + 1, f"Unreadable input: {exc}")
+        flush()
+        if inserted:
+            self._publish_bulk(created=inserted)
+
+        elapsed = time.perf_counter() - started
+        return ProductImportReport(
+            received=received,
+            inserted=inserted,
+            failed=failed,
+            elapsed_seconds=round(elapsed, 3),
+            rows_per_second=round(inserted / elapsed, 1) if elapsed > 0 else 0.0,
+            errors=errors,
+            errors_truncated=failed > len(errors),
+        )
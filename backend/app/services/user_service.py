@@ -10,34 +10,71 @@ Responsibilities:
 - Generate JWT tokens for authenticated users.
 
 Notes:
-- Delegates DB operations to SQLAlchemy session.
+- Delegates DB operations to a DbRunner (sync or async session).
+- Password hashing runs in the bcrypt process pool, never on the event loop;
+  when the pool is saturated the request is rejected with 503 + Retry-After.
+- Hashes made with an older bcrypt cost are replaced after a successful login.
 - Raises exceptions for invalid credentials or duplicate emails.
 """
 
+from typing import Optional
+
 from fastapi import HTTPException, status
-from sqlalchemy.orm import Session
 
-from app.core.security import create_access_token, hash_password, verify_password
+from app.core.config import settings
+from app.core.hashing import PoolBusy, password_hasher
+from app.core.security import create_access_token
+from app.db.runner import DbRunner
 from app.repositories.user_repo import UserRepository
 from app.schemas.user import UserCreate, UserOut
 
+def _busy() -> HTTPException:
+    return HTTPException(
+        status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+        detail="Authentication is busy, retry shortly",
+        headers={"Retry-After": str(settings.BCRYPT_RETRY_AFTER_SECONDS)},
+    )
+
 class UserService:
     """Business logic for user registration and authentication."""
-    def __init__(self, db: Session) -> None:
-        self.repo = UserRepository(db)
+    def __init__(self, db: DbRunner) -> None:
+        self.db = db
 
-    def register(self, data: UserCreate) -> UserOut:
+    async def register(self, data: UserCreate) -> UserOut:
         """Register a new user; role defaults to 'user' unless provided."""
-        if self.repo.get_by_email(data.email):
+        # bcrypt is CPU-bound: keep it off the event loop and request threads
+        try:
+            hashed = await password_hasher.hash(data.password)
+        except PoolBusy:
+            raise _busy()
+
+        def _create(s) -> Optional[UserOut]:
+            # persist role; the unique email index rejects duplicates
+            user = UserRepository(s).create(email=data.email, password_hash=hashed, role=data.role or "user")
+            return UserOut.model_validate(user) if user else None
+
+        created = await self.db.run(_create)
+        if created is None:
             raise HTTPException(status_code=400, detail="Email already registered")
-        hashed = hash_password(data.password)
-        # persist role
-        user = self.repo.create(email=data.email, password_hash=hashed, role=data.role or "user")
-        return UserOut.model_validate(user)
+        return created
 
-    def login(self, email: str, password: str) -> str:
+    async def login(self, email: str, password: str) -> str:
         """Validate credentials and return a JWT token including the user's role."""
-        user = self.repo.get_by_email(email)
-        if not user or not verify_password(password, user.password_hash):
+        def _credentials(s):
+            user = UserRepository(s).get_by_email(email)
+            return (user.id, user.role, user.password_hash) if user else None
+
+        found = await self.db.run(_credentials)
+        if not found:
+            raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="Invalid credentials")
+        user_id, role, password_hash = found
+        try:
+            valid, new_hash = await password_hasher.verify(password, password_hash)
+        except PoolBusy:
+            raise _busy()
+        if not valid:
             raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="Invalid credentials")
-        return create_access_token(subject=str(user.id), role=user.role)
\ No newline at end of file
+        if new_hash:
+            # bcrypt cost changed since this hash was made: upgrade it in place
+            await self.db.run(lambda s: UserRepository(s).update_password_hash(user_id, new_hash))
+        return create_access_token(subject=str(user_id), role=role)
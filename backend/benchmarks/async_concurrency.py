@@ -0,0 +1,152 @@
+"""
+File: async_concurrency.py
+Description: Compare request throughput of the sync and async DB paths.
+Author: Jairo Céspedes
+Date: 2025-09-05
+
+Responsibilities:
+- Seed a products table, then drive the app in-process (ASGI) with many
+  concurrent GET /products/{id} and GET /products/?limit=20 requests.
+- Run the same load with routes on the threadpool (sync Session) and on
+  the event loop (AsyncSession), and report requests/second and latency.
+
+Notes:
+- Usage (from backend/):
+    python -m benchmarks.async_concurrency --concurrency 200 --requests 4000
+    python -m benchmarks.async_concurrency --database-url postgresql+psycopg2://...
+- The list cache is disabled so every request reaches the database.
+- --threads caps Starlette's threadpool; the async path does not use it.
+"""
+
+import argparse
+import asyncio
+import os
+import random
+import statistics
+import tempfile
+import time
+
+os.environ.setdefault("DATABASE_URL", "sqlite://")
+os.environ.setdefault("JWT_SECRET", "benchmark")
+
+import anyio.to_thread
+import httpx
+from sqlalchemy import create_engine, insert
+from sqlalchemy.ext.asyncio import async_sessionmaker, create_async_engine
+from sqlalchemy.orm import sessionmaker
+
+from app.core.config import settings
+from app.core.search import normalize_search
+from app.core.security import create_access_token
+from app.db.base import Base
+from app.db.session import async_database_url
+from app.deps import (
+    async_read_runner,
+    async_runner,
+    get_async_db,
+    get_db,
+    get_read_runner,
+    get_runner,
+    sync_read_runner,
+    sync_runner,
+)
+from app.main import app
+from app.models.product import Product
+
+
+def _seed(url: str, rows: int) -> None:
+    engine = create_engine(url)
+    Base.metadata.drop_all(engine)
+    Base.metadata.create_all(engine)
+    with engine.begin() as conn:
+        conn.execute(insert(Product), [
+            {"name": f"Product {i}", "name_search": normalize_search(f"Product {i}"),
+             "description": "x" * 200, "price": i % 500, "quantity": i % 90, "image_url": None}
+            for i in range(rows)
+        ])
+    engine.dispose()
+
+
+async def _drive(mode: str, requests: int, concurrency: int, rows: int) -> dict:
+    token = create_access_token(subject="1", role="user")
+    headers = {"Authorization": f"Bearer {token}"}
+    latencies = []
+    sem = asyncio.Semaphore(concurrency)
+
+    async def one(client: httpx.AsyncClient, i: int) -> None:
+        path = f"/products/{random.randint(1, rows)}" if i % 2 else "/products/?limit=20"
+        async with sem:
+            started = time.perf_counter()
+            r = await client.get(path, headers=headers)
+            latencies.append(time.perf_counter() - started)
+            r.raise_for_status()
+
+    transport = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench") as client:
+        started = time.perf_counter()
+        await asyncio.gather(*(one(client, i) for i in range(requests)))
+        elapsed = time.perf_counter() - started
+
+    latencies.sort()
+    return {
+        "mode": mode,
+        "req_per_s": requests / elapsed,
+        "p50_ms": statistics.median(latencies) * 1000,
+        "p99_ms": latencies[int(len(latencies) * 0.99) - 1] * 1000,
+    }
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--database-url", help="sync SQLAlchemy URL (default: temporary SQLite file)")
+    parser.add_argument("--rows", type=int, default=5000)
+    parser.add_argument("--requests", type=int, default=2000)
+    parser.add_argument("--concurrency", type=int, default=100)
+    parser.add_argument("--threads", type=int, default=40)
+    args = parser.parse_args()
+
+    url = args.database_url or f"sqlite:///{tempfile.mkdtemp()}/bench.db"
+    _seed(url, args.rows)
+    settings.PRODUCT_CACHE_ENABLED = False
+
+    sync_engine = create_engine(url, pool_size=args.threads, max_overflow=0)
+    sync_sessions = sessionmaker(bind=sync_engine, autoflush=False)
+    async_engine = create_async_engine(async_database_url(url), pool_size=args.concurrency, max_overflow=0)
+    async_sessions = async_sessionmaker(bind=async_engine, autoflush=False)
+
+    def _get_db():
+        db = sync_sessions()
+        try:
+            yield db
+        finally:
+            db.close()
+
+    async def _get_async_db():
+        async with async_sessions() as db:
+            yield db
+
+    app.dependency_overrides[get_db] = _get_db
+    app.dependency_overrides[get_async_db] = _get_async_db
+
+    async def run_all() -> list:
+        anyio.to_thread.current_default_thread_limiter().total_tokens = args.threads
+        results = []
+        modes = (("sync", sync_runner, sync_read_runner), ("async", async_runner, async_read_runner))
+        for mode, runner, read_runner in modes:
+            app.dependency_overrides[get_runner] = runner
+            app.dependency_overrides[get_read_runner] = read_runner
+            await _drive(mode, min(200, args.requests), args.concurrency, args.rows)  # warm-up
+            results.append(await _drive(mode, args.requests, args.concurrency, args.rows))
+        await async_engine.dispose()
+        return results
+
+    results = asyncio.run(run_all())
+    print(f"{'mode':<6} {'req/s':>10} {'p50 ms':>10} {'p99 ms':>10}")
+    for r in results:
+        print(f"{r['mode']:<6} {r['req_per_s']:>10.1f} {r['p50_ms']:>10.2f} {r['p99_ms']:>10.2f}")
+    sync_rps, async_rps = results[0]["req_per_s"], results[1]["req_per_s"]
+    print(f"async/sync throughput: {async_rps / sync_rps:.2f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,165 @@
+"""
+File: metrics_overhead.py
+Description: Measure the cost of request and statement metrics.
+Author: Jairo Céspedes
+Date: 2025-09-05
+
+Responsibilities:
+- Time a minimal ASGI endpoint with and without MetricsMiddleware, which
+  isolates the per-request overhead of the middleware.
+- Time SELECTs on an engine with and without the statement timing events.
+- Time GET /products/{id} through the full app with and without the
+  middleware, to put the overhead next to a real request.
+
+Notes:
+- Usage (from backend/):
+    python -m benchmarks.metrics_overhead --requests 20000
+- Each pair runs interleaved rounds and reports the best round, which
+  filters out scheduler noise on shared machines.
+"""
+
+import argparse
+import asyncio
+import os
+import tempfile
+import time
+
+os.environ.setdefault("DATABASE_URL", "sqlite://")
+os.environ.setdefault("JWT_SECRET", "benchmark")
+
+from sqlalchemy import create_engine, insert, text
+from sqlalchemy.orm import sessionmaker
+
+from app.core.config import settings
+from app.core.metrics import MetricsMiddleware
+from app.core.search import normalize_search
+from app.core.security import create_access_token
+from app.db.base import Base
+from app.db.statements import instrument_statements
+from app.deps import get_db, get_read_runner, get_runner, sync_read_runner, sync_runner
+from app.main import app
+from app.models.product import Product
+
+_ROUNDS = 5
+
+
+async def _bare_app(scope, receive, send) -> None:
+    await send({"type": "http.response.start", "status": 200, "headers": []})
+    await send({"type": "http.response.body", "body": b"ok"})
+
+
+def _scope() -> dict:
+    # A matched route as the router would leave it in the scope
+    route = next(r for r in app.routes if getattr(r, "path", None) == "/")
+    return {"type": "http", "method": "GET", "path": "/", "route": route}
+
+
+async def _asgi_per_call(handler, calls: int) -> float:
+    async def receive():
+        return {"type": "http.request"}
+
+    async def send(message):
+        return None
+
+    scope = _scope()
+    started = time.perf_counter()
+    for _ in range(calls):
+        await handler(dict(scope), receive, send)
+    return (time.perf_counter() - started) / calls
+
+
+def _statement_per_call(instrumented: bool, calls: int) -> float:
+    engine = create_engine("sqlite://")
+    if instrumented:
+        instrument_statements(engine, "bench")
+    with engine.connect() as conn:
+        started = time.perf_counter()
+        for _ in range(calls):
+            conn.execute(text("SELECT 1"))
+        elapsed = time.perf_counter() - started
+    engine.dispose()
+    return elapsed / calls
+
+
+async def _app_per_call(handler, calls: int, headers: list) -> float:
+    async def receive():
+        return {"type": "http.request", "body": b"", "more_body": False}
+
+    async def send(message):
+        return None
+
+    base = {
+        "type": "http", "http_version": "1.1", "method": "GET", "scheme": "http",
+        "path": "/products/1", "raw_path": b"/products/1", "root_path": "",
+        "query_string": b"", "headers": headers, "client": ("bench", 1), "server": ("bench", 80),
+    }
+    started = time.perf_counter()
+    for _ in range(calls):
+        await handler(dict(base), receive, send)
+    return (time.perf_counter() - started) / calls
+
+
+def _best(pairs) -> tuple:
+    """Run (baseline, instrumented) callables in interleaved rounds; keep best of each."""
+    base, instr = [], []
+    for _ in range(_ROUNDS):
+        base.append(pairs[0]())
+        instr.append(pairs[1]())
+    return min(base), min(instr)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--requests", type=int, default=20000)
+    args = parser.parse_args()
+    n = args.requests
+
+    middleware = MetricsMiddleware(_bare_app)
+    asgi = _best((
+        lambda: asyncio.run(_asgi_per_call(_bare_app, n)),
+        lambda: asyncio.run(_asgi_per_call(middleware, n)),
+    ))
+    stmt = _best((lambda: _statement_per_call(False, n), lambda: _statement_per_call(True, n)))
+
+    # Full app: one product in a file database, list cache off
+    url = f"sqlite:///{tempfile.mkdtemp()}/bench.db"
+    engine = create_engine(url)
+    Base.metadata.create_all(engine)
+    with engine.begin() as conn:
+        conn.execute(insert(Product), [{"name": "P", "name_search": normalize_search("P"), "price": 1, "quantity": 1}])
+    sessions = sessionmaker(bind=engine, autoflush=False)
+
+    def _get_db():
+        db = sessions()
+        try:
+            yield db
+        finally:
+            db.close()
+
+    settings.PRODUCT_CACHE_ENABLED = False
+    app.dependency_overrides[get_db] = _get_db
+    app.dependency_overrides[get_runner] = sync_runner
+    app.dependency_overrides[get_read_runner] = sync_read_runner
+    token = create_access_token(subject="1", role="user")
+    headers = [(b"authorization", f"Bearer {token}".encode())]
+    full_app = app.build_middleware_stack()
+    app.user_middleware = [m for m in app.user_middleware if m.cls is not MetricsMiddleware]
+    bare_stack = app.build_middleware_stack()
+    calls = max(n // 20, 200)
+    full = _best((
+        lambda: asyncio.run(_app_per_call(bare_stack, calls, headers)),
+        lambda: asyncio.run(_app_per_call(full_app, calls, headers)),
+    ))
+
+    print(f"{'measurement':<28} {'without us':>11} {'with us':>9} {'overhead us':>12}")
+    for label, (without, with_) in (
+        ("ASGI request (middleware)", asgi),
+        ("SQL statement (events)", stmt),
+        ("GET /products/{id} (app)", full),
+    ):
+        print(f"{label:<28} {without * 1e6:>11.2f} {with_ * 1e6:>9.2f} {(with_ - without) * 1e6:>12.2f}")
+    print(f"full request overhead: {(full[1] - full[0]) / full[0] * 100:.1f}%")
+
+
+if __name__ == "__main__":
+    main()
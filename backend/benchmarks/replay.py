@@ -0,0 +1,253 @@
+"""
+File: replay.py
+Description: Replay a recorded request log against the app and report latency per route.
+Author: Jairo Céspedes
+Date: 2025-09-05
+
+Responsibilities:
+- Read a log written by TrafficRecorder (TRAFFIC_LOG_PATH, app/core/traffic.py).
+- Re-issue its requests on the recorded schedule, scaled by --speed and
+  capped at --concurrency requests in flight, either in-process through
+  ASGI or against a running instance (--target).
+- Replace recorded identities with replay users of the same role, and
+  recorded logins/registrations with ones for those users.
+- Report p50/p95/p99 latency, 4xx and error rates per route, next to the
+  latency recorded in the log.
+
+Notes:
+- Usage (from backend/):
+    TRAFFIC_LOG_PATH=traffic.jsonl uvicorn app.main:app   # record
+    python -m benchmarks.replay traffic.jsonl --speed 2 --concurrency 100
+    python -m benchmarks.replay traffic.jsonl --target http://localhost:8000 --speed 0
+- In-process runs use a temporary SQLite database (or --database-url,
+  which is wiped) seeded with enough products for the ids in the log.
+- --speed 1 keeps the recorded pacing, 2 doubles the rate, 0 sends as
+  fast as --concurrency allows. "lag" is how late requests started
+  against their schedule; a large lag means the harness, not the app,
+  set the pace.
+- Errors are 5xx responses and transport failures. Replayed writes do
+  change the target database.
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import re
+import statistics
+import sys
+import tempfile
+import time
+import uuid
+from collections import defaultdict
+from typing import Any, Dict, List, Optional, Tuple
+
+os.environ.setdefault("DATABASE_URL", "sqlite://")
+os.environ.setdefault("JWT_SECRET", "benchmark")
+
+import httpx
+from sqlalchemy import create_engine, insert, text
+from sqlalchemy.orm import sessionmaker
+
+from app.core.search import normalize_search
+from app.core.traffic import read_log
+from app.db.base import Base
+from app.db.init_db import run_migrations
+from app.deps import get_db, get_read_runner, get_runner, get_sessionmaker, sync_read_runner, sync_runner
+from app.main import app
+from app.models.product import Product
+
+_PASSWORD = "replay-password"
+_PRODUCT_ID = re.compile(r"^/products/(\d+)")
+
+
+def _percentile(samples: List[float], q: float) -> float:
+    return samples[max(0, int(len(samples) * q + 0.5) - 1)] if samples else 0.0
+
+
+def _max_product_id(entries: List[Dict[str, Any]]) -> int:
+    ids = [int(m.group(1)) for m in (_PRODUCT_ID.match(e["path"]) for e in entries) if m]
+    return max(ids, default=0)
+
+
+def _prepare_database(url: str, products: int) -> sessionmaker:
+    """Migrate a fresh schema, seed 'products' rows and route the app to it."""
+    engine = create_engine(url)
+    with engine.begin() as conn:
+        Base.metadata.drop_all(conn)
+        conn.execute(text("DROP TABLE IF EXISTS alembic_version"))
+    run_migrations(engine)
+    with engine.begin() as conn:
+        if products:
+            conn.execute(insert(Product), [
+                {"name": f"Product {i}", "name_search": normalize_search(f"Product {i}"),
+                 "description": "x" * 100, "price": i % 500, "quantity": 10 + i % 90,
+                 "image_url": None if i % 3 else f"http://img/{i}.png"}
+                for i in range(1, products + 1)
+            ])
+    sessions = sessionmaker(bind=engine, autoflush=False)
+
+    def _get_db():
+        db = sessions()
+        try:
+            yield db
+        finally:
+            db.close()
+
+    app.dependency_overrides[get_db] = _get_db
+    app.dependency_overrides[get_runner] = sync_runner
+    app.dependency_overrides[get_read_runner] = sync_read_runner
+    app.dependency_overrides[get_sessionmaker] = lambda: sessions
+    return sessions
+
+
+class Identities:
+    """One replay user per recorded role, registered and logged in up front."""
+
+    def __init__(self) -> None:
+        self.emails: Dict[str, str] = {}
+        self.headers: Dict[str, Dict[str, str]] = {
+            "anonymous": {},
+            "invalid": {"Authorization": "Bearer invalid"},
+        }
+
+    async def prepare(self, client: httpx.AsyncClient, roles: set) -> None:
+        for role in sorted(roles - set(self.headers)) + ["user"]:
+            if role in self.emails:
+                continue
+            email = f"replay-{role}-{uuid.uuid4().hex[:8]}@example.com"
+            r = await client.post("/auth/register", json={"email": email, "password": _PASSWORD, "role": role})
+            r.raise_for_status()
+            r = await client.post("/auth/login", json={"email": email, "password": _PASSWORD})
+            r.raise_for_status()
+            self.emails[role] = email
+            self.headers[role] = {"Authorization": f"Bearer {r.json()['access_token']}"}
+
+    def request(self, entry: Dict[str, Any]) -> Tuple[Dict[str, str], Optional[Any]]:
+        """Headers and JSON body to send for a recorded entry."""
+        path, method = entry["path"], entry["method"]
+        if method == "POST" and path == "/auth/login":
+            return {}, {"email": self.emails["user"], "password": _PASSWORD}
+        if method == "POST" and path == "/auth/register":
+            return {}, {"email": f"replay-{uuid.uuid4().hex}@example.com", "password": _PASSWORD}
+        return self.headers.get(entry.get("role", "anonymous"), {}), entry.get("body")
+
+
+async def replay(
+    client: httpx.AsyncClient,
+    entries: List[Dict[str, Any]],
+    speed: float,
+    concurrency: int,
+) -> Tuple[List[Dict[str, Any]], float]:
+    """Send every entry on schedule; return one result per request and the wall time."""
+    identities = Identities()
+    await identities.prepare(client, {e.get("role", "anonymous") for e in entries})
+    sem = asyncio.Semaphore(concurrency)
+    results: List[Dict[str, Any]] = []
+    first = entries[0]["ts"]
+
+    async def one(entry: Dict[str, Any], due: float) -> None:
+        headers, body = identities.request(entry)
+        async with sem:
+            started = time.perf_counter()
+            lag = max(0.0, started - due)
+            try:
+                r = await client.request(
+                    entry["method"],
+                    entry["path"] + (f"?{entry['query']}" if entry.get("query") else ""),
+                    headers=headers,
+                    json=body,
+                )
+                status = r.status_code
+            except httpx.HTTPError:
+                status = 0
+            results.append({
+                "route": f"{entry['method']} {entry.get('route') or entry['path']}",
+                "status": status,
+                "ms": (time.perf_counter() - started) * 1000,
+                "lag_ms": lag * 1000,
+                "recorded_ms": entry.get("duration_ms"),
+            })
+
+    started = time.perf_counter()
+    tasks = []
+    for entry in entries:
+        due = started + ((entry["ts"] - first) / speed if speed > 0 else 0.0)
+        delay = due - time.perf_counter()
+        if delay > 0:
+            await asyncio.sleep(delay)
+        tasks.append(asyncio.create_task(one(entry, due)))
+    await asyncio.gather(*tasks)
+    return results, time.perf_counter() - started
+
+
+def summarize(results: List[Dict[str, Any]]) -> Dict[str, Dict[str, Any]]:
+    """Latency percentiles and error rates per route, plus an "ALL" row."""
+    groups: Dict[str, List[Dict[str, Any]]] = defaultdict(list)
+    for r in results:
+        groups[r["route"]].append(r)
+        groups["ALL"].append(r)
+    report = {}
+    for route, rows in sorted(groups.items(), key=lambda item: -len(item[1])):
+        ms = sorted(r["ms"] for r in rows)
+        recorded = sorted(r["recorded_ms"] for r in rows if r["recorded_ms"] is not None)
+        report[route] = {
+            "count": len(rows),
+            "p50_ms": round(_percentile(ms, 0.50), 3),
+            "p95_ms": round(_percentile(ms, 0.95), 3),
+            "p99_ms": round(_percentile(ms, 0.99), 3),
+            "recorded_p50_ms": round(statistics.median(recorded), 3) if recorded else None,
+            "client_error_rate": round(sum(400 <= r["status"] < 500 for r in rows) / len(rows), 4),
+            "error_rate": round(sum(r["status"] == 0 or r["status"] >= 500 for r in rows) / len(rows), 4),
+            "max_lag_ms": round(max(r["lag_ms"] for r in rows), 3),
+        }
+    return report
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("log", help="JSON-lines request log recorded with TRAFFIC_LOG_PATH")
+    parser.add_argument("--target", help="base URL of a running instance (default: in-process ASGI)")
+    parser.add_argument("--database-url", help="in-process only: sync SQLAlchemy URL (default: temporary SQLite file)")
+    parser.add_argument("--products", type=int, help="in-process only: products to seed (default: highest id in the log)")
+    parser.add_argument("--speed", type=float, default=1.0, help="pacing multiplier; 0 = as fast as possible")
+    parser.add_argument("--concurrency", type=int, default=50)
+    parser.add_argument("--limit", type=int, help="replay only the first N requests")
+    parser.add_argument("--json", dest="json_path", help="also write the report to this file")
+    args = parser.parse_args()
+
+    entries = read_log(args.log)[: args.limit]
+    if not entries:
+        sys.exit(f"no requests in {args.log}")
+
+    if args.target:
+        transport: httpx.AsyncBaseTransport = httpx.AsyncHTTPTransport(limits=httpx.Limits(max_connections=args.concurrency))
+        base_url = args.target
+    else:
+        url = args.database_url or f"sqlite:///{tempfile.mkdtemp()}/replay.db"
+        products = args.products if args.products is not None else max(_max_product_id(entries), 1000)
+        _prepare_database(url, products)
+        transport = httpx.ASGITransport(app=app)
+        base_url = "http://replay"
+
+    async def run() -> Tuple[List[Dict[str, Any]], float]:
+        async with httpx.AsyncClient(transport=transport, base_url=base_url, timeout=60) as client:
+            return await replay(client, entries, args.speed, args.concurrency)
+
+    results, elapsed = asyncio.run(run())
+    report = summarize(results)
+    print(f"{len(results)} requests in {elapsed:.1f}s ({len(results) / elapsed:.1f} req/s)")
+    print(f"{'route':<42} {'count':>6} {'p50':>8} {'p95':>8} {'p99':>8} {'rec p50':>8} {'4xx':>6} {'err':>6}")
+    for route, row in report.items():
+        recorded = f"{row['recorded_p50_ms']:.2f}" if row["recorded_p50_ms"] is not None else "-"
+        print(
+            f"{route[:42]:<42} {row['count']:>6} {row['p50_ms']:>8.2f} {row['p95_ms']:>8.2f} {row['p99_ms']:>8.2f} "
+            f"{recorded:>8} {row['client_error_rate']:>6.1%} {row['error_rate']:>6.1%}"
+        )
+    if args.json_path:
+        with open(args.json_path, "w", encoding="utf-8") as f:
+            json.dump({"requests": len(results), "seconds": round(elapsed, 3), "routes": report}, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
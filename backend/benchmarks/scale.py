@@ -0,0 +1,279 @@
+"""
+File: scale.py
+Description: Scale benchmarks for the product repository, service and API layers.
+Author: Jairo Céspedes
+Date: 2025-09-05
+
+Responsibilities:
+- Seed synthetic catalogs (10k, 100k, 1M products by default) with chunked
+  bulk inserts into a schema built by the Alembic migrations, so the
+  indexes match production.
+- Time list, search, filter, sort, get and write operations at each layer:
+  ProductRepository, ProductService and the HTTP API (in-process ASGI).
+- Report p50/p95 latency and sequential throughput per operation, write
+  them to JSON and compare the run against a stored baseline.
+
+Notes:
+- Usage (from backend/):
+    python -m benchmarks.scale --sizes 10000,100000
+    python -m benchmarks.scale --sizes 1000000 --database-url postgresql+psycopg2://...
+    python -m benchmarks.scale --save-baseline   # after an intended change
+- The target database is wiped and reseeded for every size; never point
+  --database-url at a database holding real data.
+- Results are keyed "<dialect>:<rows>:<layer>:<operation>". Only keys
+  present in both the run and the baseline are compared; a p50 more than
+  --tolerance (and --min-delta-ms) above the baseline is a regression and
+  the exit status is 1.
+- Baselines are machine-specific: record them on the machine that
+  compares against them.
+"""
+
+import argparse
+import json
+import os
+import platform
+import random
+import statistics
+import sys
+import tempfile
+import time
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import Any, Callable, Dict, Iterator, List, Optional
+
+os.environ.setdefault("DATABASE_URL", "sqlite://")
+os.environ.setdefault("JWT_SECRET", "benchmark")
+
+from fastapi.testclient import TestClient
+from sqlalchemy import create_engine, insert, text
+from sqlalchemy.engine import Engine
+from sqlalchemy.orm import sessionmaker
+
+from app.core.config import settings
+from app.core.search import normalize_search
+from app.core.security import create_access_token
+from app.db.base import Base
+from app.db.init_db import run_migrations
+from app.deps import get_db, get_read_runner, get_runner, sync_read_runner, sync_runner
+from app.main import app
+from app.models.product import Product
+from app.repositories.product_repo import ProductRepository
+from app.schemas.product import ProductUpdate
+from app.services.product_service import ProductService
+
+DEFAULT_BASELINE = Path(__file__).resolve().parent / "baselines" / "scale.json"
+
+_SEED_CHUNK = 20000
+_ADJECTIVES = ("red", "blue", "organic", "classic", "mini", "deluxe", "eco", "smart", "vintage", "sport")
+_NOUNS = ("shampoo", "lamp", "mug", "chair", "sneaker", "kettle", "notebook", "backpack", "candle", "speaker")
+
+# Query parameters shared by every layer; search hits roughly 1% of a catalog
+_OPERATIONS: Dict[str, Dict[str, Any]] = {
+    "list": {"limit": 50},
+    "search": {"q": "organic lamp 1", "sort_by": "relevance", "limit": 50},
+    "filter": {"min_price": 100, "max_price": 150, "min_qty": 10, "has_image": True, "limit": 50},
+    "sort": {"sort_by": "price", "sort_dir": "desc", "limit": 50},
+}
+
+
+def _catalog(rows: int, seed: int) -> Iterator[List[Dict[str, Any]]]:
+    """Deterministic product rows, in chunks ready for executemany."""
+    rnd = random.Random(seed)
+    chunk: List[Dict[str, Any]] = []
+    for i in range(1, rows + 1):
+        name = f"{rnd.choice(_ADJECTIVES)} {rnd.choice(_NOUNS)} {i}"
+        chunk.append({
+            "name": name,
+            "name_search": normalize_search(name),
+            "description": "x" * rnd.randint(20, 200),
+            "price": round(rnd.uniform(1, 500), 2),
+            "quantity": rnd.randint(0, 200),
+            "image_url": f"http://img/{i}.png" if i % 3 else None,
+        })
+        if len(chunk) == _SEED_CHUNK:
+            yield chunk
+            chunk = []
+    if chunk:
+        yield chunk
+
+
+def _seed(engine: Engine, rows: int, seed: int) -> float:
+    """Rebuild the schema and bulk insert 'rows' products; return seconds spent."""
+    started = time.perf_counter()
+    with engine.begin() as conn:
+        Base.metadata.drop_all(conn)
+        conn.execute(text("DROP TABLE IF EXISTS alembic_version"))
+    run_migrations(engine)
+    for chunk in _catalog(rows, seed):
+        with engine.begin() as conn:
+            conn.execute(insert(Product), chunk)
+    with engine.begin() as conn:
+        if engine.dialect.name == "postgresql":
+            conn.execute(text("ANALYZE products"))
+        elif engine.dialect.name == "sqlite":
+            conn.execute(text("ANALYZE"))
+    with sessionmaker(bind=engine)() as db:
+        ProductRepository(db).stats.recompute()
+    return time.perf_counter() - started
+
+
+def _measure(fn: Callable[[int], Any], repeat: int, warmup: int) -> Dict[str, float]:
+    """Run fn(i) sequentially and summarize its latency."""
+    for i in range(warmup):
+        fn(i)
+    samples = []
+    for i in range(repeat):
+        started = time.perf_counter()
+        fn(i)
+        samples.append(time.perf_counter() - started)
+    samples.sort()
+    return {
+        "p50_ms": round(statistics.median(samples) * 1000, 3),
+        "p95_ms": round(samples[max(0, int(len(samples) * 0.95) - 1)] * 1000, 3),
+        "ops_per_s": round(len(samples) / sum(samples), 1),
+    }
+
+
+def _session_ops(sessions: sessionmaker, layer: Callable[[Any], Any], ids: List[int]) -> Dict[str, Callable[[int], Any]]:
+    """Operations on a ProductRepository or ProductService, one session per call as per request."""
+    def call(method: str, *args: Any, **kwargs: Any) -> Callable[[int], Any]:
+        def run(i: int) -> Any:
+            with sessions() as db:
+                return getattr(layer(db), method)(*[a(i) if callable(a) else a for a in args], **kwargs)
+        return run
+
+    ops = {name: call("list", **params) for name, params in _OPERATIONS.items()}
+    ops["get"] = call("get", lambda i: ids[i % len(ids)])
+    ops["write"] = call("update", lambda i: ids[i % len(ids)], lambda i: ProductUpdate(quantity=i % 200))
+    return ops
+
+
+def _api_ops(client: TestClient, ids: List[int]) -> Dict[str, Callable[[int], Any]]:
+    headers = {"Authorization": f"Bearer {create_access_token(subject='1', role='admin')}"}
+
+    def request(method: str, path: Callable[[int], str], **kwargs: Any) -> Callable[[int], Any]:
+        def run(i: int) -> Any:
+            r = client.request(method, path(i), headers=headers, **{k: v(i) if callable(v) else v for k, v in kwargs.items()})
+            r.raise_for_status()
+        return run
+
+    ops = {name: request("GET", lambda i: "/products/", params=params) for name, params in _OPERATIONS.items()}
+    ops["get"] = request("GET", lambda i: f"/products/{ids[i % len(ids)]}")
+    ops["write"] = request("PUT", lambda i: f"/products/{ids[i % len(ids)]}", json=lambda i: {"quantity": i % 200})
+    return ops
+
+
+def run_size(engine: Engine, rows: int, repeat: int, warmup: int, seed: int) -> Dict[str, Dict[str, float]]:
+    """Seed one catalog size and time every layer/operation on it."""
+    seconds = _seed(engine, rows, seed)
+    print(f"seeded {rows} rows in {seconds:.1f}s", file=sys.stderr)
+    sessions = sessionmaker(bind=engine, autoflush=False)
+    ids = random.Random(seed).sample(range(1, rows + 1), min(rows, 1000))
+
+    def _get_db():
+        db = sessions()
+        try:
+            yield db
+        finally:
+            db.close()
+
+    app.dependency_overrides[get_db] = _get_db
+    app.dependency_overrides[get_runner] = sync_runner
+    app.dependency_overrides[get_read_runner] = sync_read_runner
+    results: Dict[str, Dict[str, float]] = {
+        f"{engine.dialect.name}:{rows}:seed:bulk_insert": {"seconds": round(seconds, 2), "rows_per_s": round(rows / seconds, 1)},
+    }
+    with TestClient(app) as client:
+        layers = {
+            "repository": _session_ops(sessions, ProductRepository, ids),
+            "service": _session_ops(sessions, ProductService, ids),
+            "api": _api_ops(client, ids),
+        }
+        for layer, ops in layers.items():
+            for op, fn in ops.items():
+                key = f"{engine.dialect.name}:{rows}:{layer}:{op}"
+                results[key] = _measure(fn, repeat, warmup)
+                print(f"{key:<40} p50 {results[key]['p50_ms']:>9.3f} ms  p95 {results[key]['p95_ms']:>9.3f} ms", file=sys.stderr)
+    app.dependency_overrides.clear()
+    return results
+
+
+def compare(
+    results: Dict[str, Dict[str, float]],
+    baseline: Dict[str, Dict[str, float]],
+    tolerance: float,
+    min_delta_ms: float,
+) -> List[str]:
+    """
+    Return a line per compared key and mark regressions: p50 slower than
+    the tolerance allows and by more than min_delta_ms, so sub-millisecond
+    jitter on fast operations is not reported.
+    """
+    lines = []
+    for key in sorted(results.keys() & baseline.keys()):
+        before, after = baseline[key].get("p50_ms"), results[key].get("p50_ms")
+        if not before or after is None:
+            continue
+        ratio = after / before
+        flag = "REGRESSION" if ratio > 1 + tolerance and after - before > min_delta_ms else ""
+        lines.append(f"{key:<40} {before:>9.3f} -> {after:>9.3f} ms  {ratio:>5.2f}x {flag}".rstrip())
+    return lines
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--database-url", help="sync SQLAlchemy URL (default: temporary SQLite file)")
+    parser.add_argument("--sizes", default="10000,100000,1000000", help="comma-separated catalog sizes")
+    parser.add_argument("--repeat", type=int, default=200)
+    parser.add_argument("--warmup", type=int, default=20)
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--output", type=Path, default=Path("scale_results.json"))
+    parser.add_argument("--baseline", type=Path, default=DEFAULT_BASELINE)
+    parser.add_argument("--tolerance", type=float, default=0.25, help="allowed p50 slowdown (0.25 = 25%%)")
+    parser.add_argument("--min-delta-ms", type=float, default=0.5, help="ignore smaller p50 slowdowns")
+    parser.add_argument("--save-baseline", action="store_true", help="merge this run into the baseline file")
+    args = parser.parse_args()
+
+    url = args.database_url or f"sqlite:///{tempfile.mkdtemp()}/scale.db"
+    engine = create_engine(url)
+    settings.PRODUCT_CACHE_ENABLED = False  # every call must reach the database
+    settings.SLOW_QUERY_MS = 0
+
+    results: Dict[str, Dict[str, float]] = {}
+    for rows in (int(s) for s in args.sizes.split(",")):
+        results.update(run_size(engine, rows, args.repeat, args.warmup, args.seed))
+    engine.dispose()
+
+    document = {
+        "meta": {
+            "created_at": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+            "dialect": engine.dialect.name,
+            "python": platform.python_version(),
+            "machine": platform.machine(),
+            "repeat": args.repeat,
+        },
+        "results": results,
+    }
+    args.output.write_text(json.dumps(document, indent=2, sort_keys=True) + "\n")
+    print(f"results written to {args.output}")
+
+    baseline: Optional[Dict[str, Any]] = json.loads(args.baseline.read_text()) if args.baseline.exists() else None
+    if args.save_baseline:
+        merged = {**(baseline or {}).get("results", {}), **results}
+        args.baseline.parent.mkdir(parents=True, exist_ok=True)
+        args.baseline.write_text(json.dumps({"meta": document["meta"], "results": merged}, indent=2, sort_keys=True) + "\n")
+        print(f"baseline updated: {args.baseline}")
+        return
+    if baseline is None:
+        print(f"no baseline at {args.baseline}; run with --save-baseline to record one")
+        return
+
+    lines = compare(results, baseline["results"], args.tolerance, args.min_delta_ms)
+    print(f"{'key':<40} {'baseline':>9}    {'current':>9}")
+    print("\n".join(lines) if lines else "no keys in common with the baseline")
+    if any(line.endswith("REGRESSION") for line in lines):
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
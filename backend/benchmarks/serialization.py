@@ -0,0 +1,86 @@
+"""
+File: serialization.py
+Description: Measure the per-row cost of serializing product lists.
+Author: Jairo Céspedes
+Date: 2025-09-05
+
+Responsibilities:
+- Build ORM Product rows in memory (no database involved).
+- Time the previous list path: ProductOut.model_validate per row, then
+  FastAPI's response_model validation and JSON encoding of the list.
+- Time the current path: one ProductOutList.validate_python call and one
+  dump_json call, as done by ProductService.list and the list route.
+- Check both paths produce the same JSON document.
+
+Notes:
+- Usage (from backend/):
+    python -m benchmarks.serialization --rows 1000 --repeat 50
+"""
+
+import argparse
+import json
+import os
+import time
+from datetime import datetime
+from decimal import Decimal
+from typing import List
+
+os.environ.setdefault("DATABASE_URL", "sqlite://")
+os.environ.setdefault("JWT_SECRET", "benchmark")
+
+from fastapi._compat import ModelField
+from fastapi.utils import create_model_field
+
+from app.models.product import Product
+from app.schemas.product import ProductOut, ProductOutList
+
+
+def _rows(count: int) -> List[Product]:
+    now = datetime(2025, 9, 5, 12, 30, 15, 123456)
+    return [
+        Product(id=i, name=f"Product {i}", description="x" * 200, price=Decimal(i % 500) / 4,
+                quantity=i % 90, image_url=None if i % 3 else f"http://img/{i}.png", updated_at=now)
+        for i in range(count)
+    ]
+
+
+def _previous(rows: List[Product], field: ModelField) -> bytes:
+    items = [ProductOut.model_validate(r) for r in rows]
+    value, errors = field.validate(items, {}, loc=("response",))
+    assert not errors
+    content = field.serialize(value)
+    return json.dumps(content, ensure_ascii=False, separators=(",", ":")).encode()
+
+
+def _current(rows: List[Product], field: ModelField) -> bytes:
+    return ProductOutList.dump_json(ProductOutList.validate_python(rows, from_attributes=True))
+
+
+def _time(fn, rows: List[Product], field: ModelField, repeat: int) -> float:
+    fn(rows, field)  # warm-up
+    started = time.perf_counter()
+    for _ in range(repeat):
+        fn(rows, field)
+    return (time.perf_counter() - started) / (repeat * len(rows))
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--rows", type=int, default=1000)
+    parser.add_argument("--repeat", type=int, default=50)
+    args = parser.parse_args()
+
+    rows = _rows(args.rows)
+    field = create_model_field(name="Response_list_products", type_=List[ProductOut], mode="serialization")
+    assert json.loads(_previous(rows, field)) == json.loads(_current(rows, field))
+
+    before = _time(_previous, rows, field, args.repeat)
+    after = _time(_current, rows, field, args.repeat)
+    print(f"{'path':<9} {'us/row':>8}")
+    print(f"{'previous':<9} {before * 1e6:>8.2f}")
+    print(f"{'current':<9} {after * 1e6:>8.2f}")
+    print(f"speedup: {before / after:.2f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,131 @@
+"""
+File: write_contention.py
+Description: Measure what change numbering costs concurrent product writes.
+Author: Jairo Céspedes
+Date: 2025-09-05
+
+Responsibilities:
+- Seed a migrated catalog, then run concurrent writer threads, each with
+  its own session, through ProductRepository on distinct random rows.
+- Run every workload twice: as shipped (ProductChangeRepository.allocate
+  reads the transaction id on PostgreSQL, bumps product_change_counter on
+  SQLite) and with allocation stubbed out, and report writes/second and
+  latency for both.
+
+Notes:
+- Usage (from backend/):
+    python -m benchmarks.write_contention --threads 16 --writes 4000
+    python -m benchmarks.write_contention --database-url postgresql+psycopg2://...
+- "rename" updates only the name, so on PostgreSQL the writers share no
+  lock at all. "stock" applies quantity deltas, which share the
+  product_stats row.
+- The stubbed run numbers every write 0: it is the no-numbering ceiling,
+  not a working mode. SQLite allows one writer at a time, so there the
+  counter adds a statement but no new serialization.
+"""
+
+import argparse
+import os
+import random
+import statistics
+import tempfile
+import threading
+import time
+from typing import Dict, List
+from unittest import mock
+
+os.environ.setdefault("DATABASE_URL", "sqlite://")
+os.environ.setdefault("JWT_SECRET", "benchmark")
+
+from sqlalchemy import create_engine, insert, text
+from sqlalchemy.orm import sessionmaker
+
+from app.core.search import normalize_search
+from app.db.base import Base
+from app.db.init_db import run_migrations
+from app.models.product import Product
+from app.repositories.product_change_repo import ProductChangeRepository
+from app.repositories.product_repo import ProductRepository
+from app.schemas.product import ProductUpdate
+
+_WORKLOADS = ("rename", "stock")
+
+
+def _seed(url: str, rows: int, threads: int) -> sessionmaker:
+    # SQLite writers queue on the database lock; wait instead of failing
+    connect_args = {"timeout": 60} if url.startswith("sqlite") else {}
+    engine = create_engine(url, pool_size=threads, max_overflow=0, connect_args=connect_args)
+    with engine.begin() as conn:
+        Base.metadata.drop_all(conn)
+        conn.execute(text("DROP TABLE IF EXISTS alembic_version"))
+    run_migrations(engine)
+    with engine.begin() as conn:
+        conn.execute(insert(Product), [
+            {"name": f"Product {i}", "name_search": normalize_search(f"Product {i}"),
+             "price": 1 + i % 50, "quantity": 1000000, "change_seq": i}
+            for i in range(1, rows + 1)
+        ])
+    return sessionmaker(bind=engine, autoflush=False)
+
+
+def _run(sessions: sessionmaker, workload: str, threads: int, writes: int, rows: int) -> Dict[str, float]:
+    latencies: List[float] = []
+    lock = threading.Lock()
+    per_thread = writes // threads
+    # Disjoint row ranges: contention comes from shared rows, not the products
+    span = rows // threads
+
+    def worker(n: int) -> None:
+        mine: List[float] = []
+        rng = random.Random(n)
+        with sessions() as db:
+            repo = ProductRepository(db)
+            for i in range(per_thread):
+                pid = n * span + rng.randint(1, span)
+                started = time.perf_counter()
+                if workload == "rename":
+                    repo.update(pid, ProductUpdate(name=f"Product {pid} r{i}"))
+                else:
+                    repo.adjust_quantity(pid, -1)
+                mine.append(time.perf_counter() - started)
+        with lock:
+            latencies.extend(mine)
+
+    pool = [threading.Thread(target=worker, args=(n,)) for n in range(threads)]
+    started = time.perf_counter()
+    for t in pool:
+        t.start()
+    for t in pool:
+        t.join()
+    elapsed = time.perf_counter() - started
+    latencies.sort()
+    return {
+        "writes_per_s": len(latencies) / elapsed,
+        "p50_ms": statistics.median(latencies) * 1000,
+        "p99_ms": latencies[int(len(latencies) * 0.99) - 1] * 1000,
+    }
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--database-url", help="sync SQLAlchemy URL, wiped (default: temporary SQLite file)")
+    parser.add_argument("--rows", type=int, default=10000)
+    parser.add_argument("--threads", type=int, default=16)
+    parser.add_argument("--writes", type=int, default=4000, help="total writes per run")
+    args = parser.parse_args()
+
+    url = args.database_url or f"sqlite:///{tempfile.mkdtemp()}/contention.db"
+    sessions = _seed(url, args.rows, args.threads)
+    print(f"{'workload':<8} {'numbers':<8} {'writes/s':>10} {'p50 ms':>8} {'p99 ms':>8}")
+    for workload in _WORKLOADS:
+        for label in ("on", "stubbed"):
+            if label == "on":
+                r = _run(sessions, workload, args.threads, args.writes, args.rows)
+            else:
+                with mock.patch.object(ProductChangeRepository, "allocate", lambda self: 0):
+                    r = _run(sessions, workload, args.threads, args.writes, args.rows)
+            print(f"{workload:<8} {label:<8} {r['writes_per_s']:>10.0f} {r['p50_ms']:>8.2f} {r['p99_ms']:>8.2f}")
+
+
+if __name__ == "__main__":
+    main()
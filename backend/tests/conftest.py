@@ -22,7 +22,9 @@ sys.path.insert(0, str(ROOT))
 # Import the FastAPI app and deps AFTER sys.path fix
 from app.main import app
 from app.db.base import Base
-from app.deps import get_db
+from app.deps import get_db, get_sessionmaker
+from app.db.statements import instrument_statements
+from app.services.product_service import list_cache
 
 # IMPORTANT: import models so Base.metadata knows about tables
 from app.models import user as user_model  # noqa: F401
@@ -41,6 +43,9 @@ engine = create_engine(
     poolclass=StaticPool,  # <-- key change
 )
 
+# Same statement hooks as the app engines, so tests can assert query budgets
+instrument_statements(engine, "sync")
+
 TestingSessionLocal = sessionmaker(bind=engine, autoflush=False, autocommit=False)
 
 @pytest.fixture(autouse=True)
@@ -48,7 +53,15 @@ def clean_db():
     # Use a single transaction to clear tables in the right order
     with engine.begin() as conn:
         conn.execute(text("DELETE FROM products"))
+        conn.execute(text(
+            "UPDATE product_stats SET sku_count = 0, total_units = 0, stock_value = 0, "
+            "out_of_stock = 0, low_stock = 0"
+        ))
+        conn.execute(text("DELETE FROM product_tombstones"))
+        conn.execute(text("UPDATE product_change_counter SET value = 0, purged_through = 0"))
         conn.execute(text("DELETE FROM users"))
+    # Raw deletes bypass the service, so drop cached list results too
+    list_cache.invalidate()
 
 @pytest.fixture(scope="session", autouse=True)
 def create_test_db_schema():
@@ -74,9 +87,8 @@ def _override_get_db():
     finally:
         session.close()
 
-# Disable startup init_db(): avoid touching the real DB
-app.router.on_startup = []
 app.dependency_overrides[get_db] = _override_get_db
+app.dependency_overrides[get_sessionmaker] = lambda: TestingSessionLocal
 
 @pytest.fixture()
 def client() -> TestClient:
@@ -0,0 +1,82 @@
+import logging
+
+import pytest
+from fastapi.testclient import TestClient
+from sqlalchemy import create_engine
+from sqlalchemy.ext.asyncio import async_sessionmaker, create_async_engine
+from sqlalchemy.pool import NullPool
+
+from app.core.coalesce import WriteCoalescer
+from app.core.config import settings
+from app.db.base import Base
+from app.db.session import async_database_url
+from app.db.statements import instrument_statements
+from app.deps import async_read_runner, async_runner, get_async_db, get_read_runner, get_runner, get_sessionmaker
+from app.main import app
+
+
+@pytest.fixture()
+def async_client(tmp_path):
+    """TestClient whose routes run on an aiosqlite AsyncSession."""
+    url = f"sqlite:///{tmp_path / 'async.db'}"
+    Base.metadata.create_all(create_engine(url))
+    # NullPool: aiosqlite connections must not outlive the TestClient loop
+    engine = create_async_engine(async_database_url(url), poolclass=NullPool)
+    instrument_statements(engine.sync_engine, "async")
+    sessions = async_sessionmaker(bind=engine, autoflush=False)
+
+    async def _override_get_async_db():
+        async with sessions() as db:
+            yield db
+
+    app.dependency_overrides[get_async_db] = _override_get_async_db
+    app.dependency_overrides[get_runner] = async_runner
+    app.dependency_overrides[get_read_runner] = async_read_runner
+    # conftest points it at the sync test database; restore that afterwards
+    previous_sessionmaker = app.dependency_overrides.get(get_sessionmaker)
+    app.dependency_overrides[get_sessionmaker] = lambda: sessions
+    try:
+        with TestClient(app) as c:
+            yield c
+    finally:
+        del app.dependency_overrides[get_async_db]
+        del app.dependency_overrides[get_runner]
+        del app.dependency_overrides[get_read_runner]
+        app.dependency_overrides[get_sessionmaker] = previous_sessionmaker
+
+
+def test_async_url_swaps_driver():
+    assert async_database_url("postgresql+psycopg2://u:p@db:5432/inv") == "postgresql+asyncpg://u:p@db:5432/inv"
+    assert async_database_url("sqlite:///./x.db") == "sqlite+aiosqlite:///./x.db"
+
+
+def test_async_path_auth_and_crud(async_client, monkeypatch):
+    c = async_client
+    assert c.post("/auth/register", json={"email": "a@example.com", "password": "pw", "role": "admin"}).status_code == 201
+    assert c.post("/auth/register", json={"email": "a@example.com", "password": "pw"}).status_code == 400
+    token = c.post("/auth/login", json={"email": "a@example.com", "password": "pw"}).json()["access_token"]
+    h = {"Authorization": f"Bearer {token}"}
+
+    pid = c.post("/products/", headers=h, json={"name": "Kettle", "price": 20, "quantity": 2}).json()["id"]
+    assert c.put(f"/products/{pid}", headers=h, json={"quantity": 7}).json()["quantity"] == 7
+    assert [p["name"] for p in c.get("/products?q=kett", headers=h).json()] == ["Kettle"]
+    # Coalesced stock deltas flush on an AsyncSession of their own
+    monkeypatch.setattr("app.api.products.stock_coalescer", WriteCoalescer(0.01))
+    assert c.post(f"/products/{pid}/stock", headers=h, json={"delta": 3}).json()["quantity"] == 10
+    assert c.delete(f"/products/{pid}", headers=h).status_code == 204
+    assert c.get(f"/products/{pid}", headers=h).status_code == 404
+
+
+def test_async_path_slow_query_log_with_plan(async_client, monkeypatch, caplog):
+    c = async_client
+    c.post("/auth/register", json={"email": "s@example.com", "password": "pw", "role": "admin"})
+    token = c.post("/auth/login", json={"email": "s@example.com", "password": "pw"}).json()["access_token"]
+    h = {"Authorization": f"Bearer {token}"}
+
+    monkeypatch.setattr(settings, "SLOW_QUERY_MS", 1e-6)
+    with caplog.at_level(logging.WARNING, logger="app.db.slow_query"):
+        r = c.get("/products?q=kettle&limit=5", headers=h)
+    assert r.status_code == 200
+    plans = [rec.getMessage().split("plan=")[1] for rec in caplog.records if "FROM products" in rec.getMessage()]
+    # EXPLAIN ran through the adapted aiosqlite connection
+    assert plans and "products" in plans[0]
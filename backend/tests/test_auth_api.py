@@ -14,4 +14,55 @@ def test_register_and_login_flow(client):
     assert r2.status_code == 200, r2.text
     token_payload = r2.json()
     assert "access_token" in token_payload
-    assert token_payload["token_type"] == "bearer"
\ No newline at end of file
+    assert token_payload["token_type"] == "bearer"
+
+def test_login_upgrades_hash_made_with_old_cost(client, db_session):
+    from passlib.context import CryptContext
+    from app.models.user import User
+
+    old = CryptContext(schemes=["bcrypt"], bcrypt__rounds=4).hash("StrongP@ss")
+    db_session.add(User(email="old@example.com", password_hash=old, role="user"))
+    db_session.commit()
+
+    r = client.post("/auth/login", json={"email": "old@example.com", "password": "StrongP@ss"})
+    assert r.status_code == 200, r.text
+    db_session.expire_all()
+    upgraded = db_session.query(User).filter(User.email == "old@example.com").one().password_hash
+    assert upgraded != old and upgraded.startswith("$2b$12$")
+
+    r = client.post("/auth/login", json={"email": "old@example.com", "password": "StrongP@ss"})
+    assert r.status_code == 200, r.text
+
+
+def test_saturated_hash_pool_answers_503(client, monkeypatch):
+    import asyncio
+    from app.core.hashing import PasswordHasher, PoolBusy
+    from app.services import user_service
+
+    hasher = PasswordHasher(workers=1, max_pending=1)
+    try:
+        async def burst():
+            return await asyncio.gather(*(hasher.hash("pw") for _ in range(3)), return_exceptions=True)
+
+        results = asyncio.run(burst())
+        assert sum(isinstance(r, PoolBusy) for r in results) == 2
+        assert hasher.stats()["rejected"] == 2
+
+        monkeypatch.setattr(user_service, "password_hasher", PasswordHasher(workers=1, max_pending=0))
+        r = client.post("/auth/register", json={"email": "busy@example.com", "password": "StrongP@ss"})
+        assert r.status_code == 503
+        assert r.headers["Retry-After"] == "1"
+    finally:
+        hasher.shutdown()
+
+
+def test_bcrypt_pool_shut_down_with_the_app():
+    from fastapi.testclient import TestClient
+    from app.core.hashing import password_hasher
+    from app.main import app
+
+    with TestClient(app) as c:
+        r = c.post("/auth/register", json={"email": "pool@example.com", "password": "StrongP@ss"})
+        assert r.status_code == 201, r.text
+        assert password_hasher._pool is not None
+    assert password_hasher._pool is None
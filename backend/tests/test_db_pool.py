@@ -0,0 +1,49 @@
+import pytest
+from sqlalchemy import create_engine, exc, text
+
+from app.core.config import settings
+from app.db.pool import PoolMetrics, engine_options, instrument
+
+
+def test_pool_metrics_count_checkouts_waits_and_timeouts(tmp_path, monkeypatch):
+    monkeypatch.setattr(settings, "DB_POOL_SIZE", 1)
+    monkeypatch.setattr(settings, "DB_MAX_OVERFLOW", 0)
+    monkeypatch.setattr(settings, "DB_POOL_TIMEOUT", 0.05)
+    monkeypatch.setattr(settings, "DB_PRE_PING", "idle")
+    monkeypatch.setattr(settings, "DB_PRE_PING_IDLE_SECONDS", 0)
+
+    url = f"sqlite:///{tmp_path / 'pool.db'}"
+    metrics = PoolMetrics("test")
+    engine = create_engine(url, **engine_options(url, metrics))
+    instrument(engine, metrics)
+    try:
+        with engine.connect() as conn:
+            conn.execute(text("SELECT 1"))
+            assert metrics.checked_out == 1
+            # Single connection in use: the next checkout times out
+            with pytest.raises(exc.TimeoutError):
+                engine.connect()
+        with engine.connect() as conn:  # reused after sitting idle: pinged first
+            conn.execute(text("SELECT 1"))
+    finally:
+        engine.dispose()
+
+    stats = metrics.stats()
+    assert stats["checked_out"] == 0
+    assert stats["checkouts"] == 2
+    assert stats["connects"] == 1
+    assert stats["timeouts"] == 1
+    assert stats["idle_pings"] == 1
+    assert stats["wait_seconds"]["count"] == 2
+    assert stats["wait_seconds"]["buckets"]["+Inf"] == 2
+
+
+def test_engine_options_statement_timeout_per_driver(monkeypatch):
+    monkeypatch.setattr(settings, "DB_STATEMENT_TIMEOUT_MS", 1500)
+    metrics = PoolMetrics("test")
+    sync = engine_options("postgresql+psycopg2://u@h/db", metrics)
+    assert sync["connect_args"] == {"options": "-c statement_timeout=1500"}
+    assert sync["pool_size"] == settings.DB_POOL_SIZE
+    asyncpg = engine_options("postgresql+asyncpg://u@h/db", metrics, is_async=True)
+    assert asyncpg["connect_args"] == {"server_settings": {"statement_timeout": "1500"}}
+    assert "pool_size" not in engine_options("sqlite://", metrics)
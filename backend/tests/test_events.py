@@ -0,0 +1,133 @@
+import asyncio
+import json
+
+import pytest
+
+from app.core.events import ChangeBroadcaster, TooManySubscribers, event_stream
+from app.core.pagination import decode_sync_token
+from app.services.product_service import change_events
+
+
+def _auth_header(token: str):
+    return {"Authorization": f"Bearer {token}"}
+
+
+def _parse(frame: str):
+    fields = dict(line.split(": ", 1) for line in frame.strip().splitlines())
+    return fields.get("id"), fields["event"], json.loads(fields["data"])
+
+
+def test_broadcaster_fan_out_resync_and_heartbeat():
+    async def scenario():
+        hub = ChangeBroadcaster(queue_size=2, max_subscribers=2)
+        assert not hub.active
+        hub.publish("created", {"id": 1})  # no subscribers: dropped, nothing encoded
+        fast, slow = hub.subscribe(), hub.subscribe()
+        assert hub.full
+        with pytest.raises(TooManySubscribers):
+            hub.subscribe()
+
+        hub.publish("created", {"id": 1}, "t1")
+        assert _parse(await fast.queue.get()) == ("t1", "created", {"id": 1})
+
+        # The slow subscriber never reads: its backlog collapses into one resync
+        for pid in (2, 3):
+            hub.publish("updated", {"id": pid})
+        assert [_parse(await fast.queue.get())[2]["id"] for _ in range(2)] == [2, 3]
+        assert slow.queue.qsize() == 1 and slow.resyncs == 1
+        assert _parse(slow.queue.get_nowait())[1] == "resync"
+        assert hub.stats() == {"subscribers": 2, "queued": 0, "published": 3, "resyncs": 1}
+
+        hub.unsubscribe(fast)
+        stream = event_stream(hub, heartbeat_seconds=0.01)
+        assert hub.stats()["subscribers"] == 1  # not subscribed until iterated
+        assert (await anext(stream)).startswith("retry: ")
+        assert hub.stats()["subscribers"] == 2
+        assert await anext(stream) == ": heartbeat\n\n"
+        await stream.aclose()
+        assert hub.stats()["subscribers"] == 1
+
+        # A response closed before streaming never takes a slot
+        await event_stream(hub, heartbeat_seconds=0.01).aclose()
+        assert hub.stats()["subscribers"] == 1
+
+    asyncio.run(scenario())
+
+
+def test_service_writes_publish_events(client, admin_token):
+    headers = _auth_header(admin_token)
+
+    async def scenario():
+        subscription = change_events.subscribe()
+        try:
+            # The app runs in TestClient's own loop and threadpool, so events
+            # cross threads exactly as with the sync DB path
+            r = await asyncio.to_thread(
+                client.post, "/products/", headers=headers, json={"name": "Lamp", "price": 5, "quantity": 2}
+            )
+            assert r.status_code == 201, r.text
+            pid = r.json()["id"]
+            await asyncio.to_thread(client.put, f"/products/{pid}", headers=headers, json={"quantity": 7})
+            await asyncio.to_thread(client.delete, f"/products/{pid}", headers=headers)
+            return pid, [_parse(await asyncio.wait_for(subscription.queue.get(), 5)) for _ in range(3)]
+        finally:
+            change_events.unsubscribe(subscription)
+
+    pid, events = asyncio.run(scenario())
+    assert [e[1] for e in events] == ["created", "updated", "deleted"]
+    assert events[0][2]["product"]["name"] == "Lamp"
+    assert events[1][2]["product"]["quantity"] == 7
+    assert events[2][2] == {"id": pid}
+    seqs = [decode_sync_token(e[0]) for e in events]
+    assert seqs == sorted(seqs)
+
+    # Each event id is a sync token: nothing is left after the last one
+    r = client.get("/products/changes", params={"since": events[-1][0]}, headers=headers)
+    assert r.json()["items"] == [] and r.json()["deleted"] == []
+
+
+def test_events_route_auth_and_subscriber_cap(client, user_token, admin_token, monkeypatch):
+    from app.core.config import settings
+
+    assert client.get("/products/events").status_code == 422
+    assert client.get("/products/events", params={"token": "garbage"}).status_code == 401
+    # An API token is not a stream token, and a stream token is not an API token
+    assert client.get("/products/events", params={"token": user_token}).status_code == 401
+    assert client.post("/products/events/token").status_code == 401
+    r = client.post("/products/events/token", headers=_auth_header(user_token))
+    assert r.status_code == 200 and r.json()["expires_in"] == settings.EVENTS_TOKEN_SECONDS
+    stream_token = r.json()["token"]
+    assert client.get("/products/", headers=_auth_header(stream_token)).status_code == 401
+
+    monkeypatch.setattr(change_events, "max_subscribers", 0)
+    r = client.get("/products/events", params={"token": stream_token})
+    assert r.status_code == 503
+    assert r.headers["Retry-After"]
+
+    assert client.get("/products/events/stats", headers=_auth_header(user_token)).status_code == 403
+    r = client.get("/products/events/stats", headers=_auth_header(admin_token))
+    assert r.status_code == 200 and r.json()["subscribers"] == 0
+
+
+def test_events_stream_with_stream_token(client, user_token):
+    from app.api.products import product_events
+    from app.deps import get_stream_identity
+
+    token = client.post("/products/events/token", headers=_auth_header(user_token)).json()["token"]
+
+    async def first_frame():
+        # Infinite body: drive the route directly instead of through a transport
+        identity = await get_stream_identity(token)
+        response = await product_events(identity)
+        assert response.media_type == "text/event-stream"
+        assert change_events.stats()["subscribers"] == 0  # subscribed on first read
+        frames = response.body_iterator
+        first = await frames.__anext__()
+        assert change_events.stats()["subscribers"] == 1
+        await frames.aclose()
+        return first
+
+    first = asyncio.run(first_frame())
+    assert first.startswith("retry: ")
+    # Closing the stream released its slot
+    assert change_events.stats()["subscribers"] == 0
@@ -0,0 +1,46 @@
+from app.core.metrics import HTTP_LATENCY, HTTP_REQUESTS, Histogram
+
+
+def test_histogram_renders_cumulative_buckets():
+    h = Histogram("demo_seconds", "Demo.", ("route",), buckets=(0.1, 1.0))
+    for value in (0.05, 0.5, 0.7, 3.0):
+        h.observe(("/x",), value)
+    lines = h.render()
+    assert 'demo_seconds_bucket{route="/x",le="0.1"} 1' in lines
+    assert 'demo_seconds_bucket{route="/x",le="1.0"} 3' in lines
+    assert 'demo_seconds_bucket{route="/x",le="+Inf"} 4' in lines
+    assert 'demo_seconds_count{route="/x"} 4' in lines
+
+
+def test_metrics_endpoint_labels_by_route_template(client, user_token):
+    labels = ("GET", "/products/{product_id}", "404")
+    before = HTTP_REQUESTS.value(labels)
+    r = client.get("/products/123456", headers={"Authorization": f"Bearer {user_token}"})
+    assert r.status_code == 404
+    assert HTTP_REQUESTS.value(labels) == before + 1
+    assert HTTP_LATENCY.count(labels) >= 1
+
+    r = client.get("/metrics")
+    assert r.status_code == 200
+    assert r.headers["content-type"].startswith("text/plain; version=0.0.4")
+    body = r.text
+    assert 'http_requests_total{method="GET",route="/products/{product_id}",status="404"}' in body
+    assert "# TYPE http_request_duration_seconds histogram" in body
+    assert "http_requests_in_flight" in body
+    assert 'db_pool_checked_out{engine="sync"}' in body
+
+
+def test_statement_timings_by_engine_and_verb():
+    from sqlalchemy import create_engine, text
+    from app.core.metrics import DB_STATEMENTS
+    from app.db.statements import instrument_statements
+
+    engine = create_engine("sqlite://")
+    instrument_statements(engine, "test")
+    with engine.begin() as conn:
+        conn.execute(text("CREATE TABLE t (x INTEGER)"))
+        conn.execute(text("INSERT INTO t VALUES (:x)"), [{"x": 1}, {"x": 2}])
+        assert conn.execute(text("  select count(*) from t")).scalar() == 2
+    assert DB_STATEMENTS.count(("test", "CREATE")) == 1
+    assert DB_STATEMENTS.count(("test", "INSERT")) == 1
+    assert DB_STATEMENTS.count(("test", "SELECT")) == 1
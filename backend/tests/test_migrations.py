@@ -0,0 +1,73 @@
+from alembic import command
+from sqlalchemy import create_engine, inspect, text
+
+from app.db.base import Base
+from app.db.init_db import alembic_config, run_migrations
+
+
+def _schema(engine):
+    insp = inspect(engine)
+    return {
+        t: ({c["name"] for c in insp.get_columns(t)}, {i["name"] for i in insp.get_indexes(t)})
+        for t in ("users", "products", "product_stats", "product_tombstones", "product_change_counter")
+    }
+
+
+def test_migrations_match_model_metadata(tmp_path):
+    migrated = create_engine(f"sqlite:///{tmp_path / 'migrated.db'}")
+    run_migrations(migrated)
+    run_migrations(migrated)  # no-op at head
+
+    declared = create_engine(f"sqlite:///{tmp_path / 'declared.db'}")
+    Base.metadata.create_all(declared)
+
+    assert _schema(migrated) == _schema(declared)
+    assert "ix_products_with_image_name_id" in _schema(migrated)["products"][1]
+
+
+def test_migrations_downgrade_to_base(tmp_path):
+    engine = create_engine(f"sqlite:///{tmp_path / 'roundtrip.db'}")
+    run_migrations(engine)
+    with engine.connect() as conn:
+        command.downgrade(alembic_config(conn), "base")
+        conn.commit()
+    assert set(inspect(engine).get_table_names()) == {"alembic_version"}
+
+
+def test_change_seq_existing_rows_start_at_zero(tmp_path):
+    engine = create_engine(f"sqlite:///{tmp_path / 'backfill.db'}")
+    run_migrations(engine, "0005")
+    with engine.begin() as conn:
+        for name in ("a", "b", "c"):
+            conn.execute(text("INSERT INTO products (name, name_search, price, quantity) VALUES (:n, :n, 1, 1)"),
+                         {"n": name})
+    run_migrations(engine)
+    # No backfill: a first sync pages them by (change_seq, id)
+    with engine.connect() as conn:
+        assert conn.execute(text("SELECT id, change_seq FROM products ORDER BY id")).all() == [(1, 0), (2, 0), (3, 0)]
+        assert conn.execute(text("SELECT value FROM product_change_counter")).scalar_one() == 0
+
+
+def test_product_stats_seeded_from_existing_rows(tmp_path):
+    engine = create_engine(f"sqlite:///{tmp_path / 'stats.db'}")
+    run_migrations(engine, "0003")
+    with engine.begin() as conn:
+        for name, qty in (("a", 0), ("b", 2), ("c", 50)):
+            conn.execute(text("INSERT INTO products (name, name_search, price, quantity) VALUES (:n, :n, 3, :q)"),
+                         {"n": name, "q": qty})
+    run_migrations(engine, "0004")
+    with engine.connect() as conn:
+        row = conn.execute(text("SELECT sku_count, total_units, out_of_stock, low_stock FROM product_stats")).one()
+    assert tuple(row) == (3, 52, 1, 1)
+
+
+def test_name_search_backfilled_in_batches(tmp_path):
+    engine = create_engine(f"sqlite:///{tmp_path / 'search.db'}")
+    run_migrations(engine, "0001")
+    names = [f"Café {i}" for i in range(5003)]  # more than one backfill batch
+    with engine.begin() as conn:
+        conn.execute(text("INSERT INTO products (name, price, quantity) VALUES (:n, 1, 1)"), [{"n": n} for n in names])
+    run_migrations(engine, "0002")
+    with engine.connect() as conn:
+        rows = conn.execute(text("SELECT name_search FROM products ORDER BY id")).scalars().all()
+    assert rows[0] == "cafe 0" and rows[-1] == "cafe 5002" and "" not in rows
@@ -34,4 +34,95 @@ def test_repo_list_search_filter_sort(db_session):
     # Sort by price desc -> first is Lamp (9.9)
     items = repo.list(sort_by="price", sort_dir="desc")
     assert items[0].name == "Lamp"
-    assert items[0].price >= items[-1].price
\ No newline at end of file
+    assert items[0].price >= items[-1].price
+def test_repo_keyset_pagination_with_ties(db_session):
+    # Duplicate prices force the id tiebreaker to decide the order
+    for i, price in enumerate([2.0, 1.0, 2.0, 1.0, 2.0]):
+        db_session.add(Product(name=f"Item{i}", description="", price=price, quantity=i, image_url=""))
+    db_session.commit()
+    repo = ProductRepository(db_session)
+
+    full = [p.id for p in repo.list(sort_by="price", sort_dir="desc")]
+    seen, after = [], None
+    while True:
+        page = repo.list(sort_by="price", sort_dir="desc", limit=2, after=after)
+        if not page:
+            break
+        seen.extend(p.id for p in page)
+        after = (page[-1].price, page[-1].id)
+    assert seen == full
+
+def test_repo_search_is_accent_insensitive_and_ranked(db_session):
+    for name in ["Crème brûlée", "Cream Soda", "Ice CREAM", "Creamer", "Cream", "50% off"]:
+        db_session.add(Product(name=name, description="", price=1, quantity=1, image_url=""))
+    db_session.commit()
+    repo = ProductRepository(db_session)
+
+    assert [p.name for p in repo.list(q="CREME")] == ["Crème brûlée"]
+    assert [p.name for p in repo.list(q="brulee")] == ["Crème brûlée"]
+
+    # Exact, then prefix (shortest first), then word prefix
+    ranked = [p.name for p in repo.list(q="cream", sort_by="relevance")]
+    assert ranked == ["Cream", "Creamer", "Cream Soda", "Ice CREAM"]
+
+    # LIKE wildcards in the query match literally
+    assert [p.name for p in repo.list(q="%")] == ["50% off"]
+
+
+def test_repo_writes_are_single_statements(db_session):
+    from decimal import Decimal
+    from sqlalchemy import event
+    from app.schemas.product import ProductCreate, ProductUpdate
+
+    statements = []
+    engine = db_session.get_bind()
+    tables = ("product_change_counter", "product_tombstones", "product_stats")
+    listener = lambda conn, cursor, stmt, *args: statements.append(
+        (stmt.split()[0].upper(), next((t for t in tables if t in stmt), "products")))
+    event.listen(engine, "before_cursor_execute", listener)
+    try:
+        repo = ProductRepository(db_session)
+        created = repo.create(ProductCreate(name="Lamp", price=Decimal("5.00"), quantity=1))
+        updated = repo.update(created.id, ProductUpdate(name="Desk Lamp"))
+        assert updated.name == "Desk Lamp" and updated.name_search == "desk lamp"
+        assert updated.updated_at is not None
+        assert repo.update(created.id + 1000, ProductUpdate(quantity=3)) is None
+        assert repo.delete(created.id) is True
+        assert repo.delete(created.id) is False
+    finally:
+        event.remove(engine, "before_cursor_execute", listener)
+    # One statement per product write after taking a change number, plus the
+    # stats delta when stock changes and the tombstone on delete.
+    # A stock update reads the old values first on SQLite (one statement on
+    # PostgreSQL); here the row is missing, so nothing is updated.
+    assert statements == [
+        ("UPDATE", "product_change_counter"), ("INSERT", "products"), ("UPDATE", "product_stats"),
+        ("UPDATE", "product_change_counter"), ("UPDATE", "products"),
+        ("UPDATE", "product_change_counter"), ("SELECT", "products"),
+        ("UPDATE", "product_change_counter"), ("DELETE", "products"), ("UPDATE", "product_stats"),
+        ("INSERT", "product_tombstones"),
+        ("UPDATE", "product_change_counter"), ("DELETE", "products"),
+    ]
+
+
+def test_repo_stock_update_returns_old_values_in_one_statement_on_postgres():
+    from sqlalchemy.dialects import postgresql
+    from app.models.product import Product
+    from app.repositories.product_repo import _update_returning_old
+
+    sql = str(_update_returning_old([Product.id == 1], {"price": 5}).compile(dialect=postgresql.dialect()))
+    assert sql.startswith('WITH "old" AS') and "FOR UPDATE" in sql
+    assert 'FROM "old" WHERE products.id = "old".id' in sql
+    assert sql.endswith('"old".old_price, "old".old_quantity')
+
+
+def test_change_numbers_are_transaction_ids_on_postgres():
+    from types import SimpleNamespace
+    from sqlalchemy import select
+    from sqlalchemy.dialects import postgresql
+    from app.repositories.product_change_repo import ProductChangeRepository
+
+    dialect = postgresql.dialect()
+    session = SimpleNamespace(get_bind=lambda: SimpleNamespace(dialect=dialect))
+    sql = str(select(ProductChangeRepository(session)._watermark()).compile(dialect=dialect))
+    assert "pg_snapshot_xmin(pg_current_snapshot())" in sql and "product_change_counter" not in sql
@@ -88,4 +88,566 @@ def test_products_permissions_user_cannot_write(client, user_token):
 
     # user cannot delete
     r = client.delete("/products/9999", headers=_auth_header(user_token))
-    assert r.status_code == 403
\ No newline at end of file
+    assert r.status_code == 403
+def test_products_list_cursor_pagination(client, admin_token):
+    for i in range(7):
+        r = client.post("/products/", headers=_auth_header(admin_token), json={
+            "name": f"Widget {i}", "description": "", "price": 1.0 + (i % 3), "quantity": i, "image_url": ""})
+        assert r.status_code == 201
+
+    full = client.get("/products?sort_by=price&min_qty=1", headers=_auth_header(admin_token)).json()
+    assert len(full) == 6
+
+    names, cursor = [], None
+    while True:
+        params = {"sort_by": "price", "min_qty": 1, "limit": 4}
+        if cursor:
+            params["cursor"] = cursor
+        r = client.get("/products", params=params, headers=_auth_header(admin_token))
+        assert r.status_code == 200
+        names.extend(p["name"] for p in r.json())
+        cursor = r.headers.get("X-Next-Cursor")
+        if not cursor:
+            break
+    assert names == [p["name"] for p in full]
+
+    # A cursor issued for one sort cannot be replayed against another
+    r = client.get("/products?sort_by=price&limit=2", headers=_auth_header(admin_token))
+    r = client.get("/products", params={"sort_by": "name", "cursor": r.headers["X-Next-Cursor"]},
+                   headers=_auth_header(admin_token))
+    assert r.status_code == 400
+
+def test_products_cursor_pagination_every_sort(client, admin_token):
+    h = _auth_header(admin_token)
+    # Created within the same second: updated_at ties are broken by id only
+    for i in range(16):
+        r = client.post("/products/", headers=h, json={
+            "name": f"Item {i % 5}", "price": 1 + i % 4, "quantity": i % 3})
+        assert r.status_code == 201
+
+    for sort_by in ("name", "price", "quantity", "updated_at"):
+        for sort_dir in ("asc", "desc"):
+            params = {"sort_by": sort_by, "sort_dir": sort_dir}
+            full = [p["id"] for p in client.get("/products", params=params, headers=h).json()]
+            assert len(full) == 16
+            ids, cursor = [], None
+            for _ in range(10):
+                r = client.get("/products", params={**params, "limit": 3, **({"cursor": cursor} if cursor else {})},
+                               headers=h)
+                assert r.status_code == 200
+                ids.extend(p["id"] for p in r.json())
+                cursor = r.headers.get("X-Next-Cursor")
+                if not cursor:
+                    break
+            assert ids == full, (sort_by, sort_dir)
+
+def test_products_list_default_page_size(client, admin_token):
+    h = _auth_header(admin_token)
+    body = "name,price,quantity\n" + "".join(f"Bolt {i:03d},1,1\n" for i in range(105))
+    r = client.post("/products/import", headers={**h, "Content-Type": "text/csv"}, content=body)
+    assert r.json()["inserted"] == 105
+
+    # No limit: one bounded page and a cursor to the rest
+    r = client.get("/products", headers=h)
+    assert len(r.json()) == 100
+    r = client.get("/products", params={"cursor": r.headers["X-Next-Cursor"]}, headers=h)
+    assert [p["name"] for p in r.json()] == [f"Bolt {i}" for i in range(100, 105)]
+    assert "X-Next-Cursor" not in r.headers
+
+def test_products_export_ndjson_and_csv(client, admin_token):
+    import csv, io, json
+
+    for name, price in [("Cable", 4.0), ("Adapter", 9.5), ("Charger", 15.0)]:
+        r = client.post("/products/", headers=_auth_header(admin_token), json={
+            "name": name, "description": "", "price": price, "quantity": 3, "image_url": ""})
+        assert r.status_code == 201
+
+    r = client.get("/products/export?min_price=5", headers=_auth_header(admin_token))
+    assert r.status_code == 200
+    assert r.headers["content-type"].startswith("application/x-ndjson")
+    rows = [json.loads(line) for line in r.text.splitlines()]
+    assert [row["name"] for row in rows] == ["Adapter", "Charger"]
+    listed = client.get("/products?min_price=5", headers=_auth_header(admin_token)).json()
+    assert rows == listed
+
+    r = client.get("/products/export?format=csv&sort_by=price&sort_dir=desc", headers=_auth_header(admin_token))
+    assert r.status_code == 200
+    assert r.headers["content-type"].startswith("text/csv")
+    rows = list(csv.DictReader(io.StringIO(r.text)))
+    assert [row["name"] for row in rows] == ["Charger", "Adapter", "Cable"]
+    assert rows[0]["price"] == "15.00"
+
+def test_products_batch_atomic_and_partial(client, admin_token, user_token):
+    h = _auth_header(admin_token)
+    ids = []
+    for name in ("Soap", "Towel"):
+        r = client.post("/products/", headers=h, json={
+            "name": name, "description": "", "price": 2.0, "quantity": 1, "image_url": ""})
+        ids.append(r.json()["id"])
+
+    ops = [
+        {"op": "create", "data": {"name": "Brush", "price": 3.5, "quantity": 4}},
+        {"op": "update", "id": ids[0], "data": {"price": 2.75}},
+        {"op": "delete", "id": ids[1]},
+        {"op": "delete", "id": 999999},
+    ]
+
+    # All-or-nothing: the missing id rolls back the whole batch
+    r = client.post("/products/batch", headers=h, json={"operations": ops})
+    assert r.status_code == 200, r.text
+    body = r.json()
+    assert body["committed"] is False and body["succeeded"] == 0
+    assert body["results"][3]["error"] == "Product not found"
+    assert len(client.get("/products", headers=h).json()) == 2
+
+    # Partial: valid items are applied, the missing id is reported
+    r = client.post("/products/batch", headers=h, json={"operations": ops, "atomic": False})
+    body = r.json()
+    assert body["committed"] is True
+    assert [i["ok"] for i in body["results"]] == [True, True, True, False]
+    new_id = body["results"][0]["id"]
+    assert client.get(f"/products/{new_id}", headers=h).json()["name"] == "Brush"
+    assert client.get(f"/products/{ids[0]}", headers=h).json()["price"] == "2.75"
+    assert client.get(f"/products/{ids[1]}", headers=h).status_code == 404
+
+    r = client.post("/products/batch", headers=_auth_header(user_token), json={"operations": ops})
+    assert r.status_code == 403
+
+def test_products_batch_partial_fails_only_bad_rows(client, admin_token):
+    h = _auth_header(admin_token)
+    ids = [client.post("/products/", headers=h, json={"name": n, "price": 1, "quantity": 1}).json()["id"]
+           for n in ("Cup", "Plate")]
+    ops = [
+        {"op": "update", "id": ids[0], "data": {"price": 9}},
+        {"op": "update", "id": ids[1], "data": {"name": None}},  # violates NOT NULL
+        {"op": "create", "data": {"name": "Bowl", "price": 2, "quantity": 1}},
+    ]
+    body = client.post("/products/batch", headers=h, json={"operations": ops, "atomic": False}).json()
+    assert body["committed"] is True
+    assert [i["ok"] for i in body["results"]] == [True, False, True]
+    assert "name" in body["results"][1]["error"] and body["results"][0]["error"] is None
+    assert client.get(f"/products/{ids[0]}", headers=h).json()["price"] == "9.00"
+    assert client.get(f"/products/{ids[1]}", headers=h).json()["name"] == "Plate"
+    assert client.get(f"/products/{body['results'][2]['id']}", headers=h).json()["name"] == "Bowl"
+
+def test_products_import_csv_and_ndjson(client, admin_token):
+    h = _auth_header(admin_token)
+    csv_body = (
+        "name,description,price,quantity,image_url\n"
+        "Hammer,Steel,12.00,10,\n"
+        ",Missing name,1.00,1,\n"
+        "Saw,,25.50,3,http://img/saw.png\n"
+        "Drill,,-4,2,\n"
+    )
+    r = client.post("/products/import", headers={**h, "Content-Type": "text/csv; charset=utf-8"},
+                    content=csv_body)
+    assert r.status_code == 200, r.text
+    report = r.json()
+    assert (report["received"], report["inserted"], report["failed"]) == (4, 2, 2)
+    assert [e["line"] for e in report["errors"]] == [2, 4]
+
+    ndjson_body = '{"name": "Pliers", "price": 8, "quantity": 4}\nnot json\n\n'
+    r = client.post("/products/import", headers={**h, "Content-Type": "application/octet-stream"},
+                    content=ndjson_body, params={"format": "ndjson"})
+    report = r.json()
+    assert (report["inserted"], report["failed"]) == (1, 1)
+
+    names = {p["name"] for p in client.get("/products", headers=h).json()}
+    assert names == {"Hammer", "Saw", "Pliers"}
+
+    r = client.post("/products/import", headers=h, files={"file": ("data.csv", "x", "text/csv")})
+    assert r.status_code == 415
+
+def test_products_import_invalidates_list_cache_per_chunk(db_session, monkeypatch):
+    import io
+    from app.services import product_service
+    from app.services.product_service import ProductService
+
+    calls = []
+    monkeypatch.setattr(product_service.list_cache, "invalidate", lambda: calls.append(1))
+    body = "name,price,quantity\n" + "".join(f"Nut {i},1,1\n" for i in range(5))
+    report = ProductService(db_session).import_rows(io.BytesIO(body.encode()), "csv", chunk_size=2)
+    assert report.inserted == 5
+    # Chunks of 2, 2 and 1 rows, each committed and invalidated on its own
+    assert len(calls) == 3
+
+def test_products_import_reads_body_incrementally(client, admin_token, monkeypatch):
+    import asyncio
+    import httpx
+    import json
+    from app.main import app
+    from app.services import product_service
+
+    h = _auth_header(admin_token)
+    parsed = []
+    real_iter = product_service._iter_import_rows
+
+    def counting_iter(stream, fmt):
+        for row in real_iter(stream, fmt):
+            parsed.append(row[0])
+            yield row
+
+    monkeypatch.setattr(product_service, "_iter_import_rows", counting_iter)
+    seen_at_chunk = []
+
+    async def body():
+        # 20 chunks of 200 rows, pulled one by one as the import reads
+        for chunk in range(20):
+            seen_at_chunk.append(len(parsed))
+            yield "".join(
+                json.dumps({"name": f"Bulk {chunk}-{i}", "price": 1, "quantity": i}) + "\n" for i in range(200)
+            ).encode()
+        yield b'{"name": "Split'
+        yield b' row", "price": 2, "quantity": 1}\n'
+
+    async def upload():
+        # ASGITransport hands the body over as it is produced (TestClient buffers it)
+        transport = httpx.ASGITransport(app=app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://test") as ac:
+            return await ac.post("/products/import", headers={**h, "Content-Type": "application/x-ndjson"},
+                                 content=body())
+
+    r = asyncio.run(upload())
+    assert r.status_code == 200, r.text
+    assert (r.json()["received"], r.json()["inserted"], r.json()["failed"]) == (4001, 4001, 0)
+    # Rows were parsed while later chunks were still unsent
+    assert seen_at_chunk[-1] >= 3000
+    r = client.get("/products", headers=h, params={"q": "Split row"})
+    assert [p["name"] for p in r.json()] == ["Split row"]
+
+def test_products_list_cache_invalidated_by_writes(client, admin_token):
+    h = _auth_header(admin_token)
+    client.post("/products/", headers=h, json={"name": "Rope", "price": 5, "quantity": 1})
+
+    before = client.get("/products/cache/stats", headers=h).json()
+    assert [p["name"] for p in client.get("/products", headers=h).json()] == ["Rope"]
+    assert [p["name"] for p in client.get("/products", headers=h).json()] == ["Rope"]
+    after = client.get("/products/cache/stats", headers=h).json()
+    assert after["hits"] > before["hits"]
+
+    # A write must be visible on the very next read
+    client.post("/products/", headers=h, json={"name": "Anchor", "price": 50, "quantity": 1})
+    assert [p["name"] for p in client.get("/products", headers=h).json()] == ["Anchor", "Rope"]
+
+def test_products_conditional_get_with_etag(client, admin_token, db_session):
+    from datetime import datetime, timedelta
+    from app.models.product import Product
+
+    h = _auth_header(admin_token)
+    pid = client.post("/products/", headers=h, json={"name": "Lens", "price": 40, "quantity": 2}).json()["id"]
+
+    r = client.get(f"/products/{pid}", headers=h)
+    etag = r.headers["ETag"]
+    r = client.get(f"/products/{pid}", headers={**h, "If-None-Match": etag})
+    assert r.status_code == 304 and r.content == b""
+
+    r = client.get("/products", headers=h)
+    list_etag = r.headers["ETag"]
+    assert client.get("/products", headers={**h, "If-None-Match": list_etag}).status_code == 304
+    # Different query parameters are a different representation
+    assert client.get("/products?sort_dir=desc", headers={**h, "If-None-Match": list_etag}).status_code == 200
+
+    # A newer updated_at changes both ETags
+    db_session.get(Product, pid).updated_at = datetime.utcnow() + timedelta(minutes=1)
+    db_session.commit()
+    client.post("/products/", headers=h, json={"name": "Filter", "price": 9, "quantity": 1})
+    assert client.get(f"/products/{pid}", headers={**h, "If-None-Match": etag}).status_code == 200
+    assert client.get("/products", headers={**h, "If-None-Match": list_etag}).status_code == 200
+
+def test_products_list_etag_changes_on_same_second_write(client, admin_token):
+    h = _auth_header(admin_token)
+    pid = client.post("/products/", headers=h, json={"name": "Bulb", "price": 3, "quantity": 4}).json()["id"]
+    r = client.get("/products", headers=h)
+    etag = r.headers["ETag"]
+
+    # Neither updated_at (second resolution) nor the row count moves here
+    assert client.put(f"/products/{pid}", headers=h, json={"price": 4}).status_code == 200
+    r = client.get("/products", headers={**h, "If-None-Match": etag})
+    assert r.status_code == 200
+    assert r.json()[0]["price"] == "4.00" and r.headers["ETag"] != etag
+    assert client.get("/products", headers={**h, "If-None-Match": r.headers["ETag"]}).status_code == 304
+
+def test_products_search_relevance_pagination(client, admin_token):
+    h = _auth_header(admin_token)
+    for name in ["Tea Cup", "Green Tea", "Tea", "Teapot", "Steam Iron"]:
+        client.post("/products/", headers=h, json={"name": name, "price": 1, "quantity": 1})
+
+    names, cursor = [], None
+    while True:
+        params = {"q": "tea", "sort_by": "relevance", "limit": 2}
+        if cursor:
+            params["cursor"] = cursor
+        r = client.get("/products", params=params, headers=h)
+        names.extend(p["name"] for p in r.json())
+        cursor = r.headers.get("X-Next-Cursor")
+        if not cursor:
+            break
+    assert names == ["Tea", "Teapot", "Tea Cup", "Green Tea", "Steam Iron"]
+
+    assert client.get("/products?sort_by=relevance", headers=h).status_code == 422
+
+
+def test_products_list_json_matches_single_item_encoding(client, admin_token):
+    r = client.post("/products/", headers=_auth_header(admin_token),
+                    json={"name": "Lamp", "description": None, "price": "5.5", "quantity": 1})
+    assert r.status_code == 201
+    pid = r.json()["id"]
+
+    r = client.get("/products/", headers=_auth_header(admin_token))
+    assert r.status_code == 200
+    assert r.headers["content-type"] == "application/json"
+    single = client.get(f"/products/{pid}", headers=_auth_header(admin_token)).json()
+    assert r.json() == [single]
+    assert r.json()[0]["price"] == "5.50"
+
+
+def test_products_sparse_fieldsets(client, admin_token):
+    h = _auth_header(admin_token)
+    for i in range(3):
+        r = client.post("/products/", headers=h, json={
+            "name": f"Item {i}", "description": "long text", "price": 10 + i, "quantity": i,
+            "image_url": "http://img/x.png",
+        })
+        assert r.status_code == 201
+    pid = r.json()["id"]
+
+    r = client.get("/products/", headers=h, params={"fields": "name,price", "sort_by": "quantity", "limit": 2})
+    assert r.status_code == 200
+    assert r.json() == [{"id": r.json()[0]["id"], "name": "Item 0", "price": "10.00"},
+                        {"id": r.json()[1]["id"], "name": "Item 1", "price": "11.00"}]
+    full_etag = client.get("/products/", headers=h, params={"sort_by": "quantity", "limit": 2}).headers["ETag"]
+    assert r.headers["ETag"] != full_etag
+
+    r = client.get("/products/", headers=h, params={
+        "fields": "name,price", "sort_by": "quantity", "limit": 2, "cursor": r.headers["X-Next-Cursor"]})
+    assert [p["name"] for p in r.json()] == ["Item 2"]
+
+    r = client.get(f"/products/{pid}", headers=h, params={"fields": "quantity"})
+    assert r.status_code == 200
+    assert r.json() == {"id": pid, "quantity": 2}
+    assert client.get(f"/products/{pid}", headers={**h, "If-None-Match": r.headers["ETag"]},
+                      params={"fields": "quantity"}).status_code == 304
+
+    r = client.get("/products/", headers=h, params={"fields": "name,secret"})
+    assert r.status_code == 400
+    assert "secret" in r.json()["detail"]
+
+
+def test_products_stats_maintained_incrementally(client, admin_token, user_token, db_session):
+    from sqlalchemy import text
+    h = _auth_header(admin_token)
+
+    r = client.get("/products/stats", headers=_auth_header(user_token))
+    assert r.status_code == 200
+    assert r.json()["sku_count"] == 0
+
+    ids = []
+    for qty in (0, 3, 10):
+        r = client.post("/products/", headers=h, json={"name": f"Q{qty}", "price": "2.50", "quantity": qty})
+        ids.append(r.json()["id"])
+    client.put(f"/products/{ids[2]}", headers=h, json={"quantity": 4})
+    client.post("/products/batch", headers=h, json={"operations": [
+        {"op": "create", "data": {"name": "B", "price": "1.00", "quantity": 100}},
+        {"op": "update", "id": ids[1], "data": {"price": "5.00"}},
+        {"op": "delete", "id": ids[0]},
+    ]})
+
+    stats = client.get("/products/stats", headers=h).json()
+    assert stats["sku_count"] == 3
+    assert stats["total_units"] == 3 + 4 + 100
+    assert stats["stock_value"] == "125.00"  # 3*5 + 4*2.5 + 100*1
+    assert stats["out_of_stock"] == 0
+    assert stats["low_stock"] == 2
+
+    r = client.post("/products/stats/recompute", headers=h)
+    assert r.status_code == 200
+    assert r.json()["drifted"] is False
+    assert client.post("/products/stats/recompute", headers=_auth_header(user_token)).status_code == 403
+
+    # A write that bypasses the repository is caught by the recompute
+    db_session.execute(text("UPDATE products SET quantity = 0"))
+    db_session.commit()
+    assert client.get("/products/stats", headers=h).json()["out_of_stock"] == 0
+    r = client.post("/products/stats/recompute", headers=h).json()
+    assert r["drifted"] is True
+    assert r["stats"]["out_of_stock"] == 3
+
+
+def test_products_stats_count_writes_before_first_read(client, admin_token, db_session):
+    from sqlalchemy import text
+    from app.services.product_service import ProductService
+
+    h = _auth_header(admin_token)
+    client.post("/products/", headers=h, json={"name": "Early", "price": "2.00", "quantity": 3})
+    assert client.get("/products/stats", headers=h).json()["total_units"] == 3
+
+    # A summary deleted by hand is rebuilt by an upsert, even when it exists again by then
+    db_session.execute(text("DELETE FROM product_stats"))
+    db_session.commit()
+    assert client.get("/products/stats", headers=h).json()["sku_count"] == 1
+    _, row = ProductService(db_session).repo.stats.recompute()
+    assert row.sku_count == 1
+
+def test_products_stock_delta_is_atomic(client, admin_token):
+    h = _auth_header(admin_token)
+    pid = client.post("/products/", headers=h, json={"name": "Hot", "price": "1.00", "quantity": 5}).json()["id"]
+
+    r = client.post(f"/products/{pid}/stock", headers=h, json={"delta": -3})
+    assert r.status_code == 200 and r.json()["quantity"] == 2
+    r = client.post(f"/products/{pid}/stock", headers=h, json={"delta": -3})
+    assert r.status_code == 409
+    assert client.post(f"/products/{pid}/stock", headers=h, json={"delta": 0}).status_code == 422
+    assert client.post(f"/products/{pid + 99}/stock", headers=h, json={"delta": 1}).status_code == 404
+    assert client.get("/products/stats", headers=h).json()["total_units"] == 2
+
+
+def test_products_stock_deltas_coalesce_per_sku(client, admin_token, db_session, monkeypatch):
+    import asyncio
+    import httpx
+    from sqlalchemy import event
+    from app.main import app
+    from app.services import product_service
+
+    h = _auth_header(admin_token)
+    pid = client.post("/products/", headers=h, json={"name": "Hot", "price": "1.00", "quantity": 5}).json()["id"]
+    coalescer = product_service.WriteCoalescer(0.05)
+    monkeypatch.setattr("app.api.products.stock_coalescer", coalescer)
+
+    updates = []
+    listener = lambda conn, cursor, stmt, *args: updates.append(stmt) if stmt.startswith("UPDATE products") else None
+    engine = db_session.get_bind()
+    event.listen(engine, "before_cursor_execute", listener)
+
+    async def burst(deltas):
+        transport = httpx.ASGITransport(app=app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://test") as ac:
+            return await asyncio.gather(*(
+                ac.post(f"/products/{pid}/stock", headers=h, json={"delta": d}) for d in deltas
+            ))
+
+    try:
+        responses = asyncio.run(burst([1] * 10))
+        assert [r.status_code for r in responses] == [200] * 10
+        assert len(updates) == 1
+        assert coalescer.stats()["avg_batch"] == 10
+
+        # Sum would go negative (15 - 20 + 1): fall back to one delta at a time
+        updates.clear()
+        responses = asyncio.run(burst([-12, -8, 1]))
+        assert [r.status_code for r in responses] == [200, 409, 200]
+        assert len(updates) == 4
+    finally:
+        event.remove(engine, "before_cursor_execute", listener)
+    assert client.get(f"/products/{pid}", headers=h).json()["quantity"] == 4
+    stats = client.get("/products/stock/stats", headers=h).json()
+    assert stats["batches"] == 2 and stats["items"] == 13 and stats["pending_keys"] == 0
+
+
+def test_write_coalescer_flush_survives_first_caller_cancel():
+    import asyncio
+    from app.core.coalesce import WriteCoalescer
+
+    async def scenario():
+        coalescer = WriteCoalescer(0.02)
+        applied = []
+
+        async def apply(items):
+            applied.append(items)
+            return [sum(items)] * len(items)
+
+        first = asyncio.create_task(coalescer.submit("sku", 1, apply))
+        await asyncio.sleep(0)
+        second = asyncio.create_task(coalescer.submit("sku", 2, apply))
+        await asyncio.sleep(0)
+        assert len(coalescer._flushes) == 1  # the flush task is referenced
+        first.cancel()
+        assert await second == 3
+        assert applied == [[1, 2]] and not coalescer._flushes
+
+    asyncio.run(scenario())
+
+
+def test_products_if_match_optimistic_concurrency(client, admin_token):
+    h = _auth_header(admin_token)
+    pid = client.post("/products/", headers=h, json={"name": "Doc", "price": "1.00", "quantity": 1}).json()["id"]
+    r = client.get(f"/products/{pid}", headers=h)
+    etag = r.headers["ETag"]
+    assert r.json()["version"] == 1
+
+    # First editor wins and gets the new ETag back
+    r = client.put(f"/products/{pid}", headers={**h, "If-Match": etag}, json={"name": "Doc A"})
+    assert r.status_code == 200
+    assert r.json()["version"] == 2
+    new_etag = r.headers["ETag"]
+    assert new_etag != etag
+
+    # Second editor still holds the old ETag: rejected, nothing written
+    r = client.put(f"/products/{pid}", headers={**h, "If-Match": etag}, json={"name": "Doc B"})
+    assert r.status_code == 412
+    r = client.delete(f"/products/{pid}", headers={**h, "If-Match": etag})
+    assert r.status_code == 412
+    assert client.get(f"/products/{pid}", headers=h).json()["name"] == "Doc A"
+
+    # Stock deltas bump the version too
+    client.post(f"/products/{pid}/stock", headers=h, json={"delta": 1})
+    assert client.put(f"/products/{pid}", headers={**h, "If-Match": new_etag},
+                      json={"quantity": 7}).status_code == 412
+
+    current = client.get(f"/products/{pid}", headers=h).headers["ETag"]
+    assert client.delete(f"/products/{pid}", headers={**h, "If-Match": current}).status_code == 204
+    assert client.delete(f"/products/{pid}", headers={**h, "If-Match": current}).status_code == 404
+
+
+def test_products_delta_sync_with_tombstones(client, admin_token, user_token, monkeypatch):
+    from app.core.config import settings
+
+    h = _auth_header(admin_token)
+    ids = [
+        client.post("/products/", headers=h, json={"name": n, "price": 1, "quantity": 1}).json()["id"]
+        for n in ("A", "B", "C")
+    ]
+    u = _auth_header(user_token)
+
+    # Full sync, paged by change order
+    first = client.get("/products/changes", headers=u, params={"limit": 2}).json()
+    assert [p["name"] for p in first["items"]] == ["A", "B"] and first["has_more"]
+    second = client.get("/products/changes", headers=u, params={"since": first["token"]}).json()
+    assert [p["name"] for p in second["items"]] == ["C"] and not second["has_more"]
+    assert second["deleted"] == []
+    idle = client.get("/products/changes", headers=u, params={"since": second["token"]}).json()
+    assert idle == {"items": [], "deleted": [], "token": second["token"], "has_more": False}
+
+    # Only what changed since the token: an update and a tombstone
+    client.put(f"/products/{ids[0]}", headers=h, json={"name": "A2"})
+    client.delete(f"/products/{ids[1]}", headers=h)
+    delta = client.get("/products/changes", headers=u, params={"since": second["token"]}).json()
+    assert [p["name"] for p in delta["items"]] == ["A2"]
+    assert delta["deleted"] == [ids[1]]
+    assert client.get("/products/changes", headers=u, params={"since": delta["token"]}).json()["items"] == []
+
+    assert client.get("/products/changes", headers=u, params={"since": "garbage"}).status_code == 400
+
+    # Purged tombstones expire the tokens that would need them
+    client.delete(f"/products/{ids[2]}", headers=h)
+    assert client.get("/products/changes", headers=u, params={"since": delta["token"]}).status_code == 200
+    assert client.post("/products/changes/purge", headers=u).status_code == 403
+    monkeypatch.setattr(settings, "TOMBSTONE_RETENTION_DAYS", -1)
+    purge = client.post("/products/changes/purge", headers=h).json()
+    assert purge["purged"] == 2 and purge["purged_through"] > 0
+    assert client.get("/products/changes", headers=u, params={"since": delta["token"]}).status_code == 410
+    resync = client.get("/products/changes", headers=u).json()
+    assert [p["name"] for p in resync["items"]] == ["A2"]
+    assert client.get("/products/changes", headers=u, params={"since": resync["token"]}).status_code == 200
+
+
+def test_products_delta_sync_pages_within_one_transaction(client, admin_token, user_token):
+    h, u = _auth_header(admin_token), _auth_header(user_token)
+    start = client.get("/products/changes", headers=u).json()["token"]
+    ops = [{"op": "create", "data": {"name": n, "price": 1, "quantity": 1}} for n in ("X", "Y", "Z")]
+    assert client.post("/products/batch", headers=h, json={"operations": ops}).status_code == 200
+
+    # The three rows share one change number; (change_seq, id) still pages them
+    first = client.get("/products/changes", headers=u, params={"since": start, "limit": 2}).json()
+    assert [p["name"] for p in first["items"]] == ["X", "Y"] and first["has_more"]
+    second = client.get("/products/changes", headers=u, params={"since": first["token"], "limit": 2}).json()
+    assert [p["name"] for p in second["items"]] == ["Z"] and not second["has_more"]
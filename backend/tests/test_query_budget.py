@@ -0,0 +1,91 @@
+import logging
+import uuid
+from typing import Dict
+
+import pytest
+from sqlalchemy import text
+from sqlalchemy.exc import OperationalError
+
+from app.core.config import settings
+from app.db.statements import track_queries
+
+
+def _auth_header(token: str) -> Dict[str, str]:
+    return {"Authorization": f"Bearer {token}"}
+
+
+def _queries(response) -> int:
+    return int(response.headers["X-DB-Query-Count"])
+
+
+def test_query_budgets_per_endpoint(client, admin_token):
+    r = client.post("/auth/register", json={"email": f"budget_{uuid.uuid4().hex[:8]}@example.com", "password": "secret123"})
+    assert r.status_code == 201
+    assert _queries(r) == 1  # INSERT ... ON CONFLICT DO NOTHING RETURNING
+    assert float(r.headers["X-DB-Query-Time-Ms"]) >= 0
+
+    p = {"name": "Soap", "description": "", "price": 2.5, "quantity": 3, "image_url": ""}
+    r = client.post("/products/", headers=_auth_header(admin_token), json=p)
+    assert _queries(r) == 3  # change number + insert + stats
+    pid = r.json()["id"]
+
+    r = client.get(f"/products/{pid}", headers=_auth_header(admin_token))
+    assert _queries(r) == 2  # version (ETag) + row
+
+    r = client.put(f"/products/{pid}", headers=_auth_header(admin_token), json={"name": "Bar soap"})
+    assert _queries(r) == 2  # change number + UPDATE ... RETURNING
+    r = client.put(f"/products/{pid}", headers=_auth_header(admin_token), json={"quantity": 9})
+    assert _queries(r) == 4  # change number + lock old values + update + stats
+
+    r = client.get("/products/", headers=_auth_header(admin_token))
+    assert _queries(r) <= 2
+
+    r = client.delete(f"/products/{pid}", headers=_auth_header(admin_token))
+    assert _queries(r) == 4  # change number + DELETE ... RETURNING + stats + tombstone
+
+
+def test_slow_queries_logged_with_param_types_and_plan(db_session, monkeypatch, caplog):
+    monkeypatch.setattr(settings, "SLOW_QUERY_MS", 1e-6)
+    with caplog.at_level(logging.WARNING, logger="app.db.slow_query"), track_queries() as stats:
+        db_session.execute(text("SELECT id FROM products WHERE name = :name"), {"name": "Soap"}).all()
+    assert stats.count == 1 and stats.slow == 1
+    (record,) = caplog.records
+    assert "SELECT id FROM products" in record.getMessage()
+    assert "'Soap'" not in record.getMessage() and "params=(str)" in record.getMessage()
+    assert "plan=" in record.getMessage() and "products" in record.getMessage().split("plan=")[1]
+
+    # Failed statements are not logged; non-DML statements are logged without a plan
+    caplog.clear()
+    with caplog.at_level(logging.WARNING, logger="app.db.slow_query"), track_queries() as stats:
+        with pytest.raises(OperationalError):
+            db_session.execute(text("SELECT nope FROM products"))
+        db_session.rollback()
+        db_session.execute(text("CREATE TEMP TABLE slow_tmp (x INTEGER)"))
+        db_session.execute(text("DROP TABLE slow_tmp"))
+    assert stats.count == 3 and stats.slow == 2
+    assert all(r.getMessage().endswith("plan=n/a") for r in caplog.records)
+    assert not any("nope" in r.getMessage() for r in caplog.records)
+
+
+def test_postgres_plan_runs_in_a_savepoint():
+    from types import SimpleNamespace
+    from app.db.statements import _plan
+
+    executed = []
+
+    class Cursor:
+        def execute(self, sql, *args):
+            executed.append(sql)
+            if sql.startswith("EXPLAIN"):
+                raise RuntimeError("cannot explain")
+
+        def close(self):
+            pass
+
+    context = SimpleNamespace(root_connection=SimpleNamespace(connection=SimpleNamespace(cursor=Cursor)))
+    assert _plan(context, "SELECT 1", None, "postgresql") == "unavailable (RuntimeError)"
+    # The failed EXPLAIN is rolled back to the savepoint, leaving the caller's transaction usable
+    assert executed == [
+        "SAVEPOINT slow_query_plan", "EXPLAIN SELECT 1",
+        "ROLLBACK TO SAVEPOINT slow_query_plan", "RELEASE SAVEPOINT slow_query_plan",
+    ]
@@ -0,0 +1,30 @@
+from app.core.cache import QueryCache
+
+
+def test_cache_lru_budget_and_generation():
+    cache = QueryCache(max_entries=2, max_bytes=100, ttl_seconds=60)
+
+    cache.put("a", 1, size=10, generation=cache.generation)
+    cache.put("b", 2, size=10, generation=cache.generation)
+    assert cache.get("a") == 1          # "a" becomes most recent
+    cache.put("c", 3, size=10, generation=cache.generation)
+    assert cache.get("b") is None       # least recently used was evicted
+    assert cache.get("c") == 3
+
+    cache.put("big", 4, size=95, generation=cache.generation)
+    assert cache.stats()["bytes"] <= 100
+
+    # A value computed before a write must not be stored after it
+    stale = cache.generation
+    cache.invalidate()
+    cache.put("a", 1, size=10, generation=stale)
+    assert cache.get("a") is None
+
+    stats = cache.stats()
+    assert stats["hits"] == 2 and stats["evictions"] >= 2 and stats["invalidations"] == 1
+
+
+def test_cache_ttl_expiry():
+    cache = QueryCache(max_entries=10, max_bytes=1000, ttl_seconds=0)
+    cache.put("k", "v", size=1, generation=cache.generation)
+    assert cache.get("k") is None
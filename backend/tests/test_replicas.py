@@ -0,0 +1,85 @@
+import time
+
+import pytest
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+
+from app import deps
+from app.db import session as db_session
+from app.db.base import Base
+from app.db.routing import RecentWriters
+from app.models.product import Product
+
+
+def _auth_header(token: str):
+    return {"Authorization": f"Bearer {token}"}
+
+
+@pytest.fixture()
+def replica(tmp_path, monkeypatch):
+    """A second SQLite file standing in for a lagging replica."""
+    engine = create_engine(f"sqlite:///{tmp_path / 'replica.db'}")
+    Base.metadata.create_all(engine)
+    sessions = sessionmaker(bind=engine, autoflush=False)
+    with sessions() as db:
+        db.add(Product(name="Replica Lamp", name_search="replica lamp", price=3, quantity=1))
+        db.commit()
+    monkeypatch.setattr(db_session, "ReplicaSessions", [sessions])
+    monkeypatch.setattr(deps, "recent_writers", RecentWriters(window_seconds=0.3, max_entries=10))
+    yield sessions
+    engine.dispose()
+
+
+def _names(client, token):
+    r = client.get("/products/", headers=_auth_header(token))
+    assert r.status_code == 200, r.text
+    return [p["name"] for p in r.json()]
+
+
+def test_reads_use_replica_except_right_after_own_write(client, replica, admin_token, user_token):
+    assert _names(client, user_token) == ["Replica Lamp"]
+    assert _names(client, admin_token) == ["Replica Lamp"]
+
+    r = client.post("/products/", headers=_auth_header(admin_token), json={"name": "Primary Mug", "price": 4, "quantity": 2})
+    assert r.status_code == 201
+    pid = r.json()["id"]
+
+    # The writer reads its own write from the primary; other users stay on the replica
+    assert _names(client, admin_token) == ["Primary Mug"]
+    assert client.get(f"/products/{pid}", headers=_auth_header(admin_token)).json()["name"] == "Primary Mug"
+    assert _names(client, user_token) == ["Replica Lamp"]
+
+    time.sleep(0.35)
+    assert _names(client, admin_token) == ["Replica Lamp"]
+
+
+def test_changes_token_ahead_of_lagging_replica(client, replica, admin_token, user_token):
+    r = client.post("/products/", headers=_auth_header(admin_token), json={"name": "Primary Mug", "price": 4, "quantity": 2})
+    assert r.status_code == 201
+    token = client.get("/products/changes", headers=_auth_header(admin_token)).json()["token"]
+
+    # The replica has not seen the write yet: an empty page, not 410
+    r = client.get("/products/changes", params={"since": token}, headers=_auth_header(user_token))
+    assert r.status_code == 200, r.text
+    assert r.json() == {"items": [], "deleted": [], "token": token, "has_more": False}
+
+
+def test_recent_writers_bounded():
+    writers = RecentWriters(window_seconds=60, max_entries=2)
+    for user_id in (1, 2, 3):
+        writers.mark(user_id)
+    assert not writers.is_recent(1)
+    assert writers.is_recent(2) and writers.is_recent(3)
+
+
+def test_db_pool_stats_reports_every_registered_pool(client, admin_token, monkeypatch):
+    from app.db.pool import PoolMetrics
+
+    replica_engine = create_engine("sqlite://")
+    monkeypatch.setitem(db_session.engines, "replica0", replica_engine)
+    monkeypatch.setitem(db_session.pool_metrics, "replica0", PoolMetrics("replica0"))
+    r = client.get("/system/db-pool/stats", headers=_auth_header(admin_token))
+    assert r.status_code == 200, r.text
+    assert {"sync", "replica0"} <= set(r.json())
+    assert "status" in r.json()["replica0"]
+    replica_engine.dispose()
@@ -0,0 +1,35 @@
+import time
+
+from app.core.security import VerifiedTokenCache, create_access_token
+
+
+def test_token_cache_lru_and_expiry():
+    cache = VerifiedTokenCache(max_entries=2)
+    cache.put("a", 1, "user", time.time() + 60)
+    cache.put("b", 2, "admin", time.time() + 60)
+    assert cache.get("a") == (1, "user")
+    cache.put("c", 3, "user", time.time() + 60)
+    assert cache.get("b") is None          # least recently used
+    cache.put("old", 4, "user", time.time() - 1)
+    assert cache.get("old") is None        # past exp is never served
+    stats = cache.stats()
+    assert stats["hits"] == 1 and stats["expired"] == 1 and stats["evictions"] >= 1
+
+
+def test_repeat_requests_skip_jwt_decode(client, monkeypatch):
+    import app.deps as deps
+    from app.core.security import token_cache
+
+    token_cache.clear()
+    token = create_access_token(subject="42", role="user")
+    calls = []
+    real_decode = deps.jwt.decode
+    monkeypatch.setattr(deps.jwt, "decode", lambda *a, **k: calls.append(1) or real_decode(*a, **k))
+
+    h = {"Authorization": f"Bearer {token}"}
+    for _ in range(3):
+        assert client.get("/products", headers=h).status_code == 200
+    assert len(calls) == 1
+
+    bad = {"Authorization": f"Bearer {token}x"}
+    assert client.get("/products", headers=bad).status_code == 401
@@ -0,0 +1,43 @@
+import asyncio
+
+import httpx
+from fastapi.testclient import TestClient
+
+from app.core.traffic import TrafficRecorder, read_log
+from app.main import app
+from benchmarks.replay import replay, summarize
+
+
+def test_traffic_recorded_and_replayed(tmp_path, admin_token):
+    log = tmp_path / "traffic.jsonl"
+    recorder = TrafficRecorder(app, path=str(log), max_body=1024)
+    headers = {"Authorization": f"Bearer {admin_token}"}
+    with TestClient(recorder) as client:
+        client.post("/auth/register", json={"email": "rec@example.com", "password": "secret123"})
+        r = client.post("/products/", headers=headers, json={"name": "Mug", "price": 4, "quantity": 2})
+        pid = r.json()["id"]
+        client.get(f"/products/{pid}", headers=headers)
+        client.get("/products/", params={"q": "mug", "limit": 5})
+
+    entries = read_log(str(log))
+    assert [(e["method"], e["route"], e["role"], e["status"]) for e in entries] == [
+        ("POST", "/auth/register", "anonymous", 201),
+        ("POST", "/products/", "admin", 201),
+        ("GET", "/products/{product_id}", "admin", 200),
+        ("GET", "/products/", "anonymous", 401),
+    ]
+    assert entries[0]["body"] is None  # credentials are never recorded
+    assert entries[1]["body"] == {"name": "Mug", "price": 4, "quantity": 2}
+    assert entries[3]["query"] == "q=mug&limit=5"
+
+    async def run():
+        transport = httpx.ASGITransport(app=app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://replay") as client:
+            return await replay(client, entries, speed=0, concurrency=4)
+
+    results, _ = asyncio.run(run())
+    report = summarize(results)
+    assert report["ALL"]["count"] == 4 and report["ALL"]["error_rate"] == 0
+    assert report["POST /products/"]["client_error_rate"] == 0
+    assert report["GET /products/"]["client_error_rate"] == 1
+    assert report["GET /products/{product_id}"]["p99_ms"] > 0
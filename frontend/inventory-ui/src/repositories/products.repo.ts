@@ -4,8 +4,17 @@ import type { ProductCreate, ProductOut, ProductUpdate } from "../types/product"
 import type { ListQuery } from "../store/products";
 
 export const ProductsRepo = {
-  list: (query?: ListQuery) =>
-    client.get<ProductOut[]>("/products/", { params: query }).then(r => r.data),
+  // The API pages its list (X-Next-Cursor); follow it to load every product
+  list: async (query?: ListQuery) => {
+    const items: ProductOut[] = [];
+    let cursor: string | undefined;
+    do {
+      const r = await client.get<ProductOut[]>("/products/", { params: { ...query, cursor } });
+      items.push(...r.data);
+      cursor = r.headers["x-next-cursor"] || undefined;
+    } while (cursor);
+    return items;
+  },
 
   create: (payload: ProductCreate) =>
     client.post<ProductOut>("/products/", payload).then(r => r.data),